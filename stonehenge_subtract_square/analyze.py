@@ -0,0 +1,261 @@
+"""Solve positions from the command line, without playing a game.
+
+Each position is one line of text:
+
+    s <total> [p1|p2]
+        SubtractSquare from total, with p1 (the default) or p2 to move
+    h <size> [p1|p2] [<cell>=<player> ...]
+        Stonehenge of the given size after the claims, in the order they
+        were made, e.g. 'h 2 p1 A=1 F=2' (the order decides which player
+        captured a ley-line both could have)
+
+For each position the chosen analyzer prints the value for the player to
+move (1 a win, -1 a loss, between them an estimate), the best move, the
+principal variation and the search stats, as text or as one JSON object per
+line. Positions are given as arguments or one per line on stdin, and --jobs
+solves them in that many processes. For example
+
+    python analyze.py 's 30' 'h 2 p2 A=1' --analyzer pn --budget nodes=5000
+    python analyze.py --json --jobs 4 < positions.txt
+"""
+
+import time
+from typing import Any, Callable, Dict, List, Optional
+from game_state import GameState
+
+# The principal variation is followed for at most this many moves.
+PV_LENGTH = 10
+
+
+def parse_position(text: str) -> GameState:
+    """Returns the position written in text.
+    >>> parse_position('s 30 p2')
+    P1's Turn: False - Total: 30
+    >>> from stonehenge_gamestate import StonehengeGamestate
+    >>> x1 = parse_position('h 2 p1 A=1 F=2')
+    >>> x1 == StonehengeGamestate(True, 2).make_move('A').make_move('F')
+    True
+    >>> parse_position('h 2 p1 A=1 A=2')
+    Traceback (most recent call last):
+    ...
+    ValueError: Cell A cannot be claimed"""
+    words = text.split()
+    if len(words) < 2 or words[0] not in ('s', 'h') or \
+            not words[1].isdigit():
+        raise ValueError("Expected 's <total>' or 'h <size>': {}".format(
+            text.strip()))
+    p1_turn = True
+    if len(words) > 2 and words[2] in ('p1', 'p2'):
+        p1_turn = words.pop(2) == 'p1'
+    if words[0] == 's':
+        from subtract_square_state import SubtractSquareState
+        if len(words) > 2:
+            raise ValueError("Unexpected {!r}".format(words[2]))
+        return SubtractSquareState(p1_turn, int(words[1]))
+    return _stonehenge_position(int(words[1]), p1_turn, words[2:])
+
+
+def _stonehenge_position(size: int, p1_turn: bool,
+                         claims: List[str]) -> GameState:
+    """Returns the Stonehenge position of size after claims, each
+    '<cell>=<player>', with p1 to move if p1_turn."""
+    from stonehenge_gamestate import StonehengeGamestate
+    if size < 1:
+        raise ValueError("The board size must be at least 1")
+    state = StonehengeGamestate(True, size)
+    for claim in claims:
+        cell, _, player = claim.partition('=')
+        if player not in ('1', '2'):
+            raise ValueError("Expected <cell>=1 or <cell>=2: {}".format(
+                claim))
+        state = StonehengeGamestate(player == '1', size, state.letter_values,
+                                    state.ley_lines)
+        if not state.is_valid_move(cell):
+            raise ValueError("Cell {} cannot be claimed".format(cell))
+        state = state.make_move(cell)
+    return StonehengeGamestate(p1_turn, size, state.letter_values,
+                               state.ley_lines)
+
+
+def minimax_analysis(state: GameState, budget: Any,
+                     pv_length: int) -> Dict[str, Any]:
+    """Returns the value, best move, principal variation and stats of state
+    found by a MinimaxStrategy within budget. Each move of the variation
+    after the first is found by a search within budget from the position
+    before it, reusing the cache of the first search.
+    >>> from subtract_square_state import SubtractSquareState
+    >>> from strategies import Budget
+    >>> result = minimax_analysis(SubtractSquareState(True, 5), Budget(), 10)
+    >>> result['value'], result['best_move'], result['pv']
+    (-1, 1, [1, 4])
+    >>> result['nodes']
+    6"""
+    from strategies import MinimaxStrategy
+    strategy = MinimaxStrategy(budget)
+    start = time.perf_counter()
+    value, move = strategy.search(state)
+    seconds = time.perf_counter() - start
+    nodes = strategy.nodes_expanded
+    pv = _variation(state, move, lambda x: strategy.search(x)[1], pv_length)
+    return {'value': value, 'best_move': move, 'pv': pv, 'nodes': nodes,
+            'seconds': seconds}
+
+
+def proof_number_analysis(state: GameState, budget: Any,
+                          pv_length: int) -> Dict[str, Any]:
+    """Returns the value, best move, principal variation and stats of state
+    found by proof-number search within the nodes, time and cache of budget.
+    The value is None when the search ends before proving a win or a loss.
+    >>> from stonehenge_gamestate import StonehengeGamestate
+    >>> from strategies import Budget
+    >>> x1 = StonehengeGamestate(True, 2)
+    >>> result = proof_number_analysis(x1, Budget(), 3)
+    >>> result['value'], result['best_move'], result['pv']
+    (1, 'A', ['A', 'B', 'C'])
+    >>> proof_number_analysis(x1, Budget(max_nodes=5), 3)['value'] is None
+    True"""
+    from proof_number import MIN_TABLE_SIZE, ProofNumberSearch
+    from state_codec import encode_state
+    search = ProofNumberSearch(max(budget.cache_size, MIN_TABLE_SIZE),
+                               budget.max_nodes, budget.max_time)
+    start = time.perf_counter()
+    value: Optional[int] = None
+    if search.prove(state):
+        value = GameState.WIN
+    elif search.table.lookup(encode_state(state))[1] == 0:
+        value = GameState.LOSE
+    move = search.best_move(state)
+    seconds = time.perf_counter() - start
+    nodes = search.nodes_expanded
+    pv = [] if value is None else _variation(state, move, search.best_move,
+                                             pv_length)
+    return {'value': value, 'best_move': move, 'pv': pv, 'nodes': nodes,
+            'seconds': seconds, 'table': len(search.table)}
+
+
+# name: analysis function
+ANALYZERS = {'minimax': minimax_analysis, 'pn': proof_number_analysis}
+
+
+def _variation(state: GameState, move: Any,
+               best_move: Callable[[GameState], Any],
+               pv_length: int) -> List[Any]:
+    """Returns at most pv_length moves starting with move from state, each
+    followed by best_move of the position it leads to, until a position with
+    no move."""
+    pv = []
+    while move is not None and len(pv) < pv_length:
+        pv.append(move)
+        state = state.make_move(move)
+        if state.get_possible_moves() == []:
+            break
+        move = best_move(state)
+    return pv
+
+
+def analyze(text: str, analyzer: str = 'minimax', budget_text: str = '',
+            pv_length: int = PV_LENGTH) -> Dict[str, Any]:
+    """Returns the analysis of the position written in text by analyzer
+    within the budget written in budget_text, with 'position' set to text.
+    A position or budget that cannot be read, or an analysis that fails,
+    gives its 'error' instead, so one bad position does not stop the rest.
+    >>> analyze('s 30', budget_text='depth=20')['best_move']
+    25
+    >>> analyze('s x')['error']
+    "Expected 's <total>' or 'h <size>': s x"
+    >>> analyze('s 5', analyzer='alphabeta')['error']
+    "KeyError: 'alphabeta'"
+    """
+    from strategies import parse_budget
+    result: Dict[str, Any] = {'position': text.strip()}
+    try:
+        state = parse_position(text)
+        budget = parse_budget(budget_text)
+    except ValueError as error:
+        result['error'] = str(error)
+        return result
+    try:
+        result.update(ANALYZERS[analyzer](state, budget, pv_length))
+    except Exception as error:  # Reported with the position instead.
+        result['error'] = "{}: {}".format(type(error).__name__, error)
+    return result
+
+
+def analyze_all(texts: List[str], analyzer: str = 'minimax',
+                budget_text: str = '', pv_length: int = PV_LENGTH,
+                jobs: int = 1) -> List[Dict[str, Any]]:
+    """Returns the analysis of each position in texts, in order, solved in
+    jobs processes.
+    >>> [result['value'] for result in analyze_all(['s 5', 's 6'], jobs=2)]
+    [-1, 1]"""
+    if jobs <= 1 or len(texts) <= 1:
+        return [analyze(text, analyzer, budget_text, pv_length)
+                for text in texts]
+    from concurrent.futures import ProcessPoolExecutor
+    count = len(texts)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(analyze, texts, [analyzer] * count,
+                                 [budget_text] * count, [pv_length] * count))
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    """Returns result as one line of text.
+    >>> format_result(analyze('s 5'))  # doctest: +ELLIPSIS
+    's 5: value -1, best 1, pv 1 4, nodes 6, ... s'
+    >>> format_result(analyze('h 0'))
+    'h 0: error: The board size must be at least 1'"""
+    if 'error' in result:
+        return "{}: error: {}".format(result['position'], result['error'])
+    stats = ", ".join("{} {}".format(name, result[name])
+                      for name in ('nodes', 'table') if name in result)
+    return "{}: value {}, best {}, pv {}, {}, {:.3f} s".format(
+        result['position'],
+        'unknown' if result['value'] is None else result['value'],
+        result['best_move'], " ".join(str(move) for move in result['pv']),
+        stats, result['seconds'])
+
+
+def main(argv: Optional[List[str]] = None,
+         lines: Optional[List[str]] = None) -> int:
+    """Runs the command line argv (sys.argv[1:] if None), reading the
+    positions from lines (stdin if None) when argv gives none. Returns 1 if
+    a position could not be analyzed, and 0 otherwise.
+    >>> main(['--json', 's 6', 's 0'])  # doctest: +ELLIPSIS
+    {"position": "s 6", "value": 1, "best_move": 1, "pv": [1, 1, 4], ...}
+    {"position": "s 0", "value": -1, "best_move": null, "pv": [], ...}
+    0"""
+    import argparse
+    import json
+    import sys
+    parser = argparse.ArgumentParser(
+        description=__doc__.splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="\n".join(__doc__.splitlines()[2:]))
+    parser.add_argument('positions', nargs='*',
+                        help='positions to solve (default: read stdin)')
+    parser.add_argument('--analyzer', choices=sorted(ANALYZERS),
+                        default='minimax')
+    parser.add_argument('--budget', default='',
+                        help="limits, e.g. 'depth=6,time=2' (see "
+                             "strategies.parse_budget)")
+    parser.add_argument('--pv', type=int, default=PV_LENGTH,
+                        help='the most moves of principal variation shown')
+    parser.add_argument('--json', action='store_true',
+                        help='print one JSON object per position')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='how many processes solve positions at once')
+    args = parser.parse_args(argv)
+    texts = args.positions
+    if texts == []:
+        texts = [line for line in (sys.stdin if lines is None else lines)
+                 if line.strip() != '' and not line.startswith('#')]
+    results = analyze_all(texts, args.analyzer, args.budget, args.pv,
+                          args.jobs)
+    for result in results:
+        print(json.dumps(result) if args.json else format_result(result))
+    return 1 if any('error' in result for result in results) else 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Evaluation of many positions at once with NumPy.
+
+Stonehenge positions are scored like stonehenge_evaluator.HeuristicEvaluator
+and SubtractSquare positions like SubtractSquareState.rough_outcome, but each
+batch is turned into arrays (a cell ownership matrix, a vector of totals) and
+scored with a few vectorized operations instead of one Python call per
+position.
+
+Turning positions into arrays is still a pass over every cell in Python, and
+for Stonehenge it costs about as much as the vectorized scoring, so a batch
+scores only about twice as fast as one evaluate call per position.
+"""
+
+from collections import defaultdict
+from itertools import chain
+from math import isqrt
+from typing import Any, DefaultDict, Dict, Iterable, List
+import numpy as np
+from game_state import GameState
+from stonehenge_evaluator import DEFAULT_EVALUATOR, HeuristicEvaluator
+from stonehenge_gamestate import StonehengeGamestate
+from stonehenge_playouts import playout_engine
+from subtract_square_state import SubtractSquareState
+
+# The owner of a cell or ley-line from its mark: 1 or 2 for a player, 0 for a
+# cell name or an unclaimed line's '@'.
+_OWNERS: DefaultDict[str, int] = defaultdict(int, {'1': 1, '2': 2})
+
+# The most elements of the totals-by-roots array evaluate_totals builds at
+# once.
+MAX_ELEMENTS = 1 << 20
+
+
+def evaluate_batch(states: List[GameState],
+                   evaluator: HeuristicEvaluator = DEFAULT_EVALUATOR) -> Any:
+    """Returns an array with the estimated outcome of each of states for the
+    player to move there, in the order of states. Stonehenge positions are
+    scored with the weights of evaluator.
+    >>> from stonehenge_evaluator import evaluate
+    >>> x1 = StonehengeGamestate(True, 3)
+    >>> states = [x1, SubtractSquareState(True, 9), x1.make_move('A'),
+    ...           SubtractSquareState(False, 2), StonehengeGamestate(True, 1),
+    ...           SubtractSquareState(True, 6)]
+    >>> scores = evaluate_batch(states)
+    >>> scores.tolist()[1::2]
+    [1.0, -1.0, 0.0]
+    >>> bool(np.allclose(scores[::2], [evaluate(x) for x in states[::2]]))
+    True
+    >>> from subtraction_game import CUBES, SubtractionState
+    >>> evaluate_batch([SubtractionState(True, 8, CUBES)])
+    Traceback (most recent call last):
+    ...
+    TypeError: Cannot evaluate SubtractionState"""
+    scores = np.zeros(len(states))
+    stonehenge: Dict[int, List[int]] = {}
+    subtract_square: List[int] = []
+    for i, state in enumerate(states):
+        if isinstance(state, StonehengeGamestate):
+            stonehenge.setdefault(state.size, []).append(i)
+        elif type(state) is SubtractSquareState:
+            subtract_square.append(i)
+        else:
+            raise TypeError("Cannot evaluate {}".format(
+                type(state).__name__))
+
+    for size, positions in stonehenge.items():
+        scores[positions] = _evaluate_stonehenge(
+            size, [states[i] for i in positions], evaluator)
+    if subtract_square:
+        scores[subtract_square] = evaluate_totals(
+            np.array([states[i].current_total for i in subtract_square],
+                     dtype=np.int64))
+    return scores
+
+
+def _evaluate_stonehenge(size: int, states: List[StonehengeGamestate],
+                         evaluator: HeuristicEvaluator) -> Any:
+    """Returns the scores of states, which all have the given board size."""
+    membership = playout_engine(size).membership
+    lengths = playout_engine(size).line_lengths
+    num_cells, num_lines = membership.shape
+    cells = _owner_array(chain.from_iterable(chain.from_iterable(
+        state.letter_values for state in states)), len(states), num_cells)
+    owners = _owner_array((ley_line[0] for state in states
+                           for ley_line in state.ley_lines),
+                          len(states), num_lines)
+    me = np.array([1 if state.p1_turn else 2 for state in states],
+                  dtype=np.int8)[:, None]
+    them = 3 - me
+
+    mine, theirs = (cells == me).astype(np.int16), (cells == them)
+    unclaimed = owners == 0
+    my_threats = unclaimed & (2 * (mine @ membership + 1) >= lengths)
+    their_threats = unclaimed & (
+        2 * (theirs.astype(np.int16) @ membership + 1) >= lengths)
+    my_lines = (owners == me).sum(axis=1)
+    their_lines = (owners == them).sum(axis=1)
+    # The ley-lines each free cell would capture for the player to move.
+    gains = np.where(cells == 0,
+                     my_threats.astype(np.int16) @ membership.T, 0)
+
+    half = num_lines / 2
+    total = (evaluator.line_weight * (my_lines - their_lines) / half +
+             evaluator.threat_weight *
+             (my_threats.sum(axis=1) - their_threats.sum(axis=1)) /
+             num_lines +
+             evaluator.cell_weight *
+             (mine.sum(axis=1) - theirs.sum(axis=1)) / num_cells)
+    scores = total / (evaluator.line_weight + evaluator.threat_weight +
+                      evaluator.cell_weight)
+    scores = np.where(2 * (my_lines + gains.max(axis=1)) >= num_lines,
+                      GameState.WIN, scores)
+    return np.where(2 * np.maximum(my_lines, their_lines) >= num_lines,
+                    GameState.LOSE, scores)
+
+
+def _owner_array(marks: Iterable[str], rows: int, columns: int) -> Any:
+    """Returns the owners of marks, in order, as a rows by columns array.
+    >>> _owner_array(['A', '1', '@', '2', 'AB', '1'], 2, 3).tolist()
+    [[0, 1, 0], [2, 0, 1]]"""
+    return np.fromiter(map(_OWNERS.__getitem__, marks), dtype=np.int8,
+                       count=rows * columns).reshape(rows, columns)
+
+
+def evaluate_totals(totals: Any, max_elements: int = MAX_ELEMENTS) -> Any:
+    """Returns SubtractSquareState.rough_outcome for each of totals: WIN if
+    the total is a positive square, LOSE if every move leaves a positive
+    square, DRAW otherwise. The totals are checked in chunks of similar
+    size, against a bounded range of roots at a time, so no array of more
+    than max_elements totals and roots is built.
+    >>> evaluate_totals(np.array([0, 1, 2, 3, 5, 10, 16])).tolist()
+    [-1.0, 1.0, -1.0, 0.0, -1.0, 0.0, 1.0]
+    >>> totals = list(range(300, 0, -7))
+    >>> evaluate_totals(np.array(totals), max_elements=16).tolist() == [
+    ...     float(SubtractSquareState(True, n).rough_outcome())
+    ...     for n in totals]
+    True"""
+    totals = np.asarray(totals, dtype=np.int64)
+    is_square = is_pos_square_array(totals)
+    all_left_square = np.ones(len(totals), dtype=bool)
+    # In increasing order of total, each chunk needs roots only up to the
+    # root of its last total.
+    order = np.argsort(totals, kind='stable')
+    max_roots = _isqrt_array(totals[order])
+    width = max(1, min(int(max_roots.max(initial=0)), isqrt(max_elements)))
+    rows = max(1, max_elements // width)
+    for start in range(0, len(order), rows):
+        # The totals of the chunk whose moves all left a square so far.
+        pending = order[start:start + rows]
+        max_root = int(max_roots[start + len(pending) - 1])
+        for first in range(1, max_root + 1, width):
+            roots = np.arange(first, min(first + width, max_root + 1),
+                              dtype=np.int64)
+            left = totals[pending][:, None] - roots[None, :] ** 2
+            left_square = np.all(is_pos_square_array(left) | (left <= 0),
+                                 axis=1)
+            all_left_square[pending[~left_square]] = False
+            pending = pending[left_square]
+            if len(pending) == 0:
+                break
+    return np.where(is_square, float(GameState.WIN),
+                    np.where(all_left_square, float(GameState.LOSE),
+                             float(GameState.DRAW)))
+
+
+def is_pos_square_array(values: Any) -> Any:
+    """Returns, element-wise, whether values are positive perfect squares.
+    >>> is_pos_square_array(np.array([-4, 0, 1, 8, 9, 10 ** 12])).tolist()
+    [False, False, True, False, True, True]"""
+    roots = _isqrt_array(values)
+    return (values > 0) & (roots * roots == values)
+
+
+def _isqrt_array(values: Any) -> Any:
+    """Returns the integer square root of each non-negative value (0 for
+    negative values), corrected for floating point error.
+    >>> _isqrt_array(np.array([0, 15, 16, 10 ** 14 - 1])).tolist()
+    [0, 3, 4, 9999999]"""
+    values = np.maximum(np.asarray(values, dtype=np.int64), 0)
+    roots = np.floor(np.sqrt(values.astype(np.float64))).astype(np.int64)
+    roots = np.where(roots * roots > values, roots - 1, roots)
+    return np.where((roots + 1) * (roots + 1) <= values, roots + 1, roots)
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
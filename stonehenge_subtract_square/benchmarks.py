@@ -0,0 +1,227 @@
+"""Benchmarks for the games and strategies. Run a benchmark by name, e.g.
+
+    python benchmarks.py evaluator
+"""
+
+import random
+import time
+from typing import Any, Callable, Dict, List
+from stonehenge_gamestate import StonehengeGamestate
+
+
+def random_positions(size: int, count: int,
+                     seed: int = 0) -> List[StonehengeGamestate]:
+    """Returns count unfinished Stonehenge positions of the given size,
+    reached by playing random moves from a new board.
+    >>> positions = random_positions(2, 5)
+    >>> len(positions)
+    5
+    >>> all(x.get_possible_moves() != [] for x in positions)
+    True"""
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        state = StonehengeGamestate(rng.random() < 0.5, size)
+        for _ in range(rng.randint(0, 2 * size)):
+            next_state = state.make_move(
+                rng.choice(state.get_possible_moves()))
+            if next_state.get_possible_moves() == []:
+                break
+            state = next_state
+        positions.append(state)
+    return positions
+
+
+def per_second(function: Callable[[Any], Any], inputs: List[Any],
+               min_time: float = 0.5) -> float:
+    """Returns how many times per second function can be called, running it
+    over inputs repeatedly for at least min_time seconds."""
+    calls, start = 0, time.perf_counter()
+    while True:
+        for item in inputs:
+            function(item)
+        calls += len(inputs)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls / elapsed
+
+
+def bench_evaluator(sizes: List[int] = None) -> Dict[int, tuple]:
+    """Returns, for each board size, the evaluations per second of
+    StonehengeGamestate.rough_outcome and of the HeuristicEvaluator."""
+    from stonehenge_evaluator import evaluate
+    results = {}
+    for size in sizes or [2, 3, 4, 5]:
+        positions = random_positions(size, 50)
+        results[size] = (per_second(lambda x: x.rough_outcome(), positions),
+                         per_second(evaluate, positions))
+        print("size {}: rough_outcome {:>10,.0f}/s   evaluator {:>10,.0f}/s"
+              .format(size, *results[size]))
+    return results
+
+
+def bench_batch(batch_size: int = 2000) -> Dict[int, tuple]:
+    """Returns, for each board size, the positions per second scored one at
+    a time by the HeuristicEvaluator and as one batch by evaluate_batch."""
+    from batch_evaluation import evaluate_batch
+    from stonehenge_evaluator import evaluate
+    results = {}
+    for size in [3, 5]:
+        positions = random_positions(size, batch_size)
+        results[size] = (per_second(evaluate, positions),
+                         per_second(evaluate_batch, [positions]) * batch_size)
+        print("size {}: one at a time {:>10,.0f}/s   batch {:>10,.0f}/s"
+              .format(size, *results[size]))
+    return results
+
+
+def bench_heaps(heap_counts: List[int] = None,
+                max_minimax_heaps: int = 3) -> Dict[int, tuple]:
+    """Returns, for each number of heaps, the seconds taken to choose a move
+    in multi-heap SubtractSquare by the XOR of Grundy values and, for at most
+    max_minimax_heaps heaps, by minimax over the combined state."""
+    from multi_heap_game import MultiHeapGame, MultiHeapState, xor_strategy
+    from strategy_try import stack_minimax
+    rng = random.Random(0)
+    results = {}
+    for heaps in heap_counts or [1, 2, 3, 4, 8, 16, 32, 64]:
+        game = MultiHeapGame(True, MultiHeapState(
+            True, [rng.randint(1, 1000) for _ in range(heaps)]))
+        xor_time = 1 / per_second(xor_strategy, [game], 0.2)
+        minimax_time = None
+        if heaps <= max_minimax_heaps:
+            small = MultiHeapGame(True, MultiHeapState(True, [6] * heaps))
+            start = time.perf_counter()
+            stack_minimax(small)
+            minimax_time = time.perf_counter() - start
+        results[heaps] = (xor_time, minimax_time)
+        print("{:>2} heaps: xor {:>8.1f} us   minimax (heaps of 6) {}".format(
+            heaps, xor_time * 1e6, "-" if minimax_time is None
+            else "{:.1f} us".format(minimax_time * 1e6)))
+    return results
+
+
+def bench_render(sizes: List[int] = None) -> Dict[int, tuple]:
+    """Returns, for each board size, the boards per second drawn in full and
+    the moves per second drawn as changes by a DiffRenderer."""
+    from stonehenge_render import DiffRenderer
+    results = {}
+    for size in sizes or [3, 5, 8]:
+        positions = random_positions(size, 50)
+        renderer = DiffRenderer()
+        results[size] = (per_second(str, positions),
+                         per_second(renderer.render, positions))
+        print("size {}: full {:>10,.0f}/s   diff {:>10,.0f}/s"
+              .format(size, *results[size]))
+    return results
+
+
+def bench_replay(num_games: int = 2000, size: int = 5) -> float:
+    """Returns the recorded Stonehenge games per hour read back from a record
+    file and audited by replaying them."""
+    import os
+    import tempfile
+    from game_record import RecordWriter, audit, play_recorded, read_records
+    from stonehenge_game import StonehengeGame
+    rng = random.Random(0)
+
+    def random_move(game: Any) -> Any:
+        """Returns a random possible move."""
+        return rng.choice(game.current_state.get_possible_moves())
+
+    path = os.path.join(tempfile.mkdtemp(), 'games.rec')
+    with RecordWriter(path) as writer:
+        for _ in range(num_games):
+            game = StonehengeGame(True, StonehengeGamestate(True, size))
+            writer.write(play_recorded(game, random_move, random_move))
+    start = time.perf_counter()
+    checked, failed = audit(read_records(path))
+    per_hour = checked / (time.perf_counter() - start) * 3600
+    print("size {}: {:,.0f} games/hour replayed, {} failed, {:.0f} bytes/game"
+          .format(size, per_hour, len(failed),
+                  os.path.getsize(path) / num_games))
+    os.remove(path)
+    return per_hour
+
+
+def bench_reuse(total: int = 38) -> tuple:
+    """Returns the seconds taken by each move of a SubtractSquare game from
+    total played by minimax for both players, searching from scratch
+    (iterative_minimax) and keeping the search tree (TreeReuseMinimax)."""
+    from strategy_try import TreeReuseMinimax, iterative_minimax
+    from subtract_square_game import SubtractSquareGame
+    from subtract_square_state import SubtractSquareState
+    results = []
+    for strategy in [iterative_minimax, TreeReuseMinimax()]:
+        game = SubtractSquareGame(True, SubtractSquareState(True, total))
+        times = []
+        while not game.is_over(game.current_state):
+            start = time.perf_counter()
+            move = strategy(game)
+            times.append(time.perf_counter() - start)
+            game.current_state = game.current_state.make_move(move)
+        results.append(times)
+        print("{:>18}: total {:.2f} s, first move {:.2f} s, later moves "
+              "{:.3f} s".format(getattr(strategy, '__name__',
+                                        type(strategy).__name__),
+                                sum(times), times[0], sum(times[1:])))
+    return tuple(results)
+
+
+def bench_startup(runs: int = 10) -> Dict[str, float]:
+    """Returns the median seconds a new Python process takes to start the
+    game interface, with the games and strategies left unimported as the
+    interface starts, and with all of them imported as when they were
+    imported at startup. Python's own start is measured alone and
+    subtracted."""
+    import os
+    import statistics
+    import subprocess
+    import sys
+    programs = {'python': 'pass',
+                'interface': 'import game_interface',
+                'everything': 'import game_interface as g\n'
+                              'for r in [g.playable_games, '
+                              'g.usable_strategies]:\n'
+                              '    [r[key] for key in r]'}
+    here = os.path.dirname(os.path.abspath(__file__))
+    medians = {}
+    for name, program in programs.items():
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', program], cwd=here,
+                           check=True)
+            times.append(time.perf_counter() - start)
+        medians[name] = statistics.median(times)
+    results = {name: medians[name] - medians['python']
+               for name in ['interface', 'everything']}
+    print("python {:.1f} ms, then interface {:.1f} ms, everything imported "
+          "{:.1f} ms".format(medians['python'] * 1e3,
+                             results['interface'] * 1e3,
+                             results['everything'] * 1e3))
+    return results
+
+
+BENCHMARKS = {'batch': bench_batch,
+              'evaluator': bench_evaluator,
+              'heaps': bench_heaps,
+              'render': bench_render,
+              'replay': bench_replay,
+              'reuse': bench_reuse,
+              'startup': bench_startup}
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('names', nargs='*',
+                        help='benchmarks to run, from {} (default: all)'
+                        .format(", ".join(sorted(BENCHMARKS))))
+    names = parser.parse_args().names or sorted(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown != []:
+        parser.error("unknown benchmarks: {}".format(", ".join(unknown)))
+    for name in names:
+        print("== {} ==".format(name))
+        BENCHMARKS[name]()
@@ -1,17 +1,19 @@
 """Represent a Queue."""
 # NOTE: THIS FILE IS TAKEN FROM THE LAB HANDOUT, FROM CLASS. As was posted by
 # an instructor on Piazza, we are permitted to use these files when citing them.
+from collections import deque
 
 
 class Queue:
-    """Represent a FIFO queue."""
+    """Represent a FIFO queue, backed by a deque so that adding and removing
+    are O(1)."""
 
     def __init__(self):
         """ (Queue) -> NoneType
 
         Create and initialize new queue self.
         """
-        self._data = []
+        self._data = deque()
 
     def add(self, o):
         """(Queue, object) -> NoneType
@@ -20,6 +22,17 @@ class Queue:
         """
         self._data.append(o)
 
+    def extend(self, objects):
+        """(Queue, iterable) -> NoneType
+
+        Add every object in objects at the back of this queue, in order.
+        >>> q = Queue()
+        >>> q.extend([3, 5])
+        >>> q.remove()
+        3
+        """
+        self._data.extend(objects)
+
     def remove(self):
         """ (Queue) -> object
 
@@ -30,7 +43,29 @@ class Queue:
         >>> q.remove()
         3
         """
-        return self._data.pop(0)
+        return self._data.popleft()
+
+    def drain(self):
+        """ (Queue) -> iterator
+
+        Remove and yield front objects from self until self is empty,
+        including objects added while draining.
+        >>> q = Queue()
+        >>> q.extend([1, 2])
+        >>> for o in q.drain():
+        ...     if o < 4:
+        ...         q.add(o * 2)
+        ...     print(o)
+        1
+        2
+        2
+        4
+        4
+        >>> q.is_empty()
+        True
+        """
+        while self._data:
+            yield self._data.popleft()
 
     def is_empty(self):
         """ (Queue) -> bool
@@ -46,7 +81,18 @@ class Queue:
         >>> q.is_empty()
         True
         """
-        return self._data == []
+        return not self._data
+
+    def __len__(self):
+        """ (Queue) -> int
+
+        Return the number of objects in self.
+        >>> q = Queue()
+        >>> q.extend('abc')
+        >>> len(q)
+        3
+        """
+        return len(self._data)
 
 
 if __name__ == '__main__':
@@ -9,20 +9,39 @@ strategy cannot be used on Chopsticks unless you account for infinite loops.
 your own curiousity!)
 """
 
-from strategy_try import interactive_strategy, recursive_minimax, iterative_minimax
-from typing import Any, Callable
-from subtract_square_game import SubtractSquareGame
-from stonehenge_game import StonehengeGame
+import time
+from typing import TYPE_CHECKING, Any, Callable, Optional
+from registry import LazyRegistry
+
+if TYPE_CHECKING:
+    from game_record import RecordWriter
+
+# The games and strategies are imported when one is chosen, so that the
+# interface starts without importing the ones not played.
 
 # 'h' should map to Stonehenge.
-playable_games = {'s': SubtractSquareGame,
-                  'h': StonehengeGame}
+playable_games = LazyRegistry({'s': 'subtract_square_game:SubtractSquareGame',
+                               'h': 'stonehenge_game:StonehengeGame'})
 
 # 'mr' should map to your recursive implementation of minimax while
-# 'mi' should map to your iterative implementation of minimax
-usable_strategies = {'i': interactive_strategy,
-                     'mr': recursive_minimax,
-                     'mi': iterative_minimax}
+# 'mi' should map to your iterative implementation of minimax; these and 'i'
+# are the strategy functions as Strategy objects
+# 'ms' is the iterative minimax that keeps one frame per level of the game
+# 'pn' plays a winning move found by proof-number search when there is one
+# 'mt' is iterative minimax keeping its search tree from move to move
+# 'mb' and 'pb' are minimax and proof-number search within the budget given
+# by --budget (no limits by default)
+# Stateful strategies are given as classes, and each player gets a new
+# instance for the game.
+usable_strategies = LazyRegistry({
+    'i': 'strategies:interactive_player',
+    'mr': 'strategies:recursive_minimax_strategy',
+    'mi': 'strategies:iterative_minimax_strategy',
+    'ms': 'strategy_try:stack_minimax',
+    'pn': 'proof_number:proof_number_strategy',
+    'mt': 'strategy_try:TreeReuseMinimax',
+    'mb': 'strategies:MinimaxStrategy',
+    'pb': 'proof_number:ProofNumberStrategy'})
 
 
 class GameInterface:
@@ -32,11 +51,21 @@ class GameInterface:
     """
 
     def __init__(self, game: Any, p1_strategy: Callable,
-                 p2_strategy: Callable[[Any], Any]) -> None:
+                 p2_strategy: Callable[[Any], Any],
+                 redraw: str = 'full',
+                 recorder: Optional['RecordWriter'] = None,
+                 ponder: bool = False,
+                 report_memory: Optional[Callable] = None) -> None:
         """
         Initialize this GameInterface, setting its active game to game, and
         using the strategies p1_strategy for Player 1 and p2_strategy for
-        Player 2.
+        Player 2. With redraw 'diff', the board is shown in full once and
+        then only what each move changed. If recorder is given, the game's
+        record is appended to it when the game ends. With ponder, an engine
+        playing against interactive_strategy searches its replies while the
+        human thinks. If report_memory is given, the memory used by each
+        engine move is profiled and its report passed to report_memory as
+        soon as the move is chosen.
 
         :param game: The game to be played.
         :type game:
@@ -44,6 +73,15 @@ class GameInterface:
         :type p1_strategy:
         :param p2_strategy: The strategy for Play 2.
         :type p2_strategy:
+        :param redraw: 'full' or 'diff'.
+        :type redraw: str
+        :param recorder: Where to write the record of the game.
+        :type recorder: RecordWriter
+        :param ponder: Whether the engine searches on the human's time.
+        :type ponder: bool
+        :param report_memory: What to call with the memory report of each
+            move.
+        :type report_memory: Callable[[MemoryReport], Any]
         """
         first_player = input("Type y if player 1 is to make the first move: ")
         is_p1_turn = False
@@ -51,17 +89,44 @@ class GameInterface:
             is_p1_turn = True
 
         self.game = game(is_p1_turn)
+        # Stateful strategies are given as classes: make one for each player.
+        if isinstance(p1_strategy, type):
+            p1_strategy = p1_strategy()
+        if isinstance(p2_strategy, type):
+            p2_strategy = p2_strategy()
         self.p1_strategy = p1_strategy
         self.p2_strategy = p2_strategy
+        if ponder:
+            from pondering import pondering_strategies
+            self.p1_strategy, self.p2_strategy = pondering_strategies(
+                p1_strategy, p2_strategy)
+        if report_memory is not None:
+            from memory_profile import memory_profiled
+            from strategy_try import is_interactive
+            if not is_interactive(p1_strategy):
+                self.p1_strategy = memory_profiled(self.p1_strategy,
+                                                   report_memory)
+            if not is_interactive(p2_strategy):
+                self.p2_strategy = memory_profiled(self.p2_strategy,
+                                                   report_memory)
+        self.show = str
+        if redraw == 'diff':
+            from stonehenge_render import DiffRenderer
+            self.show = DiffRenderer().render
+        self.recorder = recorder
 
     def play(self) -> None:
         """
         Play the game.
         """
         current_state = self.game.current_state
+        record = None
+        if self.recorder is not None:
+            from game_record import GameRecord
+            record = GameRecord.from_state(current_state)
 
         print(self.game.get_instructions())
-        print(current_state)
+        print(self.show(current_state))
 
         # Pick moves until the game is over
         while not self.game.is_over(current_state):
@@ -74,12 +139,16 @@ class GameInterface:
                 print(move)
 
             # Pick a (legal) move.
+            started = time.perf_counter()
             while not current_state.is_valid_move(move_to_make):
                 current_strategy = self.p2_strategy
                 if current_state.get_current_player_name() == 'p1':
                     current_strategy = self.p1_strategy
                 move_to_make = current_strategy(self.game)
 
+            if record is not None:
+                record.add(move_to_make, time.perf_counter() - started)
+
             # Apply the move
             current_player_name = current_state.get_current_player_name()
             new_game_state = current_state.make_move(move_to_make)
@@ -88,7 +157,7 @@ class GameInterface:
 
             print("{} made the move {}. The game's state is now:".format(
                 current_player_name, move_to_make))
-            print(current_state)
+            print(self.show(current_state))
 
         # Print out the winner of the game
         if self.game.is_winner("p1"):
@@ -98,16 +167,50 @@ class GameInterface:
         else:
             print("It's a tie!")
 
+        if record is not None:
+            from game_record import game_winner
+            record.winner = game_winner(self.game)
+            self.recorder.write(record)
+
 
 if __name__ == '__main__':
-    games = ", ".join(["'{}': {}".format(key, playable_games[key].__name__) if
-                       playable_games[key] is not None else
-                       "'{}': None".format(key) for key in playable_games])
+    import os
+    import sys
+    # Pass --diff to show only the changes to the board after each move.
+    redraw_mode = 'diff' if '--diff' in sys.argv[1:] else 'full'
+    # Pass --ponder to let the engine search while a human enters a move.
+    ponder_mode = '--ponder' in sys.argv[1:]
+    # Pass --budget LIMITS, e.g. --budget depth=4,time=2, to set the limits
+    # of the strategies that take a budget.
+    budget = None
+    if '--budget' in sys.argv[1:-1]:
+        from strategies import parse_budget
+        budget = parse_budget(sys.argv[sys.argv.index('--budget') + 1])
+    # Pass --record FILE to append the record of the game to FILE.
+    record_file = None
+    if '--record' in sys.argv[1:-1]:
+        from game_record import RecordWriter
+        record_file = RecordWriter(sys.argv[sys.argv.index('--record') + 1])
+    # Pass --memory-report FILE to profile the memory used by each engine
+    # move and append the reports to FILE, one JSON line per move, each
+    # written as soon as the move is chosen.
+    memory_file, report_memory = None, None
+    if '--memory-report' in sys.argv[1:-1]:
+        from memory_profile import MemoryReportWriter
+        memory_file = MemoryReportWriter(
+            sys.argv[sys.argv.index('--memory-report') + 1])
+        report_memory = memory_file.write
+    # Pass --profile FILE, or set STONEHENGE_PROFILE=FILE, to count and time
+    # the calls of the game hot paths and write them to FILE as collapsed
+    # stacks for a flame graph.
+    profile_file = os.environ.get('STONEHENGE_PROFILE') or None
+    if '--profile' in sys.argv[1:-1]:
+        profile_file = sys.argv[sys.argv.index('--profile') + 1]
+    games = ", ".join(["'{}': {}".format(key, playable_games.name(key))
+                       for key in playable_games])
 
     strategies = ", ".join(["'{}': {}".format(key,
-                                              usable_strategies[key].__name__)
-                            if usable_strategies[key] is not None else
-                            "'{}': None".format(key)
+                                              usable_strategies.name(key))
                             for key in usable_strategies])
 
     chosen_game = ''
@@ -124,5 +227,23 @@ if __name__ == '__main__':
     while p2 not in usable_strategies.keys():
         p2 = input("Select the strategy for Player 2 ({}): ".format(strategies))
 
-    GameInterface(playable_games[chosen_game], usable_strategies[p1],
-                  usable_strategies[p2]).play()
+    p1_choice, p2_choice = usable_strategies[p1], usable_strategies[p2]
+    if budget is not None:
+        from strategies import with_budget
+        p1_choice = with_budget(p1_choice, budget)
+        p2_choice = with_budget(p2_choice, budget)
+    interface = GameInterface(playable_games[chosen_game],
+                              p1_choice, p2_choice, redraw_mode, record_file,
+                              ponder_mode, report_memory)
+    if profile_file is None:
+        interface.play()
+    else:
+        from hot_path_profile import HotPathProfiler
+        with HotPathProfiler() as profiler:
+            interface.play()
+        print(profiler.report())
+        profiler.write_collapsed(profile_file)
+    if record_file is not None:
+        record_file.close()
+    if memory_file is not None:
+        memory_file.close()
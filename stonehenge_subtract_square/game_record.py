@@ -0,0 +1,364 @@
+"""Compact, append-only records of played games, and a replay engine to
+audit them.
+
+A record file starts with the magic bytes b'SSGR' and a version byte, and
+holds one record per game, appended as each game ends:
+
+    tag - b'H' for Stonehenge, b'S' for SubtractSquare
+    p1 starts - 1 if Player 1 made the first move
+    winner - 0 if the game was not finished, 1 or 2 for the player, 3 tie
+    start - the board size or the starting total, 8 bytes
+    count - the number of moves, 4 bytes
+    moves - each move, as a 2-byte cell index (Stonehenge) or the 4-byte
+            square root of the square subtracted (SubtractSquare)
+    think times - the seconds taken to choose each move, 4-byte floats
+
+Replaying a record re-applies its moves on plain counters, without building
+game states or drawing boards, and checks that every move is legal and that
+the game ends with the recorded winner.
+"""
+
+import struct
+import time
+from math import isqrt
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, \
+    Optional, Tuple
+from game_state import GameState
+from state_codec import STONEHENGE_TAG, SUBTRACT_SQUARE_TAG
+from stonehenge_board import board_geometry, cell_id
+from stonehenge_gamestate import StonehengeGamestate
+from subtract_square_state import SubtractSquareState
+
+MAGIC = b'SSGR\x01'
+_HEADER = struct.Struct('<cBBQI')
+_MOVE_FORMATS = {STONEHENGE_TAG: 'H', SUBTRACT_SQUARE_TAG: 'I'}
+_WINNERS = {None: 0, 'p1': 1, 'p2': 2, 'tie': 3}
+_WINNER_NAMES = {code: name for name, code in _WINNERS.items()}
+_CELL_LINES: Dict[int, List[List[int]]] = {}
+
+
+class GameRecord:
+    """The record of one game.
+
+    tag - STONEHENGE_TAG or SUBTRACT_SQUARE_TAG
+    p1_starts - whether Player 1 made the first move
+    start - the board size, or the starting total
+    moves - the moves made, in order
+    think_times - the seconds taken to choose each move
+    winner - 'p1', 'p2' or 'tie', or None if the game was not finished
+    """
+    tag: bytes
+    p1_starts: bool
+    start: int
+    moves: List[Any]
+    think_times: List[float]
+    winner: Optional[str]
+
+    def __init__(self, tag: bytes, p1_starts: bool, start: int) -> None:
+        """Initializes the record of a game with no moves yet.
+        >>> GameRecord(STONEHENGE_TAG, True, 3).initial_state().size
+        3"""
+        self.tag = tag
+        self.p1_starts = p1_starts
+        self.start = start
+        self.moves = []
+        self.think_times = []
+        self.winner = None
+
+    @classmethod
+    def from_state(cls, state: GameState) -> 'GameRecord':
+        """Returns an empty record of a game starting at the new game state.
+        >>> GameRecord.from_state(SubtractSquareState(False, 20)).start
+        20
+        >>> from subtraction_game import CUBES, SubtractionState
+        >>> GameRecord.from_state(SubtractionState(True, 8, CUBES))
+        Traceback (most recent call last):
+        ...
+        TypeError: Cannot record SubtractionState"""
+        if isinstance(state, StonehengeGamestate):
+            return cls(STONEHENGE_TAG, state.p1_turn, state.size)
+        elif isinstance(state, SubtractSquareState):
+            return cls(SUBTRACT_SQUARE_TAG, state.p1_turn,
+                       state.current_total)
+        raise TypeError("Cannot record {}".format(type(state).__name__))
+
+    def __repr__(self) -> str:
+        """Returns a representation of this record.
+        >>> record = GameRecord(SUBTRACT_SQUARE_TAG, True, 5)
+        >>> record.add(4, 0.5)
+        >>> record
+        GameRecord(b'S', True, 5, [4], winner=None)"""
+        return "GameRecord({!r}, {}, {}, {}, winner={!r})".format(
+            self.tag, self.p1_starts, self.start, self.moves, self.winner)
+
+    def add(self, move: Any, seconds: float) -> None:
+        """Records move, which took seconds to choose."""
+        self.moves.append(move)
+        self.think_times.append(seconds)
+
+    def initial_state(self) -> GameState:
+        """Returns the state the game started from."""
+        if self.tag == STONEHENGE_TAG:
+            return StonehengeGamestate(self.p1_starts, self.start)
+        return SubtractSquareState(self.p1_starts, self.start)
+
+
+def encode_record(record: GameRecord) -> bytes:
+    """Returns the binary encoding of record.
+    >>> record = GameRecord(SUBTRACT_SQUARE_TAG, True, 5)
+    >>> record.add(4, 0.5)
+    >>> len(encode_record(record))
+    23"""
+    if record.tag == STONEHENGE_TAG:
+        codes = [cell_id(move) for move in record.moves]
+    else:
+        codes = [isqrt(int(move)) for move in record.moves]
+        if any(code * code != int(move)
+               for code, move in zip(codes, record.moves)):
+            raise ValueError("SubtractSquare moves must be squares")
+    count = len(codes)
+    return (_HEADER.pack(record.tag, int(record.p1_starts),
+                         _WINNERS[record.winner], record.start, count) +
+            struct.pack('<{}{}'.format(count, _MOVE_FORMATS[record.tag]),
+                        *codes) +
+            struct.pack('<{}f'.format(count), *record.think_times))
+
+
+def read_record(stream: BinaryIO) -> Optional[GameRecord]:
+    """Returns the next record from stream, or None at the end of it.
+    >>> from io import BytesIO
+    >>> record = GameRecord(STONEHENGE_TAG, False, 2)
+    >>> record.add('D', 0.25)
+    >>> record.winner = 'p2'
+    >>> stream = BytesIO(encode_record(record))
+    >>> read_record(stream)
+    GameRecord(b'H', False, 2, ['D'], winner='p2')
+    >>> read_record(stream) is None
+    True"""
+    header = stream.read(_HEADER.size)
+    if header == b'':
+        return None
+    if len(header) < _HEADER.size:
+        raise ValueError("Truncated game record")
+    tag, p1_starts, winner, start, count = _HEADER.unpack(header)
+    move_format = '<{}{}'.format(count, _MOVE_FORMATS[tag])
+    body = stream.read(struct.calcsize(move_format) + 4 * count)
+    if len(body) < struct.calcsize(move_format) + 4 * count:
+        raise ValueError("Truncated game record")
+    codes = struct.unpack_from(move_format, body)
+    record = GameRecord(tag, bool(p1_starts), start)
+    if tag == STONEHENGE_TAG:
+        names = board_geometry(start).cells
+        record.moves = [names[code] for code in codes]
+    else:
+        record.moves = [code * code for code in codes]
+    record.think_times = list(struct.unpack_from(
+        '<{}f'.format(count), body, struct.calcsize(move_format)))
+    record.winner = _WINNER_NAMES[winner]
+    return record
+
+
+class RecordWriter:
+    """Appends game records to a file, writing each game as it is given.
+
+    path - the file written to
+    games_written - how many records this writer has written
+    """
+    path: str
+    games_written: int
+    _file: BinaryIO
+
+    def __init__(self, path: str) -> None:
+        """Opens path for appending records, starting the file if it is new
+        or empty."""
+        self.path = path
+        self.games_written = 0
+        self._file = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def write(self, record: GameRecord) -> None:
+        """Appends record to the file."""
+        self._file.write(encode_record(record))
+        self.games_written += 1
+
+    def flush(self) -> None:
+        """Writes buffered records to disk."""
+        self._file.flush()
+
+    def close(self) -> None:
+        """Closes the file."""
+        self._file.close()
+
+    def __enter__(self) -> 'RecordWriter':
+        """Returns this writer, for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Closes the file at the end of a with statement."""
+        self.close()
+
+
+def read_records(path: str) -> Iterator[GameRecord]:
+    """Yields the records of the file at path, in the order written.
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'games.rec')
+    >>> with RecordWriter(path) as writer:
+    ...     writer.write(GameRecord(SUBTRACT_SQUARE_TAG, True, 4))
+    >>> with RecordWriter(path) as writer:
+    ...     writer.write(GameRecord(STONEHENGE_TAG, True, 1))
+    >>> [record.tag for record in read_records(path)]
+    [b'S', b'H']"""
+    with open(path, 'rb') as stream:
+        if stream.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a game record file".format(path))
+        record = read_record(stream)
+        while record is not None:
+            yield record
+            record = read_record(stream)
+
+
+def play_recorded(game: Any, p1_strategy: Callable[[Any], Any],
+                  p2_strategy: Callable[[Any], Any]) -> GameRecord:
+    """Plays game to the end with the given strategies, without printing,
+    and returns its record.
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from strategy_try import iterative_minimax
+    >>> g1 = SubtractSquareGame(True, SubtractSquareState(True, 10))
+    >>> record = play_recorded(g1, iterative_minimax, iterative_minimax)
+    >>> record.moves, record.winner
+    ([1, 4, 1, 4], 'p2')"""
+    state = game.current_state
+    record = GameRecord.from_state(state)
+    while not game.is_over(state):
+        strategy = p1_strategy if state.get_current_player_name() == 'p1' \
+            else p2_strategy
+        started = time.perf_counter()
+        move = strategy(game)
+        while not state.is_valid_move(move):
+            move = strategy(game)
+        record.add(move, time.perf_counter() - started)
+        state = game.current_state = state.make_move(move)
+    record.winner = game_winner(game)
+    return record
+
+
+def game_winner(game: Any) -> str:
+    """Returns 'p1' or 'p2' if that player has won game, and 'tie'
+    otherwise."""
+    for player in ('p1', 'p2'):
+        if game.is_winner(player):
+            return player
+    return 'tie'
+
+
+def replay(record: GameRecord) -> Optional[str]:
+    """Returns the winner of the game made by the moves of record ('p1' or
+    'p2'), or None if the moves do not finish the game. Raises ValueError
+    if a move is not legal.
+    >>> record = GameRecord(STONEHENGE_TAG, False, 1)
+    >>> replay(record)
+    >>> record.moves.append('A')
+    >>> replay(record)
+    'p2'
+    >>> record.moves.append('B')
+    >>> replay(record)
+    Traceback (most recent call last):
+    ...
+    ValueError: Move 2 is made after the game is over"""
+    if record.tag == STONEHENGE_TAG:
+        index = board_geometry(record.start).cell_index
+        try:
+            cells = [index[move] for move in record.moves]
+        except KeyError as error:
+            raise ValueError("No cell {}".format(error)) from None
+        return _replay_stonehenge(record.start, record.p1_starts, cells)
+    return _replay_subtract_square(record.start, record.p1_starts,
+                                   record.moves)
+
+
+def _cell_lines(size: int) -> List[List[int]]:
+    """Returns, for each cell of a board of the given size, the indices of
+    the ley-lines through it."""
+    if size not in _CELL_LINES:
+        geometry = board_geometry(size)
+        through: List[List[int]] = [[] for _ in geometry.cells]
+        for j, line in enumerate(geometry.lines):
+            for cell in line:
+                through[cell].append(j)
+        _CELL_LINES[size] = through
+    return _CELL_LINES[size]
+
+
+def _replay_stonehenge(size: int, p1_starts: bool,
+                       cells: List[int]) -> Optional[str]:
+    """Replays the claims of cells on a new board of the given size."""
+    geometry = board_geometry(size)
+    lengths = [len(line) for line in geometry.lines]
+    num_lines = len(lengths)
+    through = _cell_lines(size)
+    counts = ([0] * num_lines, [0] * num_lines)
+    owned, taken, captured = [0] * num_lines, [False] * len(through), [0, 0]
+    player = 0 if p1_starts else 1
+    for n, cell in enumerate(cells):
+        if 2 * max(captured) >= num_lines:
+            raise ValueError("Move {} is made after the game is over"
+                             .format(n + 1))
+        if taken[cell]:
+            raise ValueError("Move {} claims a taken cell".format(n + 1))
+        taken[cell] = True
+        mine = counts[player]
+        for j in through[cell]:
+            mine[j] += 1
+            if not owned[j] and 2 * mine[j] >= lengths[j]:
+                owned[j] = True
+                captured[player] += 1
+        player = 1 - player
+    if 2 * captured[0] >= num_lines:
+        return 'p1'
+    return 'p2' if 2 * captured[1] >= num_lines else None
+
+
+def _replay_subtract_square(total: int, p1_starts: bool,
+                            moves: List[int]) -> Optional[str]:
+    """Replays the subtraction of moves from total."""
+    p1_to_move = p1_starts
+    for n, move in enumerate(moves):
+        if total == 0:
+            raise ValueError("Move {} is made after the game is over"
+                             .format(n + 1))
+        if not 0 < move <= total or isqrt(move) ** 2 != move:
+            raise ValueError("Move {} is not a square up to the total"
+                             .format(n + 1))
+        total -= move
+        p1_to_move = not p1_to_move
+    if total != 0:
+        return None
+    return 'p2' if p1_to_move else 'p1'
+
+
+def audit(records: Iterable[GameRecord]) -> Tuple[int, List[int]]:
+    """Replays records and returns how many there were, and the positions
+    of those with an illegal move or a winner other than the recorded one.
+    >>> good = GameRecord(SUBTRACT_SQUARE_TAG, True, 5)
+    >>> good.moves, good.winner = [1, 4], 'p2'
+    >>> bad = GameRecord(SUBTRACT_SQUARE_TAG, True, 5)
+    >>> bad.moves, bad.winner = [2, 3], 'p2'
+    >>> audit([good, bad, good])
+    (3, [1])"""
+    checked, failed = 0, []
+    for i, record in enumerate(records):
+        checked += 1
+        try:
+            if replay(record) != record.winner:
+                failed.append(i)
+        except ValueError:
+            failed.append(i)
+    return checked, failed
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
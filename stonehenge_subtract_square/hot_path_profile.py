@@ -0,0 +1,187 @@
+"""Profiling of the game hot paths during real matches.
+
+While a HotPathProfiler is active, each function in HOT_PATHS is replaced
+by a wrapper. The wrapper counts the calls and times them with
+time.perf_counter. Nothing is changed when no profiler is active. A
+profiler records, for each function:
+
+    calls - the number of calls
+    total - the seconds spent in the function, including the functions it
+            calls (a recursive call is timed once, by its outermost call)
+
+It also records the self time of each stack of hot-path calls. For
+example, a stack is make_move calling change_ley_lines calling
+attribute_ley_line. collapsed_stacks writes these stacks in the folded
+format read by flamegraph.pl and speedscope, one line per stack, weighted
+by microseconds.
+
+Profile a match without editing the code by passing --profile FILE to
+game_interface.py, or by setting the environment variable STONEHENGE_PROFILE
+to a file name.
+"""
+
+import functools
+import importlib
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# The functions profiled by default, as 'module:attribute path'.
+HOT_PATHS = ('stonehenge_gamestate:StonehengeGamestate.make_move',
+             'stonehenge_gamestate:StonehengeGamestate.get_possible_moves',
+             'stonehenge_gamestate:StonehengeGamestate.rough_outcome',
+             'stonehenge_gamestate:change_ley_lines',
+             'stonehenge_gamestate:attribute_ley_line',
+             'subtract_square_state:SubtractSquareState.make_move',
+             'subtract_square_state:SubtractSquareState.get_possible_moves',
+             'subtract_square_state:SubtractSquareState.rough_outcome',
+             'strategy_try:score_tree',
+             'strategy_try:best_move',
+             'tree:SearchTree.expand')
+
+
+class HotPathProfiler:
+    """Counts and times the calls of the hot paths while it is active, as
+    a context manager.
+
+    paths - the functions profiled, as 'module:attribute path'
+    calls - the number of calls of each function, by attribute path
+    total - the seconds spent in each function, including the functions it
+            calls, by attribute path
+    stacks - the seconds spent in the last function of each stack of
+             profiled calls, not counting the profiled functions it called
+    """
+    paths: Tuple[str, ...]
+    calls: Dict[str, int]
+    total: Dict[str, float]
+    stacks: Dict[Tuple[str, ...], float]
+    _originals: List[Tuple[Any, str, Any]]
+    _local: threading.local
+
+    def __init__(self, paths: Tuple[str, ...] = HOT_PATHS) -> None:
+        """Initializes a profiler of paths with nothing recorded.
+        >>> from stonehenge_gamestate import StonehengeGamestate
+        >>> with HotPathProfiler() as profiler:
+        ...     x1 = StonehengeGamestate(True, 2).make_move('A')
+        >>> profiler.calls['StonehengeGamestate.make_move']
+        1
+        >>> profiler.calls['attribute_ley_line']
+        9
+        >>> sorted(profiler.stacks)[0]
+        ('StonehengeGamestate.make_move',)
+        >>> StonehengeGamestate.make_move.__qualname__
+        'StonehengeGamestate.make_move'"""
+        self.paths = paths
+        self.calls, self.total, self.stacks = {}, {}, {}
+        self._originals = []
+        self._local = threading.local()
+
+    def __enter__(self) -> 'HotPathProfiler':
+        """Starts profiling."""
+        for path in self.paths:
+            module_name, attribute_path = path.split(':')
+            owner: Any = importlib.import_module(module_name)
+            *owners, name = attribute_path.split('.')
+            for owner_name in owners:
+                owner = getattr(owner, owner_name)
+            original = owner.__dict__[name]
+            self._originals.append((owner, name, original))
+            setattr(owner, name, self._timed(original, attribute_path))
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stops profiling and puts the original functions back."""
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals = []
+
+    def _timed(self, function: Callable, name: str) -> Callable:
+        """Returns function wrapped to record its calls under name."""
+        calls, total, stacks, local = (self.calls, self.total, self.stacks,
+                                       self._local)
+        calls.setdefault(name, 0)
+        total.setdefault(name, 0.0)
+
+        @functools.wraps(function)
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            """Calls function, recording the call."""
+            if not hasattr(local, 'stack'):
+                local.stack, local.child_times = [], []
+            stack, child_times = local.stack, local.child_times
+            stack.append(name)
+            child_times.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                key = tuple(stack)
+                stack.pop()
+                own = elapsed - child_times.pop()
+                if child_times:
+                    child_times[-1] += elapsed
+                stacks[key] = stacks.get(key, 0.0) + own
+                calls[name] += 1
+                if name not in stack:
+                    total[name] += elapsed
+        return timed
+
+    def report(self) -> str:
+        """Returns a table of the calls and times of the profiled functions
+        that were called, most total time first."""
+        lines = ["{:>10} {:>10} {:>10}  {}".format('calls', 'total s',
+                                                   'us/call', 'function')]
+        for name in sorted(self.calls, key=lambda x: -self.total[x]):
+            if self.calls[name] > 0:
+                lines.append("{:>10} {:>10.4f} {:>10.2f}  {}".format(
+                    self.calls[name], self.total[name],
+                    self.total[name] / self.calls[name] * 1e6, name))
+        return "\n".join(lines)
+
+    def collapsed_stacks(self) -> List[str]:
+        """Returns the recorded stacks in the folded format of flamegraph.pl,
+        each weighted by its self time in whole microseconds.
+        >>> profiler = HotPathProfiler()
+        >>> profiler.stacks = {('a',): 0.5, ('a', 'b'): 0.25}
+        >>> profiler.collapsed_stacks()
+        ['a 500000', 'a;b 250000']"""
+        return ["{} {}".format(';'.join(stack), round(seconds * 1e6))
+                for stack, seconds in sorted(self.stacks.items())]
+
+    def write_collapsed(self, path: str) -> None:
+        """Writes the collapsed stacks to the file at path."""
+        with open(path, 'w') as out:
+            for line in self.collapsed_stacks():
+                out.write(line + '\n')
+
+
+def profiled(function: Callable[..., Any],
+             output: Optional[str] = None) -> Callable[..., Any]:
+    """Returns function with each call run under a HotPathProfiler, whose
+    report is printed and whose collapsed stacks are written to output if
+    it is given.
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from subtract_square_state import SubtractSquareState
+    >>> from strategy_try import stack_minimax
+    >>> game = SubtractSquareGame(True, SubtractSquareState(True, 5))
+    >>> profiled(stack_minimax)(game)  # doctest: +ELLIPSIS
+         calls    total s    us/call  function
+    ...
+    1"""
+    @functools.wraps(function)
+    def profiled_function(*args: Any, **kwargs: Any) -> Any:
+        """Calls function under a profiler."""
+        with HotPathProfiler() as profiler:
+            result = function(*args, **kwargs)
+        print(profiler.report())
+        if output is not None:
+            profiler.write_collapsed(output)
+        return result
+    return profiled_function
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,446 @@
+"""An asyncio match server hosting many concurrent games over a local
+line protocol.
+
+Each client plays Player 1 against an engine strategy playing Player 2.
+Commands are one line each and every command gets exactly one reply line:
+
+    NEW <game> <size or total> <y if player 1 starts> <strategy>
+        -> OK <session> [engine=<move>] (turn=client | winner=<player>)
+    MOVE <session> <move>
+        -> OK <session> [engine=<move>] (turn=client | winner=<player>)
+    QUIT <session>
+        -> OK <session>
+
+Errors are reported as "ERR [<session>] <reason>". Strategy calls run in a
+bounded process pool; at most max_pending of them are in flight at once
+(further requests wait for a free slot), and a strategy that does not answer
+within move_timeout seconds is replaced by the first legal move, reported as
+engine=<move>!timeout. The server then shuts its worker pool down and starts
+a new one, so that the timed-out search cannot hold up the other sessions.
+From Python 3.14 the old pool's workers are killed; before that the
+timed-out search runs to its end in a worker that then exits. A search that
+was running in the replaced pool for another session is started again in
+the new pool. If a worker dies and breaks the pool, the pool is replaced in
+the same way and the command is answered with "ERR [<session>] engine
+failed: <reason>", leaving the session as it was before the command.
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import BrokenExecutor, Executor, Future, \
+    ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from game import Game
+from stonehenge_game import StonehengeGame
+from stonehenge_gamestate import StonehengeGamestate
+from subtract_square_game import SubtractSquareGame
+from subtract_square_state import SubtractSquareState
+from strategy_try import iterative_minimax, recursive_minimax, \
+    stack_minimax
+from proof_number import proof_number_strategy
+
+# The games and engine strategies a client can ask for. Interactive
+# strategies make no sense on the server side.
+server_strategies = {'mr': recursive_minimax,
+                     'mi': iterative_minimax,
+                     'ms': stack_minimax,
+                     'pn': proof_number_strategy}
+
+# The largest Stonehenge board a client can ask for.
+MAX_BOARD_SIZE = 20
+
+
+def new_game(game_key: str, p1_starts: bool, setting: int) -> Game:
+    """Returns a new game of the kind named by game_key ('h' for Stonehenge
+    with board size setting, 's' for SubtractSquare starting from total
+    setting) without asking for any input.
+    >>> new_game('s', True, 9).current_state.current_total
+    9
+    >>> new_game('h', False, 2).current_state.get_current_player_name()
+    'p2'
+    >>> new_game('h', True, 0)
+    Traceback (most recent call last):
+    ...
+    ValueError: Board size must be from 1 to 20: 0"""
+    if game_key == 'h':
+        if not 1 <= setting <= MAX_BOARD_SIZE:
+            raise ValueError("Board size must be from 1 to {}: {}".format(
+                MAX_BOARD_SIZE, setting))
+        return StonehengeGame(p1_starts,
+                              StonehengeGamestate(p1_starts, setting))
+    elif game_key == 's':
+        return SubtractSquareGame(p1_starts,
+                                  SubtractSquareState(p1_starts, setting))
+    raise ValueError("Unknown game: {}".format(game_key))
+
+
+class MatchSession:
+    """One game between a client (Player 1) and an engine (Player 2).
+
+    game - the game being played
+    strategy - the engine's strategy
+    """
+    game: Game
+    strategy: Callable[[Any], Any]
+
+    def __init__(self, game: Game, strategy: Callable[[Any], Any]) -> None:
+        """Initializes a session for game, with the engine using strategy.
+        >>> s1 = MatchSession(new_game('s', True, 4), iterative_minimax)
+        >>> s1.engine_to_move()
+        False"""
+        self.game = game
+        self.strategy = strategy
+
+    def engine_to_move(self) -> bool:
+        """Returns whether the game is still going and it is the engine's
+        turn."""
+        state = self.game.current_state
+        return (not self.game.is_over(state) and
+                state.get_current_player_name() == 'p2')
+
+    def apply(self, move: Any) -> None:
+        """Applies move to the game."""
+        self.game.current_state = self.game.current_state.make_move(move)
+
+    def status(self) -> str:
+        """Returns the status field of a reply: who won if the game is over,
+        otherwise that the client is to move.
+        >>> s1 = MatchSession(new_game('s', True, 4), iterative_minimax)
+        >>> s1.status()
+        'turn=client'
+        >>> s1.apply(4)
+        >>> s1.status()
+        'winner=p1'"""
+        if not self.game.is_over(self.game.current_state):
+            return 'turn=client'
+        for player in ('p1', 'p2'):
+            if self.game.is_winner(player):
+                return 'winner=' + player
+        return 'winner=tie'
+
+
+class MatchServer:
+    """Serves many concurrent MatchSessions over the line protocol.
+
+    sessions - the open sessions, by session id
+    move_timeout - seconds a strategy call may take before it is replaced
+    max_sessions - how many sessions may be open at once
+    """
+    sessions: Dict[int, MatchSession]
+    move_timeout: float
+    max_sessions: int
+    _executor: Executor
+    _new_pool: Optional[Callable[[], Executor]]
+    _slots: asyncio.Semaphore
+    _next_id: int
+    _connections: set
+
+    def __init__(self, executor: Optional[Executor] = None,
+                 max_workers: int = 2, max_pending: int = 8,
+                 move_timeout: float = 10.0,
+                 max_sessions: int = 1000) -> None:
+        """Initializes the server. Strategy calls run in executor, or in a
+        new process pool of max_workers processes if none is given. The
+        pool's workers are not forked from the serving process, which has
+        threads running by then. A pool the server made is replaced when a
+        strategy call times out; a given executor is kept, and a timed-out
+        call then holds its pending slot until it finishes."""
+        self.sessions = {}
+        self.move_timeout = move_timeout
+        self.max_sessions = max_sessions
+        self._new_pool = None
+        if executor is None:
+            context = None
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+            self._new_pool = lambda: ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=context)
+            executor = self._new_pool()
+        self._executor = executor
+        self._slots = asyncio.Semaphore(max_pending)
+        self._next_id = 1
+        self._connections = set()
+
+    def close(self) -> None:
+        """Shuts down the worker pool, and kills the searches still running
+        in a pool the server made where the pool can."""
+        if self._new_pool is not None:
+            shut_down_pool(self._executor)
+        else:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def serve(self, host: str = '127.0.0.1',
+                    port: int = 0) -> asyncio.AbstractServer:
+        """Starts listening on host and port and returns the asyncio server.
+        Port 0 picks a free port."""
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """Answers the commands of one client, one line at a time, and closes
+        the client's sessions when it disconnects."""
+        owned: List[int] = []
+        self._connections.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = await self.handle_command(
+                    line.decode().strip(), owned)
+                writer.write((reply + '\n').encode())
+                await writer.drain()
+        finally:
+            for session_id in owned:
+                self.sessions.pop(session_id, None)
+            writer.close()
+            self._connections.discard(asyncio.current_task())
+
+    async def wait_disconnected(self) -> None:
+        """Waits until every client connection has been closed."""
+        await asyncio.gather(*self._connections)
+
+    async def handle_command(self, line: str, owned: List[int]) -> str:
+        """Returns the reply to one command line. Session ids created by the
+        command are appended to owned."""
+        words = line.split()
+        if not words:
+            return 'ERR empty command'
+        command = words[0].upper()
+        if command == 'NEW' and len(words) == 5:
+            return await self._new(words[1:], owned)
+        elif command in ('MOVE', 'QUIT') and len(words) >= 2:
+            if not words[1].isdigit() or int(words[1]) not in self.sessions:
+                return 'ERR {} unknown session'.format(words[1])
+            session_id = int(words[1])
+            if command == 'QUIT':
+                del self.sessions[session_id]
+                return 'OK {}'.format(session_id)
+            if len(words) == 3:
+                return await self._move(session_id, words[2])
+        return 'ERR malformed command: {}'.format(line)
+
+    async def _new(self, args: List[str], owned: List[int]) -> str:
+        """Opens a session from the arguments of a NEW command."""
+        game_key, setting, first, strategy_key = args
+        if len(self.sessions) >= self.max_sessions:
+            return 'ERR server busy'
+        if strategy_key not in server_strategies:
+            return 'ERR unknown strategy: {}'.format(strategy_key)
+        if not setting.isdigit():
+            return 'ERR bad size or total: {}'.format(setting)
+        try:
+            game = new_game(game_key, first.lower() == 'y', int(setting))
+        except ValueError as error:
+            return 'ERR {}'.format(error)
+
+        session_id = self._next_id
+        self._next_id += 1
+        self.sessions[session_id] = MatchSession(
+            game, server_strategies[strategy_key])
+        owned.append(session_id)
+        try:
+            return await self._reply(session_id)
+        except BrokenExecutor as error:
+            del self.sessions[session_id]
+            owned.remove(session_id)
+            return 'ERR engine failed: {}'.format(error)
+
+    async def _move(self, session_id: int, move_str: str) -> str:
+        """Applies the client's move in a session and answers it."""
+        session = self.sessions[session_id]
+        state = session.game.current_state
+        move = session.game.str_to_move(move_str)
+        if (session.game.is_over(state) or session.engine_to_move() or
+                not state.is_valid_move(move)):
+            return 'ERR {} invalid move: {}'.format(session_id, move_str)
+        session.apply(move)
+        try:
+            return await self._reply(session_id)
+        except BrokenExecutor as error:
+            session.game.current_state = state
+            return 'ERR {} engine failed: {}'.format(session_id, error)
+
+    async def _reply(self, session_id: int) -> str:
+        """Lets the engine move if it is its turn and returns the reply."""
+        session = self.sessions[session_id]
+        fields = ['OK', str(session_id)]
+        if session.engine_to_move():
+            move, timed_out = await self._engine_move(session)
+            session.apply(move)
+            fields.append('engine={}{}'.format(
+                move, '!timeout' if timed_out else ''))
+        fields.append(session.status())
+        return ' '.join(fields)
+
+    async def _engine_move(self, session: MatchSession) -> tuple:
+        """Returns the engine's move in session, computed in the worker pool,
+        and whether the strategy ran out of time. Raises BrokenExecutor,
+        after replacing the pool if the server made it, if the pool broke
+        during the call."""
+        state = session.game.current_state
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.move_timeout
+        while True:
+            executor = self._executor
+            job = await self._submit(executor, session)
+            try:
+                move = await asyncio.wait_for(asyncio.wrap_future(job),
+                                              max(0, deadline - loop.time()))
+                break
+            except asyncio.TimeoutError:
+                self._replace_pool(executor)
+                return state.get_possible_moves()[0], True
+            except BrokenExecutor:
+                if executor is self._executor:  # Not replaced by a timeout.
+                    self._replace_pool(executor)
+                    raise
+        if not state.is_valid_move(move):
+            return state.get_possible_moves()[0], False
+        return move, False
+
+    async def _submit(self, executor: Executor,
+                      session: MatchSession) -> Future:
+        """Waits for a pending slot and returns the strategy call of session
+        submitted to executor. The slot is given back when the call has
+        finished, not when its answer is no longer awaited."""
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        try:
+            job = executor.submit(session.strategy, session.game)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        def release(_: Future) -> None:
+            """Gives the slot back on the event loop, unless the server has
+            stopped: a replaced pool may finish a call after that."""
+            try:
+                loop.call_soon_threadsafe(self._slots.release)
+            except RuntimeError:  # The event loop is closed.
+                pass
+        job.add_done_callback(release)
+        return job
+
+    def _replace_pool(self, executor: Executor) -> None:
+        """Replaces executor, the pool a call timed out in or that broke, by
+        a new pool and shuts it down, if the server made it and has not
+        replaced it already."""
+        if self._new_pool is None or executor is not self._executor:
+            return
+        self._executor = self._new_pool()
+        shut_down_pool(executor)
+
+
+def shut_down_pool(executor: Executor) -> None:
+    """Shuts executor down without waiting, cancelling the calls not yet
+    started. From Python 3.14 a process pool's workers are killed as well,
+    and the calls running in them fail with BrokenProcessPool; before that
+    they run to their end and their workers then exit."""
+    kill = getattr(executor, 'kill_workers', None)  # From Python 3.14.
+    if kill is not None:
+        kill()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+class LocalClient:
+    """A minimal client speaking the line protocol, used to drive a server
+    from the same process."""
+    _reader: asyncio.StreamReader
+    _writer: asyncio.StreamWriter
+
+    async def connect(self, host: str, port: int) -> None:
+        """Connects to the server at host and port."""
+        self._reader, self._writer = await asyncio.open_connection(host, port)
+
+    async def send(self, command: str) -> str:
+        """Sends one command and returns the reply line."""
+        self._writer.write((command + '\n').encode())
+        await self._writer.drain()
+        return (await self._reader.readline()).decode().strip()
+
+    async def close(self) -> None:
+        """Closes the connection."""
+        self._writer.close()
+        await self._writer.wait_closed()
+
+
+def play_local_match(commands: List[List[str]], **options: Any) -> List[list]:
+    """Starts a server with options, connects one LocalClient per list of
+    commands, runs all the clients concurrently, and returns each client's
+    replies.
+    >>> play_local_match([['NEW s 10 y mi', 'MOVE 1 1', 'MOVE 1 4']])
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [['OK 1 turn=client', 'OK 1 engine=4 turn=client',
+      'OK 1 engine=1 winner=p2']]
+    >>> play_local_match([['NEW h 1 n mi', 'MOVE 1 C', 'QUIT 1']])
+    [['OK 1 engine=A winner=p2', 'ERR 1 invalid move: C', 'OK 1']]
+    >>> play_local_match([['NEW x 3 y mi', 'NEW s 3 y zz', 'MOVE 9 1']])
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [['ERR Unknown game: x', 'ERR unknown strategy: zz',
+      'ERR 9 unknown session']]
+    >>> replies = play_local_match([['NEW s 1 n mi']] * 20, max_pending=2)
+    >>> sorted(int(reply.split()[1]) for [reply] in replies)[-1]
+    20
+    >>> all(reply.endswith('engine=1 winner=p2') for [reply] in replies)
+    True
+    >>> play_local_match([['NEW s 1 n mi']], move_timeout=0)
+    [['OK 1 engine=1!timeout winner=p2']]
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> class BrokenPool(ThreadPoolExecutor):
+    ...     def submit(self, *args: Any) -> Future:
+    ...         job = Future()
+    ...         job.set_exception(BrokenExecutor('worker died'))
+    ...         return job
+    >>> play_local_match([['NEW s 10 n mi', 'MOVE 1 1'],
+    ...                   ['NEW s 10 y mi', 'MOVE 2 1', 'MOVE 2 1']],
+    ...                  executor=BrokenPool())
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [['ERR engine failed: worker died', 'ERR 1 unknown session'],
+     ['OK 2 turn=client', 'ERR 2 engine failed: worker died',
+      'ERR 2 engine failed: worker died']]
+    """
+    async def run_client(port: int, lines: List[str]) -> List[str]:
+        client = LocalClient()
+        await client.connect('127.0.0.1', port)
+        replies = [await client.send(line) for line in lines]
+        await client.close()
+        return replies
+
+    async def run_all() -> List[list]:
+        server = MatchServer(**options)
+        listener = await server.serve()
+        port = listener.sockets[0].getsockname()[1]
+        try:
+            return list(await asyncio.gather(
+                *[run_client(port, lines) for lines in commands]))
+        finally:
+            listener.close()
+            await server.wait_disconnected()
+            server.close()
+
+    return asyncio.run(run_all())
+
+
+async def _main(host: str, port: int, workers: int, timeout: float) -> None:
+    """Runs a server until interrupted."""
+    server = MatchServer(max_workers=workers, move_timeout=timeout)
+    listener = await server.serve(host, port)
+    print("Serving on {}".format(listener.sockets[0].getsockname()))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=7148)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--timeout', type=float, default=10.0)
+    arguments = parser.parse_args()
+    asyncio.run(_main(arguments.host, arguments.port, arguments.workers,
+                      arguments.timeout))
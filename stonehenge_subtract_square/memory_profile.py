@@ -0,0 +1,295 @@
+"""Opt-in memory profiling of strategy calls.
+
+profile_memory(strategy, game) runs one strategy call with tracemalloc on
+and returns a MemoryReport. The report has one record per phase of the
+search. Phases are the start and end of the call, plus the points where a
+strategy calls mark_phase: after iterative_minimax and TreeReuseMinimax
+build their trees, after MinimaxStrategy's search and after a proof-number
+proof. Each record holds:
+
+    traced - the bytes allocated since profiling started and still held
+    peak - the most bytes held at once so far
+    live - the count and bytes of the live GameState, Tree and SearchTree
+           objects, each with everything it holds that is not already
+           counted
+    top - the source lines holding the most memory
+
+The report also keeps the peak resident set size during the call. On Linux
+the process's peak is reset before the call, so this is the peak of the call
+itself; elsewhere it is the peak of the process so far, and rss_scope says
+which. Reports convert to dicts and JSON, and a MemoryReportWriter appends
+each report to a file as soon as it is taken. mark_phase does nothing unless
+a profile is being taken, so strategies pay nothing for it otherwise.
+"""
+
+import gc
+import re
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, TextIO
+from game_state import GameState
+from tree import SearchTree, Tree
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+# The types whose live objects are counted, by the name they are reported
+# under.
+TRACKED_TYPES = {'GameState': GameState, 'Tree': Tree,
+                 'SearchTree': SearchTree}
+
+_active: List['MemoryReport'] = []
+
+
+class MemoryReport:
+    """The memory used by one strategy call.
+
+    strategy - the name of the strategy
+    move - the move it chose
+    seconds - how long the call took, with profiling
+    phases - one record per phase, in order
+    rss_peak - the peak resident set size during the call, in bytes, or
+               None where it cannot be measured
+    rss_scope - 'call' if rss_peak is the peak of the call alone, or
+                'process' if it is the peak of the whole process so far
+    """
+    strategy: str
+    move: Any
+    seconds: float
+    phases: List[Dict[str, Any]]
+    rss_peak: Optional[int]
+    rss_scope: str
+    _top: int
+
+    def __init__(self, strategy: str, top: int = 5) -> None:
+        """Initializes an empty report for a call of strategy, which keeps
+        the top source lines of each phase."""
+        self.strategy = strategy
+        self.move = None
+        self.seconds = 0.0
+        self.phases = []
+        self.rss_peak = None
+        self.rss_scope = 'process'
+        self._top = top
+
+    def record(self, phase: str) -> None:
+        """Records the memory in use now as phase."""
+        import tracemalloc
+        traced, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__),
+             tracemalloc.Filter(False, __file__)])
+        self.phases.append({
+            'phase': phase, 'traced': traced, 'peak': peak,
+            'live': live_objects(),
+            'top': ["{} {} B in {}".format(stat.traceback, stat.size,
+                                           stat.count)
+                    for stat in snapshot.statistics('lineno')[:self._top]]})
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Returns this report as a dict of plain values."""
+        return {'strategy': self.strategy, 'move': self.move,
+                'seconds': self.seconds, 'rss_peak': self.rss_peak,
+                'rss_scope': self.rss_scope, 'phases': self.phases}
+
+    def to_json(self) -> str:
+        """Returns this report as one line of JSON."""
+        import json
+        return json.dumps(self.as_dict(), default=str)
+
+
+def mark_phase(name: str) -> None:
+    """Records the memory in use now as phase name of the profile being
+    taken, if any."""
+    if _active:
+        _active[-1].record(name)
+
+
+def live_objects() -> Dict[str, List[int]]:
+    """Returns the count and bytes of the live objects of each of
+    TRACKED_TYPES. An object's bytes include what it holds that was not
+    already counted, so memory shared between objects is counted once.
+    >>> from subtract_square_state import SubtractSquareState
+    >>> x1 = SubtractSquareState(True, 7)
+    >>> live_objects()['GameState'][0] >= 1
+    True"""
+    totals = {name: [0, 0] for name in TRACKED_TYPES}
+    seen = set()
+    for obj in gc.get_objects():
+        for name, kind in TRACKED_TYPES.items():
+            if isinstance(obj, kind):
+                totals[name][0] += 1
+                totals[name][1] += deep_size(obj, seen)
+    return totals
+
+
+def deep_size(obj: Any, seen: set) -> int:
+    """Returns the bytes of obj and of everything it holds, through lists,
+    tuples, dicts, sets, arrays and attributes, leaving out the objects
+    whose ids are in seen and adding the ones counted to seen.
+    >>> deep_size([1, 2], set()) > deep_size([], set())
+    True"""
+    size, stack = 0, [obj]
+    while stack != []:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, type):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        if hasattr(item, '__dict__'):
+            stack.append(item.__dict__)
+        for slot in getattr(type(item), '__slots__', ()):
+            if hasattr(item, slot):
+                stack.append(getattr(item, slot))
+    return size
+
+
+class MemoryReportWriter:
+    """Appends memory reports to a file, one line of JSON each, writing
+    each report to disk as it is given.
+
+    path - the file written to
+    """
+    path: str
+    _file: TextIO
+
+    def __init__(self, path: str) -> None:
+        """Opens path for appending reports.
+        >>> import os, tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'memory.jsonl')
+        >>> with MemoryReportWriter(path) as writer:
+        ...     writer.write(MemoryReport('stack_minimax'))
+        ...     print(open(path).read(), end='')  # doctest: +ELLIPSIS
+        {"strategy": "stack_minimax", "move": null, ...}"""
+        self.path = path
+        self._file = open(path, 'a')
+
+    def write(self, report: MemoryReport) -> None:
+        """Appends report to the file and flushes it."""
+        self._file.write(report.to_json() + '\n')
+        self._file.flush()
+
+    def close(self) -> None:
+        """Closes the file."""
+        self._file.close()
+
+    def __enter__(self) -> 'MemoryReportWriter':
+        """Returns this writer, for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Closes the file at the end of a with statement."""
+        self.close()
+
+
+def reset_peak_rss() -> bool:
+    """Resets the peak resident set size of this process to its current
+    size, and returns whether that is possible here (only on Linux)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+    except OSError:
+        return False
+    return True
+
+
+def peak_rss() -> Optional[int]:
+    """Returns the peak resident set size of this process in bytes since
+    the last reset_peak_rss, or since it started, or None if it cannot be
+    measured here.
+    >>> peak_rss() is None or peak_rss() > 0
+    True"""
+    try:
+        with open('/proc/self/status') as status:
+            found = re.search(r'^VmHWM:\s+(\d+) kB', status.read(), re.M)
+        if found is not None:
+            return int(found.group(1)) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def profile_memory(strategy: Callable[[Any], Any], game: Any,
+                   top: int = 5) -> MemoryReport:
+    """Returns the memory report of strategy choosing a move for game,
+    keeping the top source lines of each phase.
+    >>> from stonehenge_game import StonehengeGame
+    >>> from stonehenge_gamestate import StonehengeGamestate
+    >>> from strategy_try import iterative_minimax
+    >>> x1 = StonehengeGamestate(True, 2).make_move('A')
+    >>> report = profile_memory(iterative_minimax, StonehengeGame(True, x1))
+    >>> report.move
+    'B'
+    >>> [phase['phase'] for phase in report.phases]
+    ['start', 'tree scored', 'end']
+    >>> start, scored, end = report.phases
+    >>> scored['live']['SearchTree'][0], end['live']['SearchTree'][0]
+    (1, 0)
+    >>> scored['traced'] > end['traced']
+    True"""
+    # Imported here, so that importing the strategies that call mark_phase
+    # does not import tracemalloc.
+    import tracemalloc
+    report = MemoryReport(getattr(strategy, '__name__',
+                                  type(strategy).__name__), top)
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    if reset_peak_rss():
+        report.rss_scope = 'call'
+    _active.append(report)
+    try:
+        report.record('start')
+        begin = time.perf_counter()
+        report.move = strategy(game)
+        report.seconds = time.perf_counter() - begin
+        report.record('end')
+    finally:
+        _active.pop()
+        if started:
+            tracemalloc.stop()
+    report.rss_peak = peak_rss()
+    return report
+
+
+def memory_profiled(strategy: Callable[[Any], Any],
+                    report_to: Callable[[MemoryReport], Any]) \
+        -> Callable[[Any], Any]:
+    """Returns strategy with each call profiled and its report passed to
+    report_to, such as the write of a MemoryReportWriter, as soon as the
+    call returns.
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from subtract_square_state import SubtractSquareState
+    >>> from strategy_try import stack_minimax
+    >>> reports = []
+    >>> profiled = memory_profiled(stack_minimax, reports.append)
+    >>> profiled(SubtractSquareGame(True, SubtractSquareState(True, 9)))
+    4
+    >>> reports[0].strategy, [phase['phase'] for phase in reports[0].phases]
+    ('stack_minimax', ['start', 'searched', 'end'])"""
+    def profiled_strategy(game: Any) -> Any:
+        """Returns strategy's move for game, profiling the call."""
+        report = profile_memory(strategy, game)
+        report_to(report)
+        return report.move
+    profiled_strategy.__name__ = getattr(strategy, '__name__',
+                                         type(strategy).__name__)
+    return profiled_strategy
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,176 @@
+"""SubtractSquare played on several totals (heaps) at once.
+
+A move subtracts a square, or a number of another MoveSet, from any one
+heap, and the player left without a move loses. The game is the sum of one
+subtraction game per heap, so by the Sprague-Grundy theorem its value is the
+XOR of the Grundy values of the heaps: the player to move wins exactly when
+it is not 0, and a winning move makes it 0. Solving a position therefore
+costs one table lookup per heap instead of a search over every combination
+of heaps.
+"""
+
+from functools import reduce
+from operator import xor
+from typing import Any, List, Sequence, Tuple
+from game import Game
+from game_state import GameState
+from subtraction_game import MoveSet, SQUARES, grundy_table
+
+
+class MultiHeapState(GameState):
+    """A state of multi-heap SubtractSquare. Moves are (heap, amount) pairs.
+
+    totals - the total left on each heap
+    move_set - the numbers that may be subtracted from a heap
+    """
+    totals: Tuple[int, ...]
+    move_set: MoveSet
+
+    def __init__(self, is_p1_turn: bool, totals: Sequence[int],
+                 move_set: MoveSet = SQUARES) -> None:
+        """Initializes the state with the given heap totals.
+        >>> MultiHeapState(True, [2, 5]).get_possible_moves()
+        [(0, 1), (1, 1), (1, 4)]"""
+        super().__init__(is_p1_turn)
+        self.totals = tuple(totals)
+        self.move_set = move_set
+
+    def __str__(self) -> str:
+        """Returns the totals of the heaps.
+        >>> print(MultiHeapState(True, [3, 7]))
+        Heaps: 3 7"""
+        return "Heaps: " + " ".join(str(total) for total in self.totals)
+
+    def __repr__(self) -> str:
+        """Returns a representation of this state.
+        >>> MultiHeapState(False, [3, 7])
+        P1's Turn: False - Heaps: (3, 7)"""
+        return "P1's Turn: {} - Heaps: {}".format(self.p1_turn, self.totals)
+
+    def get_possible_moves(self) -> list:
+        """Returns every (heap, amount) move, heap by heap."""
+        return [(heap, move) for heap, total in enumerate(self.totals)
+                for move in self.move_set.moves_up_to(total)]
+
+    def is_valid_move(self, move: Any) -> bool:
+        """Returns whether move is a (heap, amount) pair that can be played.
+        >>> x1 = MultiHeapState(True, [2, 5])
+        >>> x1.is_valid_move((1, 4)), x1.is_valid_move((0, 4))
+        (True, False)"""
+        return (isinstance(move, tuple) and len(move) == 2 and
+                isinstance(move[0], int) and 0 <= move[0] < len(self.totals)
+                and isinstance(move[1], int) and
+                move[1] <= self.totals[move[0]] and move[1] in self.move_set)
+
+    def make_move(self, move: Any) -> 'MultiHeapState':
+        """Returns the state after subtracting amount from heap, where move
+        is (heap, amount) or a string 'heap amount'.
+        >>> MultiHeapState(True, [2, 5]).make_move('1 4')
+        P1's Turn: False - Heaps: (2, 1)"""
+        if isinstance(move, str):
+            move = tuple(int(part) for part in move.split())
+        heap, amount = move
+        totals = list(self.totals)
+        totals[heap] -= amount
+        return MultiHeapState(not self.p1_turn, totals, self.move_set)
+
+    def grundy(self) -> int:
+        """Returns the Grundy value of this state, the XOR of the values of
+        its heaps.
+        >>> MultiHeapState(True, [2, 5]).grundy()
+        0"""
+        table = grundy_table(self.move_set)
+        return reduce(xor, (table.grundy(total) for total in self.totals), 0)
+
+    def rough_outcome(self) -> float:
+        """Returns WIN or LOSE for the player to move, which the Grundy value
+        decides exactly.
+        >>> MultiHeapState(True, [2, 4]).rough_outcome()
+        1"""
+        return self.WIN if self.grundy() != 0 else self.LOSE
+
+
+class MultiHeapGame(Game):
+    """SubtractSquare on several heaps, won by the player who makes the last
+    move."""
+
+    def __init__(self, p1_starts: bool,
+                 current_state: MultiHeapState = None) -> None:
+        """Initializes the game at current_state, or asks for the heap totals
+        if it is not given.
+        >>> MultiHeapGame(True, MultiHeapState(True, [4, 9])).current_state
+        P1's Turn: True - Heaps: (4, 9)"""
+        if current_state is None:
+            totals = input("Enter the heap totals, separated by spaces: ")
+            current_state = MultiHeapState(
+                p1_starts, [int(total) for total in totals.split()])
+        self.current_state = current_state
+
+    def get_instructions(self) -> str:
+        """Returns the instructions for this game."""
+        return ("Players take turns subtracting {} from one of the heaps, "
+                "entering a move as 'heap amount' with heaps numbered from "
+                "0. The winner is the last player able to move."
+                .format(self.current_state.move_set.name))
+
+    def is_over(self, state: MultiHeapState) -> bool:
+        """Returns whether the player to move at state has no move left.
+        >>> g1 = MultiHeapGame(True, MultiHeapState(True, [0, 0]))
+        >>> g1.is_over(g1.current_state)
+        True"""
+        return state.get_possible_moves() == []
+
+    def is_winner(self, player: str) -> bool:
+        """Returns whether player has won: the game is over and it is the
+        other player's turn.
+        >>> g1 = MultiHeapGame(True, MultiHeapState(False, [0]))
+        >>> g1.is_winner('p1'), g1.is_winner('p2')
+        (True, False)"""
+        return (self.current_state.get_current_player_name() != player
+                and self.is_over(self.current_state))
+
+    def str_to_move(self, string: str) -> Any:
+        """Returns the (heap, amount) move for string 'heap amount', or an
+        invalid move if string is not of that form.
+        >>> g1 = MultiHeapGame(True, MultiHeapState(True, [4, 9]))
+        >>> g1.str_to_move(' 1 9'), g1.str_to_move('9')
+        ((1, 9), (-1, -1))"""
+        parts = string.split()
+        if len(parts) != 2 or not all(part.isdigit() for part in parts):
+            return -1, -1
+        return int(parts[0]), int(parts[1])
+
+
+def xor_move(state: MultiHeapState) -> Any:
+    """Returns a move from state that leaves a Grundy value of 0, or the
+    first possible move if there is none.
+    >>> xor_move(MultiHeapState(True, [2, 4]))
+    (1, 4)
+    >>> xor_move(MultiHeapState(True, [3, 6, 11]))
+    (0, 1)"""
+    table = grundy_table(state.move_set)
+    values: List[int] = [table.grundy(total) for total in state.totals]
+    target = reduce(xor, values, 0)
+    if target != 0:
+        for heap, total in enumerate(state.totals):
+            wanted = values[heap] ^ target
+            if wanted < values[heap]:  # Some move leads to the wanted value.
+                for move in state.move_set.moves_up_to(total):
+                    if table.grundy(total - move) == wanted:
+                        return heap, move
+    moves = state.get_possible_moves()
+    return moves[0] if moves != [] else None
+
+
+def xor_strategy(game: Any) -> Any:
+    """Returns the Grundy-optimal move for the current player of game.
+    >>> xor_strategy(MultiHeapGame(True, MultiHeapState(True, [5, 5, 1])))
+    (2, 1)"""
+    return xor_move(game.current_state)
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,267 @@
+"""Pondering: searching on the opponent's time.
+
+While a human types a move, a background thread works out the engine's reply
+to each move the human might make, most likely first, and stores the replies
+in a cache shared with the engine. When the human's move arrives the engine
+answers from the cache, or waits for the reply the thread is working on, and
+only searches itself for a move the thread has not reached.
+
+Replies are keyed by the state_codec encoding of the position. The thread
+searches on a copy of the game, so the game being played is never touched,
+and with its own copy of the strategy, so the caches and trees the engine
+keeps between moves are never filled with hypothetical positions and the
+two never share a strategy object between threads. When the human's move
+was not pondered the engine stops the thread and searches at once: a
+Strategy copy gives up its search when told to stop and its guess is thrown
+away, while other strategies finish their search in the background.
+"""
+
+import copy
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, List, Optional, Tuple
+from game_state import GameState
+from state_codec import encode_state
+from strategies import Strategy
+from strategy_try import interactive_strategy, is_interactive
+
+
+class ReplyCache:
+    """The engine's replies by position, shared between threads, that forgets
+    the least recently used replies once it holds max_entries.
+
+    max_entries - the most replies kept at once
+    """
+    max_entries: int
+    _replies: OrderedDict
+    _lock: threading.Lock
+
+    def __init__(self, max_entries: int = 100000) -> None:
+        """Initializes an empty cache.
+        >>> cache = ReplyCache(2)
+        >>> cache.store(b'a', 'A')
+        >>> cache.store(b'b', 'B')
+        >>> cache.lookup(b'a')
+        (True, 'A')
+        >>> cache.store(b'c', 'C')
+        >>> cache.lookup(b'b'), len(cache)
+        ((False, None), 2)"""
+        self.max_entries = max_entries
+        self._replies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Returns the number of replies in the cache."""
+        return len(self._replies)
+
+    def lookup(self, key: bytes) -> Tuple[bool, Any]:
+        """Returns whether a reply is stored for key, and the reply."""
+        with self._lock:
+            if key not in self._replies:
+                return False, None
+            self._replies.move_to_end(key)
+            return True, self._replies[key]
+
+    def store(self, key: bytes, reply: Any) -> None:
+        """Stores the reply for key, forgetting the least recently used reply
+        if the cache is full."""
+        with self._lock:
+            self._replies[key] = reply
+            self._replies.move_to_end(key)
+            if len(self._replies) > self.max_entries:
+                self._replies.popitem(last=False)
+
+
+def likely_replies(state: GameState) -> List[GameState]:
+    """Returns the unfinished positions one move from state, the ones best
+    for the player to move at state (by rough_outcome) first.
+    >>> from subtract_square_state import SubtractSquareState
+    >>> x1 = SubtractSquareState(True, 10)
+    >>> [x.current_total for x in likely_replies(x1)]
+    [6, 9, 1]"""
+    children = [state.make_move(move) for move in state.get_possible_moves()]
+    children = [child for child in children
+                if child.get_possible_moves() != []]
+    children.sort(key=lambda child: child.rough_outcome())
+    return children
+
+
+class Ponderer:
+    """Plays an engine strategy that searches the likely positions on the
+    opponent's time.
+
+    strategy - the engine strategy, called with a game as usual
+    ponder_strategy - the copy of strategy the background search calls
+    cache - the engine's replies found so far
+    hits - how many engine moves came from the cache
+    misses - how many engine moves had to be searched when asked for
+    """
+    strategy: Callable[[Any], Any]
+    ponder_strategy: Callable[[Any], Any]
+    cache: ReplyCache
+    hits: int
+    misses: int
+    _worker: Optional[threading.Thread]
+    _stop: threading.Event
+    _root: Optional[bytes]
+    _searching: Optional[bytes]
+    _changed: threading.Condition
+
+    def __init__(self, strategy: Callable[[Any], Any],
+                 max_entries: int = 100000) -> None:
+        """Initializes a ponderer for strategy whose cache holds at most
+        max_entries replies.
+        >>> from strategies import MinimaxStrategy
+        >>> ponderer = Ponderer(MinimaxStrategy())
+        >>> ponderer.ponder_strategy is ponderer.strategy
+        False"""
+        self.strategy = strategy
+        self.ponder_strategy = own_copy(strategy)
+        self.cache = ReplyCache(max_entries)
+        self.hits = self.misses = 0
+        self._worker = None
+        self._stop = threading.Event()
+        self._root = None
+        self._searching = None
+        self._changed = threading.Condition()
+
+    def ponder(self, game: Any) -> None:
+        """Starts searching the engine's replies to the moves from game's
+        current state in the background, unless that is already under way.
+        """
+        root = encode_state(game.current_state)
+        if self._root == root and self._worker is not None and \
+                self._worker.is_alive():
+            return
+        self.stop()
+        self.wait()
+        self._stop = threading.Event()
+        if isinstance(self.ponder_strategy, Strategy):
+            self.ponder_strategy.stop = self._stop
+        self._root = root
+        self._worker = threading.Thread(
+            target=self._run, args=(copy.copy(game), self._stop), daemon=True)
+        self._worker.start()
+
+    def stop(self) -> None:
+        """Tells the background search to stop, giving up its current reply
+        if its strategy can."""
+        self._stop.set()
+        self._root = None
+
+    def wait(self) -> None:
+        """Waits until the background search has stopped."""
+        if self._worker is not None:
+            self._worker.join()
+
+    def _run(self, game: Any, stop: threading.Event) -> None:
+        """Stores the engine's reply to each likely position from game's
+        current state until there are none left or stop is set."""
+        for state in likely_replies(game.current_state):
+            key = encode_state(state)
+            if stop.is_set():
+                break
+            if self.cache.lookup(key)[0]:
+                continue
+            with self._changed:
+                self._searching = key
+            game.current_state = state
+            try:
+                reply = self.ponder_strategy(game)
+                if not stop.is_set():  # Otherwise the search may be cut off.
+                    self.cache.store(key, reply)
+            finally:
+                with self._changed:
+                    self._searching = None
+                    self._changed.notify_all()
+
+    def engine(self, game: Any) -> Any:
+        """Returns the engine's move for game, from the cache if the
+        position was pondered.
+        >>> from subtract_square_game import SubtractSquareGame
+        >>> from subtract_square_state import SubtractSquareState
+        >>> from strategy_try import stack_minimax
+        >>> ponderer = Ponderer(stack_minimax)
+        >>> g1 = SubtractSquareGame(True, SubtractSquareState(True, 31))
+        >>> ponderer.ponder(g1)
+        >>> ponderer.wait()
+        >>> g1.current_state = g1.current_state.make_move(1)
+        >>> ponderer.engine(g1), ponderer.hits, ponderer.misses
+        (25, 1, 0)
+        >>> g1.current_state = SubtractSquareState(True, 24)
+        >>> ponderer.engine(g1), ponderer.hits, ponderer.misses
+        (4, 1, 1)
+        >>> from strategies import MinimaxStrategy
+        >>> ponderer = Ponderer(MinimaxStrategy())
+        >>> ponderer.ponder(SubtractSquareGame(
+        ...     True, SubtractSquareState(True, 5000)))
+        >>> g1.current_state = SubtractSquareState(True, 24)
+        >>> ponderer.engine(g1), ponderer.misses
+        (4, 1)
+        >>> ponderer.wait()
+        >>> len(ponderer.cache)
+        1"""
+        key = encode_state(game.current_state)
+        with self._changed:
+            while self._searching == key:
+                self._changed.wait()
+        self.stop()
+        found, reply = self.cache.lookup(key)
+        if found:
+            self.hits += 1
+            return reply
+        self.misses += 1
+        reply = self.strategy(game)
+        self.cache.store(key, reply)
+        return reply
+
+    def opponent(self, strategy: Callable[[Any], Any]) \
+            -> Callable[[Any], Any]:
+        """Returns the opponent's strategy, pondering while it runs."""
+        def pondering_strategy(game: Any) -> Any:
+            """Returns strategy's move for game, pondering meanwhile."""
+            self.ponder(game)
+            return strategy(game)
+        pondering_strategy.__name__ = strategy.__name__
+        return pondering_strategy
+
+
+def own_copy(strategy: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    """Returns a copy of strategy that keeps no state with it: a copy with
+    its own budget, caches and workers for a Strategy, a deep copy for other
+    strategy objects such as TreeReuseMinimax, and the same function for a
+    strategy function.
+    >>> from strategy_try import TreeReuseMinimax, stack_minimax
+    >>> own_copy(stack_minimax) is stack_minimax
+    True
+    >>> strategy = TreeReuseMinimax()
+    >>> own_copy(strategy) is strategy, type(own_copy(strategy)).__name__
+    (False, 'TreeReuseMinimax')"""
+    if isinstance(strategy, Strategy):
+        return strategy.with_budget(copy.copy(strategy.budget))
+    return copy.deepcopy(strategy)
+
+
+def pondering_strategies(p1_strategy: Callable[[Any], Any],
+                         p2_strategy: Callable[[Any], Any]) -> tuple:
+    """Returns the strategies for Player 1 and Player 2 with the engine
+    pondering while the human thinks, if exactly one of them is
+    interactive_strategy, and otherwise the strategies unchanged.
+    >>> from strategy_try import stack_minimax
+    >>> p1, p2 = pondering_strategies(interactive_strategy, stack_minimax)
+    >>> p1.__name__, p2.__self__.strategy is stack_minimax
+    ('interactive_strategy', True)"""
+    if is_interactive(p1_strategy) and not is_interactive(p2_strategy):
+        ponderer = Ponderer(p2_strategy)
+        return ponderer.opponent(p1_strategy), ponderer.engine
+    if is_interactive(p2_strategy) and not is_interactive(p1_strategy):
+        ponderer = Ponderer(p1_strategy)
+        return ponderer.engine, ponderer.opponent(p2_strategy)
+    return p1_strategy, p2_strategy
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
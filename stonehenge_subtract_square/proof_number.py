@@ -0,0 +1,275 @@
+"""Depth-first proof-number (df-pn) search, for answering whether a position
+is a forced win for the player to move while expanding as few states as
+possible.
+
+Both Stonehenge and SubtractSquare are lost by the player who has no move
+left, which is the only game knowledge the search uses. Proof and disproof
+numbers are kept in a transposition table of bounded size, keyed by the
+binary encoding of each state.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+from game_state import GameState
+from memory_profile import mark_phase
+from state_codec import encode_state
+from strategies import Budget, Strategy
+
+INFINITY = 10 ** 9
+MIN_TABLE_SIZE = 1024
+
+
+class TranspositionTable:
+    """A table of (proof number, disproof number) pairs by state key that
+    forgets the least recently used entries once it holds max_entries.
+
+    max_entries - the most entries kept at once
+    hits - how many lookups found an entry
+    """
+    max_entries: int
+    hits: int
+    _entries: OrderedDict
+
+    def __init__(self, max_entries: int = 1000000) -> None:
+        """Initializes an empty table.
+        >>> table = TranspositionTable(2)
+        >>> table.store(b'a', 1, 2)
+        >>> table.store(b'b', 3, 4)
+        >>> table.lookup(b'a')
+        (1, 2)
+        >>> table.store(b'c', 5, 6)
+        >>> table.lookup(b'b')
+        (1, 1)
+        >>> len(table)
+        2"""
+        self.max_entries = max_entries
+        self.hits = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        """Returns the number of entries in the table."""
+        return len(self._entries)
+
+    def lookup(self, key: bytes) -> Tuple[int, int]:
+        """Returns the proof and disproof numbers stored for key, or (1, 1)
+        for a state that is not in the table."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return 1, 1
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def store(self, key: bytes, proof: int, disproof: int) -> None:
+        """Stores the proof and disproof numbers of key, forgetting the least
+        recently used entry if the table is full."""
+        self._entries[key] = (proof, disproof)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class ProofNumberSearch:
+    """A df-pn search that remembers its transposition table across calls.
+    Each call to prove may be limited to max_nodes expansions and max_time
+    seconds, after which it gives up: the state is then not proved.
+
+    table - the proof and disproof numbers found so far
+    nodes_expanded - how many states have had their moves generated
+    max_nodes - the most expansions in one call to prove, or None
+    max_time - the most seconds one call to prove may take, or None
+    stop - once set, the call to prove under way gives up, or None
+    """
+    table: TranspositionTable
+    nodes_expanded: int
+    max_nodes: Optional[int]
+    max_time: Optional[float]
+    stop: Optional[threading.Event]
+    _node_limit: Optional[int]
+    _deadline: Optional[float]
+
+    def __init__(self, max_entries: int = 1000000,
+                 max_nodes: Optional[int] = None,
+                 max_time: Optional[float] = None) -> None:
+        """Initializes a search whose table holds at most max_entries.
+        >>> from stonehenge_gamestate import StonehengeGamestate
+        >>> search = ProofNumberSearch(max_nodes=10)
+        >>> search.prove(StonehengeGamestate(True, 2)), search.nodes_expanded
+        (False, 10)"""
+        self.table = TranspositionTable(max_entries)
+        self.nodes_expanded = 0
+        self.max_nodes = max_nodes
+        self.max_time = max_time
+        self.stop = None
+        self._node_limit = self._deadline = None
+
+    def prove(self, state: GameState) -> bool:
+        """Returns whether the player to move at state can force a win.
+        >>> from subtract_square_state import SubtractSquareState
+        >>> search = ProofNumberSearch()
+        >>> [n for n in range(1, 21) if not search.prove(
+        ...     SubtractSquareState(True, n))]
+        [2, 5, 7, 10, 12, 15, 17, 20]
+        >>> from stonehenge_gamestate import StonehengeGamestate
+        >>> search.prove(StonehengeGamestate(True, 2))
+        True"""
+        key = encode_state(state)
+        self._node_limit = None if self.max_nodes is None else \
+            self.nodes_expanded + self.max_nodes
+        self._deadline = None if self.max_time is None else \
+            time.perf_counter() + self.max_time
+        self._search(state, key, INFINITY, INFINITY)
+        return self.table.lookup(key)[0] == 0
+
+    def best_move(self, state: GameState) -> Any:
+        """Returns a winning move for the player to move at state, or the
+        first possible move if there is none or none was found within the
+        limits.
+        >>> from stonehenge_gamestate import StonehengeGamestate
+        >>> x1 = StonehengeGamestate(True, 2)
+        >>> x1 = x1.make_move('A').make_move('F').make_move('D')
+        >>> ProofNumberSearch().best_move(x1)
+        'E'"""
+        moves = state.get_possible_moves()
+        proved = self.prove(state)
+        mark_phase('proved')
+        if proved:
+            for move in moves:
+                child = state.make_move(move)
+                self.prove(child)
+                if self.table.lookup(encode_state(child))[1] == 0:
+                    return move  # The player to move at child has lost.
+        return moves[0] if moves != [] else None
+
+    def _search(self, state: GameState, key: bytes, proof_threshold: int,
+                disproof_threshold: int) -> None:
+        """Searches below state until its proof number reaches
+        proof_threshold or its disproof number reaches disproof_threshold,
+        and stores its numbers in the table."""
+        moves = state.get_possible_moves()
+        self.nodes_expanded += 1
+        if moves == []:  # The player to move has lost.
+            self.table.store(key, INFINITY, 0)
+            return
+        children: List[Tuple[GameState, bytes]] = []
+        for move in moves:
+            child = state.make_move(move)
+            children.append((child, encode_state(child)))
+
+        while True:
+            proof, disproof, best, second_disproof = \
+                self._combine(children)
+            if proof >= proof_threshold or disproof >= disproof_threshold \
+                    or self._out_of_budget():
+                self.table.store(key, proof, disproof)
+                return
+            child, child_key = children[best]
+            child_proof = self.table.lookup(child_key)[0]
+            self._search(child, child_key,
+                         min(INFINITY,
+                             disproof_threshold + child_proof - disproof),
+                         min(proof_threshold, second_disproof + 1))
+
+    def _out_of_budget(self) -> bool:
+        """Returns whether the current call to prove has used up its nodes
+        or its time, or has been stopped."""
+        if self._node_limit is not None and \
+                self.nodes_expanded >= self._node_limit:
+            return True
+        if self._deadline is not None and time.perf_counter() >= \
+                self._deadline:
+            self._node_limit = self.nodes_expanded  # Stay out of budget.
+            return True
+        return self.stop is not None and self.stop.is_set()
+
+    def _combine(self, children: List[Tuple[GameState, bytes]]) -> tuple:
+        """Returns the proof and disproof numbers of a state from those of
+        its children, the index of the child with the smallest disproof
+        number and the second smallest disproof number."""
+        proof, disproof = INFINITY, 0
+        best, second_disproof = 0, INFINITY
+        for i, (_, child_key) in enumerate(children):
+            child_proof, child_disproof = self.table.lookup(child_key)
+            disproof = min(INFINITY, disproof + child_proof)
+            if child_disproof < proof:
+                second_disproof = proof
+                proof, best = child_disproof, i
+            elif child_disproof < second_disproof:
+                second_disproof = child_disproof
+        return proof, disproof, best, second_disproof
+
+
+def prove(state: GameState, max_entries: int = 1000000) -> bool:
+    """Returns whether the player to move at state can force a win, using a
+    transposition table of at most max_entries entries.
+    >>> from stonehenge_gamestate import StonehengeGamestate
+    >>> x1 = StonehengeGamestate(True, 2).make_move('A')
+    >>> prove(x1)
+    False
+    >>> prove(x1.make_move('B'))
+    True"""
+    return ProofNumberSearch(max_entries).prove(state)
+
+
+class ProofNumberStrategy(Strategy):
+    """Plays a winning move found by proof-number search when there is one,
+    and otherwise the first possible move. The transposition table holds
+    cache_size entries (at least MIN_TABLE_SIZE, which the search needs to
+    make progress) and is kept between moves; max_nodes and max_time limit
+    the search for each move, and the depth and workers of the budget are
+    not used.
+
+    search - the search used for the moves, rebuilt when the cache size
+             changes
+    """
+    search: ProofNumberSearch
+
+    def __init__(self, budget: Optional[Budget] = None,
+                 name: str = 'proof_number') -> None:
+        """Initializes a proof-number strategy with budget.
+        >>> from stonehenge_gamestate import StonehengeGamestate
+        >>> ProofNumberStrategy(Budget(max_nodes=5)).choose_move(
+        ...     StonehengeGamestate(True, 2))
+        'A'"""
+        super().__init__(name, budget)
+        self.search = ProofNumberSearch(
+            max(self.budget.cache_size, MIN_TABLE_SIZE))
+
+    def choose_move(self, state: GameState,
+                    budget: Optional[Budget] = None) -> Any:
+        """Returns a winning move for the player to move at state found
+        within budget, or the first possible move."""
+        budget = budget if budget is not None else self.budget
+        table_size = max(budget.cache_size, MIN_TABLE_SIZE)
+        if self.search.table.max_entries != table_size:
+            self.search = ProofNumberSearch(table_size)
+        self.search.max_nodes = budget.max_nodes
+        self.search.max_time = budget.max_time
+        self.search.stop = self.stop
+        return self.search.best_move(state)
+
+    def with_budget(self, budget: Budget) -> 'ProofNumberStrategy':
+        """Returns a copy of this strategy that uses budget, with its own
+        table."""
+        return ProofNumberStrategy(budget, self.name)
+
+
+def proof_number_strategy(game: Any) -> Any:
+    """Returns a winning move for the current player of game if one exists,
+    found by proof-number search, and otherwise the first possible move.
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from subtract_square_state import SubtractSquareState
+    >>> proof_number_strategy(SubtractSquareGame(True,
+    ...                                          SubtractSquareState(True, 30)))
+    25"""
+    return ProofNumberStrategy(Budget(cache_size=1000000)).choose_move(
+        game.current_state)
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
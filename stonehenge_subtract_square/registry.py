@@ -0,0 +1,75 @@
+"""A registry of games or strategies that imports each one on first use.
+
+Entries are given as 'module:attribute', e.g. 'strategy_try:stack_minimax'.
+An entry ending in '()' names a class, and its value is one instance of it,
+made on first use. The module of an entry is imported only when the entry is
+looked up, so listing the names in a registry imports nothing.
+"""
+
+import importlib
+from typing import Any, Dict, Iterator, Mapping
+
+
+class LazyRegistry(Mapping):
+    """A read-only mapping from keys to games or strategies, imported when
+    they are first looked up.
+
+    specs - the 'module:attribute' of each key
+    """
+    specs: Dict[str, str]
+    _loaded: Dict[str, Any]
+
+    def __init__(self, specs: Dict[str, str]) -> None:
+        """Initializes a registry of specs with nothing imported yet.
+        >>> registry = LazyRegistry({'s': 'subtract_square_game:'
+        ...                               'SubtractSquareGame',
+        ...                          'mb': 'strategies:MinimaxStrategy()'})
+        >>> list(registry), registry.is_loaded('s')
+        (['s', 'mb'], False)
+        >>> registry['s'].__name__, registry.is_loaded('s')
+        ('SubtractSquareGame', True)
+        >>> registry['mb'] is registry['mb']
+        True"""
+        self.specs = dict(specs)
+        self._loaded = {}
+
+    def __getitem__(self, key: str) -> Any:
+        """Returns the game or strategy of key, importing it if needed."""
+        if key not in self._loaded:
+            module_name, attribute = self.specs[key].split(':')
+            value = getattr(importlib.import_module(module_name),
+                            attribute.rstrip('()'))
+            if attribute.endswith('()'):
+                value = value()
+            self._loaded[key] = value
+        return self._loaded[key]
+
+    def __iter__(self) -> Iterator[str]:
+        """Returns an iterator over the keys, in the order given."""
+        return iter(self.specs)
+
+    def __len__(self) -> int:
+        """Returns the number of keys."""
+        return len(self.specs)
+
+    def __contains__(self, key: object) -> bool:
+        """Returns whether key is in this registry, without importing it."""
+        return key in self.specs
+
+    def is_loaded(self, key: str) -> bool:
+        """Returns whether the game or strategy of key has been imported."""
+        return key in self._loaded
+
+    def name(self, key: str) -> str:
+        """Returns the name of the game or strategy of key, without
+        importing it.
+        >>> LazyRegistry({'mb': 'strategies:MinimaxStrategy()'}).name('mb')
+        'MinimaxStrategy'"""
+        return self.specs[key].split(':')[1].rstrip('()')
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,225 @@
+"""Performance regression checks on deterministic work counters.
+
+Wall-clock benchmarks are too noisy to catch a search that does a little
+more work than before. Instead, each case here runs a strategy on a fixed
+position under a WorkCounter, which counts
+
+    make_move - calls to make_move
+    nodes - calls to get_possible_moves, one per state expanded
+    states - game states created
+    cache_hits - transposition table and minimax cache lookups that found
+                 an entry
+
+and compares the counts with the values stored in EXPECTED_COUNTS. The
+doctest of check_regressions fails when any count goes up or a strategy
+chooses another move. When a change makes a search do less work, the new
+counts are printed by count_report and should be stored.
+"""
+
+import contextlib
+import io
+from typing import Any, Callable, Dict, List, Tuple
+from game_state import GameState
+from proof_number import TranspositionTable, proof_number_strategy
+from stonehenge_game import StonehengeGame
+from stonehenge_gamestate import StonehengeGamestate
+from strategies import Budget, MinimaxStrategy
+from strategy_try import TreeReuseMinimax, iterative_minimax, \
+    recursive_minimax, stack_minimax
+from subtract_square_game import SubtractSquareGame
+from subtract_square_state import SubtractSquareState
+
+COUNTERS = ('make_move', 'nodes', 'states', 'cache_hits')
+
+# The counter kept for each counted method of the game states.
+_STATE_METHODS = {'make_move': 'make_move', 'get_possible_moves': 'nodes',
+                  '__init__': 'states'}
+
+
+class WorkCounter:
+    """Counts the work done while it is active, as a context manager, by
+    wrapping the methods of every GameState class and of the caches. Calls
+    made from inside a counted call of the same kind (such as a subclass's
+    __init__ calling its superclass's) are counted once.
+
+    counts - the count of each of COUNTERS
+    """
+    counts: Dict[str, int]
+    _originals: List[Tuple[type, str, Any]]
+    _depths: Dict[str, int]
+
+    def __init__(self) -> None:
+        """Initializes a counter with every count at 0.
+        >>> with WorkCounter() as counter:
+        ...     _ = SubtractSquareState(True, 10).make_move(1)
+        >>> counter.counts
+        {'make_move': 1, 'nodes': 0, 'states': 2, 'cache_hits': 0}"""
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self._originals = []
+        self._depths = dict.fromkeys(COUNTERS, 0)
+
+    def __enter__(self) -> 'WorkCounter':
+        """Starts counting."""
+        for cls in _state_classes():
+            for name, counter in _STATE_METHODS.items():
+                if name in cls.__dict__:
+                    self._wrap(cls, name, counter, None)
+        self._wrap(TranspositionTable, 'lookup', 'cache_hits',
+                   lambda table, hits, _: table.hits > hits)
+        self._wrap(MinimaxStrategy, '_lookup', 'cache_hits',
+                   lambda strategy, hits, result: result is not None)
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stops counting and puts the original methods back."""
+        for cls, name, original in reversed(self._originals):
+            setattr(cls, name, original)
+        self._originals = []
+
+    def _wrap(self, cls: type, name: str, counter: str,
+              is_hit: Callable[[Any, int, Any], bool]) -> None:
+        """Replaces the method name of cls by one that adds to counter each
+        time it is called, or only when is_hit(self, hits before the call,
+        result) if is_hit is given."""
+        original = cls.__dict__[name]
+        depths, counts = self._depths, self.counts
+
+        def counted(obj: Any, *args: Any, **kwargs: Any) -> Any:
+            """Calls the original method, counting the call."""
+            hits = getattr(obj, 'hits', 0)
+            depths[counter] += 1
+            try:
+                result = original(obj, *args, **kwargs)
+            finally:
+                depths[counter] -= 1
+            if depths[counter] == 0 and (is_hit is None or
+                                         is_hit(obj, hits, result)):
+                counts[counter] += 1
+            return result
+
+        self._originals.append((cls, name, original))
+        setattr(cls, name, counted)
+
+
+def _state_classes() -> List[type]:
+    """Returns GameState and every class derived from it so far."""
+    classes, i = [GameState], 0
+    while i < len(classes):
+        classes.extend(classes[i].__subclasses__())
+        i += 1
+    return classes
+
+
+def count_work(strategy: Callable[[Any], Any], game: Any) -> Dict[str, Any]:
+    """Returns the move strategy chooses for game and the work counted
+    while choosing it. Anything the strategy prints is discarded.
+    >>> game = SubtractSquareGame(True, SubtractSquareState(True, 5))
+    >>> count_work(stack_minimax, game)
+    {'move': 1, 'make_move': 8, 'nodes': 9, 'states': 8, 'cache_hits': 0}"""
+    with WorkCounter() as counter, \
+            contextlib.redirect_stdout(io.StringIO()):
+        move = strategy(game)
+    result: Dict[str, Any] = {'move': move}
+    result.update(counter.counts)
+    return result
+
+
+def _stonehenge(*moves: str) -> Callable[[], StonehengeGame]:
+    """Returns a function making a size 2 Stonehenge game after moves."""
+    def new_game() -> StonehengeGame:
+        """Returns the game."""
+        state = StonehengeGamestate(True, 2)
+        for move in moves:
+            state = state.make_move(move)
+        return StonehengeGame(True, state)
+    return new_game
+
+
+def _subtract_square(total: int) -> Callable[[], SubtractSquareGame]:
+    """Returns a function making a SubtractSquare game from total."""
+    return lambda: SubtractSquareGame(True, SubtractSquareState(True, total))
+
+
+def _tree_reuse(game: Any) -> Any:
+    """Returns TreeReuseMinimax's second move of game, played after its own
+    first move and the first possible reply, so the kept tree is reused."""
+    strategy = TreeReuseMinimax()
+    start = game.current_state
+    reply = start.make_move(strategy(game))
+    game.current_state = reply.make_move(reply.get_possible_moves()[0])
+    try:
+        return strategy(game)
+    finally:
+        game.current_state = start
+
+
+# name: (strategy, function making the game)
+REGRESSION_CASES = {
+    'recursive_minimax h2 AFD': (recursive_minimax,
+                                 _stonehenge('A', 'F', 'D')),
+    'iterative_minimax h2': (iterative_minimax, _stonehenge()),
+    'iterative_minimax s20': (iterative_minimax, _subtract_square(20)),
+    'stack_minimax h2': (stack_minimax, _stonehenge()),
+    'stack_minimax s30': (stack_minimax, _subtract_square(30)),
+    'tree_reuse s23': (_tree_reuse, _subtract_square(23)),
+    'proof_number h2 A': (proof_number_strategy, _stonehenge('A')),
+    'proof_number s60': (proof_number_strategy, _subtract_square(60)),
+    'minimax cached s60': (MinimaxStrategy(), _subtract_square(60)),
+    'minimax depth 3 h3': (MinimaxStrategy(Budget(max_depth=3)),
+                           lambda: StonehengeGame(
+                               True, StonehengeGamestate(True, 3))),
+}
+
+# name: the move of REGRESSION_CASES[name] and its counts, in the order of
+# COUNTERS (see count_report).
+EXPECTED_COUNTS = {
+    'recursive_minimax h2 AFD': ('B', 37, 58, 37, 0),
+    'iterative_minimax h2': ('A', 6991, 6992, 6991, 0),
+    'iterative_minimax s20': (1, 1700, 1701, 1700, 0),
+    'stack_minimax h2': ('A', 133, 134, 133, 0),
+    'stack_minimax s30': (25, 13031, 13032, 13031, 0),
+    'tree_reuse s23': (1, 4862, 4845, 4862, 0),
+    'proof_number h2 A': ('B', 370, 121, 370, 434),
+    'proof_number s60': (16, 273, 70, 273, 328),
+    'minimax cached s60': (16, 371, 124, 371, 248),
+    'minimax depth 3 h3': ('A', 14664, 18625, 14664, 0),
+}
+
+
+def count_report() -> Dict[str, tuple]:
+    """Returns the move and counts of every case of REGRESSION_CASES, by
+    name, in the form of EXPECTED_COUNTS.
+    >>> count_report()['stack_minimax h2']
+    ('A', 133, 134, 133, 0)"""
+    report = {}
+    for name, (strategy, new_game) in REGRESSION_CASES.items():
+        if isinstance(strategy, MinimaxStrategy):
+            strategy = strategy.with_budget(strategy.budget)  # A new cache.
+        work = count_work(strategy, new_game())
+        report[name] = (work['move'],) + tuple(work[counter]
+                                               for counter in COUNTERS)
+    return report
+
+
+def check_regressions() -> List[str]:
+    """Returns a description of every case that did more work, by any
+    counter, or chose another move than its expected counts.
+    >>> check_regressions()
+    []"""
+    problems = []
+    for name, counts in count_report().items():
+        expected = EXPECTED_COUNTS[name]
+        if counts[0] != expected[0]:
+            problems.append("{}: move {!r}, expected {!r}".format(
+                name, counts[0], expected[0]))
+        problems.extend("{}: {} {}, expected at most {}".format(
+            name, counter, count, most) for counter, count, most in zip(
+                COUNTERS, counts[1:], expected[1:]) if count > most)
+    return problems
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,314 @@
+"""Datasets of (position, value, best move) from self-play, for offline
+analysis and for tuning heuristics.
+
+A dataset is built by a pipeline of generators, so that only one shard of
+examples is held in memory however long the run:
+
+    self_play(...) - the positions reached by a strategy playing itself
+    dedupe(...) - drops positions seen recently, keyed by state encoding
+    label(...) - attaches the value and best move found by a labeller
+    sample(...) - keeps each example with a given probability
+    ShardWriter - writes the examples to numbered shard files
+
+Values are WIN (1) or LOSE (-1) for the player to move. Moves are stored as
+integers: the cell index of a Stonehenge move, the number subtracted in
+SubtractSquare, and -1 when there is no move.
+
+A shard holds positions of a single game and board size whose state_codec
+encodings have the same length. In the 'npy' format it is a NumPy
+structured array with fields state (the bytes of the state_codec encoding),
+value and move. In the 'bin' format it is a state_codec batch followed by the
+values as signed bytes and the moves as signed 8-byte integers, all
+little-endian.
+"""
+
+import os
+import random
+import re
+import struct
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, \
+    Tuple
+from game_state import GameState
+from proof_number import ProofNumberSearch
+from state_codec import encode_batch, encode_state, encoded_size
+from stonehenge_board import cell_id
+from stonehenge_gamestate import StonehengeGamestate
+from subtract_square_state import SubtractSquareState
+from subtraction_game import SQUARES, MoveSet, grundy_table
+
+# The name of a shard file, with its number.
+_SHARD_NAME = re.compile(r'shard-(\d+)\.(?:npy|bin)$')
+
+# An example: a position, its value for the player to move, and a best move
+# (None if there is no move).
+Example = Tuple[GameState, int, Any]
+
+
+def self_play(new_game: Callable[[int], Any],
+              strategy: Callable[[Any], Any],
+              num_games: int) -> Iterator[GameState]:
+    """Yields every unfinished position of num_games games, each created by
+    new_game(game_number) and played by strategy for both players. For
+    repeatable games, give a strategy that draws random moves its own
+    random.Random, e.g. partial(random_strategy, rng=random.Random(seed)).
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from strategy_try import iterative_minimax
+    >>> [state.current_total for state in self_play(
+    ...     lambda n: SubtractSquareGame(True, SubtractSquareState(True, 10)),
+    ...     iterative_minimax, 1)]
+    [10, 9, 5, 4]"""
+    for game_number in range(num_games):
+        game = new_game(game_number)
+        state = game.current_state
+        while not game.is_over(state):
+            yield state
+            move = strategy(game)
+            while not state.is_valid_move(move):
+                move = strategy(game)
+            state = game.current_state = state.make_move(move)
+
+
+def dedupe(states: Iterable[GameState],
+           max_keys: int = 1000000) -> Iterator[GameState]:
+    """Yields the states not among the last max_keys distinct states seen.
+    >>> totals = [5, 4, 5, 3, 4, 5]
+    >>> [x.current_total for x in dedupe(
+    ...     SubtractSquareState(True, n) for n in totals)]
+    [5, 4, 3]
+    >>> [x.current_total for x in dedupe(
+    ...     (SubtractSquareState(True, n) for n in totals), max_keys=1)]
+    [5, 4, 5, 3, 4, 5]"""
+    seen: OrderedDict = OrderedDict()
+    for state in states:
+        key = encode_state(state)
+        if key in seen:
+            seen.move_to_end(key)
+            continue
+        seen[key] = None
+        if len(seen) > max_keys:
+            seen.popitem(last=False)
+        yield state
+
+
+def label(states: Iterable[GameState],
+          labeller: Callable[[GameState], Tuple[int, Any]]) \
+        -> Iterator[Example]:
+    """Yields each of states with the value and best move given by
+    labeller.
+    >>> list(label([SubtractSquareState(True, 4)], grundy_labeller))
+    [(P1's Turn: True - Total: 4, 1, 4)]"""
+    for state in states:
+        value, move = labeller(state)
+        yield state, value, move
+
+
+def sample(examples: Iterable[Any], rate: float,
+           seed: Optional[int] = None) -> Iterator[Any]:
+    """Yields each of examples with probability rate.
+    >>> len(list(sample(range(1000), 0.25, seed=1)))
+    227"""
+    rng = random.Random(seed)
+    for example in examples:
+        if rng.random() < rate:
+            yield example
+
+
+def grundy_labeller(state: SubtractSquareState,
+                    move_set: Optional[MoveSet] = None) -> Tuple[int, Any]:
+    """Returns the value and a best move of a SubtractSquare state when the
+    numbers of move_set may be subtracted, read from the Grundy table of
+    move_set. By default move_set is the state's own: the move set of a
+    SubtractionState, and the squares otherwise.
+    >>> grundy_labeller(SubtractSquareState(True, 11))
+    (1, 1)
+    >>> grundy_labeller(SubtractSquareState(True, 2))
+    (-1, 1)
+    >>> from subtraction_game import CUBES, SubtractionState
+    >>> grundy_labeller(SubtractionState(True, 8, CUBES))
+    (1, 8)
+    >>> grundy_labeller(SubtractSquareState(True, 8), CUBES)
+    (1, 8)"""
+    if move_set is None:
+        move_set = getattr(state, 'move_set', SQUARES)
+    table = grundy_table(move_set)
+    moves = list(move_set.moves_up_to(state.current_total))
+    for move in moves:
+        if table.grundy(state.current_total - move) == 0:
+            return state.WIN, move
+    return state.LOSE, moves[0] if moves != [] else None
+
+
+class ProofLabeller:
+    """Labels positions of either game by proof-number search, keeping a
+    transposition table of bounded size between positions.
+
+    search - the search used for every position
+    """
+    search: ProofNumberSearch
+
+    def __init__(self, max_entries: int = 1000000) -> None:
+        """Initializes a labeller whose table holds at most max_entries.
+        >>> labeller = ProofLabeller()
+        >>> labeller(StonehengeGamestate(True, 1))
+        (1, 'A')"""
+        self.search = ProofNumberSearch(max_entries)
+
+    def __call__(self, state: GameState) -> Tuple[int, Any]:
+        """Returns the value and a best move of state."""
+        value = state.WIN if self.search.prove(state) else state.LOSE
+        return value, self.search.best_move(state)
+
+
+def move_code(move: Any) -> int:
+    """Returns the integer stored for move.
+    >>> move_code('AB'), move_code(16), move_code(None)
+    (27, 16, -1)"""
+    if move is None:
+        return -1
+    return cell_id(move) if isinstance(move, str) else int(move)
+
+
+def shard_key(state: GameState) -> tuple:
+    """Returns what must be the same for all the states of a shard: the
+    game, the board size and the length of the state's encoding.
+    >>> shard_key(StonehengeGamestate(True, 3))
+    ('StonehengeGamestate', 3, 9)
+    >>> shard_key(SubtractSquareState(True, 2 ** 64))[2]
+    13"""
+    return (type(state).__name__, getattr(state, 'size', None),
+            encoded_size(state))
+
+
+class ShardWriter:
+    """Writes examples to numbered shard files of at most shard_size
+    examples, one game and board size per shard. Examples wait in one buffer
+    per game and board size until their shard is full. Shards are numbered
+    from one past the highest shard already in the directory, so writing
+    into a directory again adds shards instead of overwriting them.
+
+    directory - where the shards are written
+    shard_size - the most examples in a shard
+    file_format - 'npy' or 'bin'
+    paths - the shards written so far
+    """
+    directory: str
+    shard_size: int
+    file_format: str
+    paths: List[str]
+    _pending: Dict[tuple, List[Example]]
+    _next_number: int
+
+    def __init__(self, directory: str, shard_size: int = 100000,
+                 file_format: str = 'npy') -> None:
+        """Initializes a writer into directory, which is created if needed.
+        >>> import tempfile
+        >>> directory = tempfile.mkdtemp()
+        >>> examples = [(SubtractSquareState(True, 4), 1, 4)]
+        >>> for _ in range(2):
+        ...     paths = ShardWriter(directory, file_format='bin').write_all(
+        ...         examples)
+        >>> [os.path.basename(path) for path in paths]
+        ['shard-00001.bin']
+        >>> sorted(os.listdir(directory))
+        ['shard-00000.bin', 'shard-00001.bin']"""
+        if file_format not in ('npy', 'bin'):
+            raise ValueError("Unknown shard format: {}".format(file_format))
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.file_format = file_format
+        self.paths = []
+        self._pending = {}
+        numbers = [int(match.group(1)) for match in
+                   map(_SHARD_NAME.match, os.listdir(directory)) if match]
+        self._next_number = max(numbers, default=-1) + 1
+
+    def write(self, example: Example) -> None:
+        """Adds example, writing its shard once it holds shard_size
+        examples."""
+        key = shard_key(example[0])
+        pending = self._pending.setdefault(key, [])
+        pending.append(example)
+        if len(pending) >= self.shard_size:
+            self._write_shard(key)
+
+    def write_all(self, examples: Iterable[Example]) -> List[str]:
+        """Writes every one of examples and the unfinished shards, and
+        returns the paths of all the shards written."""
+        for example in examples:
+            self.write(example)
+        self.flush()
+        return self.paths
+
+    def flush(self) -> None:
+        """Writes every unfinished shard."""
+        for key in list(self._pending):
+            self._write_shard(key)
+
+    def _write_shard(self, key: tuple) -> None:
+        """Writes the pending examples with shard_key key as a shard."""
+        examples = self._pending.pop(key)
+        states = [example[0] for example in examples]
+        values = [example[1] for example in examples]
+        moves = [move_code(example[2]) for example in examples]
+        path = os.path.join(self.directory, "shard-{:05d}.{}".format(
+            self._next_number, self.file_format))
+        self._next_number += 1
+        if self.file_format == 'npy':
+            import numpy as np
+            width = len(encode_state(states[0]))
+            data = np.zeros(len(states), dtype=[('state', 'u1', (width,)),
+                                                ('value', 'i1'),
+                                                ('move', '<i8')])
+            data['state'] = np.frombuffer(
+                b''.join(encode_state(state) for state in states),
+                dtype=np.uint8).reshape(-1, width)
+            data['value'] = values
+            data['move'] = moves
+            np.save(path, data)
+        else:
+            count = len(states)
+            with open(path, 'wb') as shard:
+                shard.write(encode_batch(states))
+                shard.write(struct.pack('<{}b'.format(count), *values))
+                shard.write(struct.pack('<{}q'.format(count), *moves))
+        self.paths.append(path)
+
+
+def generate_dataset(new_game: Callable[[int], Any],
+                     strategy: Callable[[Any], Any], num_games: int,
+                     directory: str,
+                     labeller: Callable[[GameState], Tuple[int, Any]],
+                     sample_rate: float = 1.0, shard_size: int = 100000,
+                     file_format: str = 'npy',
+                     seed: Optional[int] = None) -> List[str]:
+    """Runs the whole pipeline and returns the paths of the shards written.
+    seed seeds the sampling of examples.
+    >>> import numpy as np, tempfile
+    >>> from functools import partial
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from strategy_try import random_strategy
+    >>> paths = generate_dataset(
+    ...     lambda n: SubtractSquareGame(True, SubtractSquareState(True, 50)),
+    ...     partial(random_strategy, rng=random.Random(0)), 20,
+    ...     tempfile.mkdtemp(), grundy_labeller, shard_size=16)
+    >>> shards = [np.load(path) for path in paths]
+    >>> [len(shard) for shard in shards]
+    [16, 16, 3]
+    >>> from state_codec import decode_state
+    >>> shard = shards[0]
+    >>> decode_state(shard['state'][0].tobytes()), int(shard['value'][0])
+    (P1's Turn: True - Total: 50, 1)"""
+    examples = label(dedupe(self_play(new_game, strategy, num_games)),
+                     labeller)
+    if sample_rate < 1:
+        examples = sample(examples, sample_rate, seed)
+    return ShardWriter(directory, shard_size, file_format).write_all(examples)
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
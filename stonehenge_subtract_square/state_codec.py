@@ -0,0 +1,304 @@
+"""Compact binary encoding of game states, for sending states between
+processes and keeping them on disk.
+
+A Stonehenge state is encoded as the tag b'H', the board size, the turn
+(1 if it is p1's turn), then the owner of every cell and of every ley-line
+packed 2 bits each (0 unclaimed, 1 or 2 for the player). A SubtractSquare
+state is the tag b'S', the turn and the total as an unsigned 64-bit integer,
+or, for a total of 2 ** 64 or more, the tag b'L', the turn and the total as
+a length-prefixed integer. A SubtractionState is the tag b'M', the turn, the
+length-prefixed name of its move set and the length-prefixed total; its move
+set must be one of subtraction_game.NAMED_MOVE_SETS or finite.
+The encodings of Stonehenge states of one size have the same length, and so
+do those of SubtractSquare totals below 2 ** 64. The length-prefixed 'L' and
+'M' records grow with the total (and, for 'M', with the name of the move
+set), so their lengths vary. A batch is a small header followed by records
+of one tag and length that can be read in place, and encode_batches splits
+any states into such batches.
+"""
+
+import struct
+from typing import Dict, Iterator, List, Tuple, Union
+from game_state import GameState
+from stonehenge_board import board_geometry, cell_owners, line_owners
+from stonehenge_gamestate import StonehengeGamestate
+from subtract_square_state import SubtractSquareState
+from subtraction_game import NAMED_MOVE_SETS, MoveSet, SubtractionState, \
+    move_set_named
+
+STONEHENGE_TAG = b'H'
+SUBTRACT_SQUARE_TAG = b'S'
+LARGE_SUBTRACT_SQUARE_TAG = b'L'
+SUBTRACTION_TAG = b'M'
+
+# Header of a batch: tag of the records, width of each record, record count.
+_BATCH_HEADER = struct.Struct('<cHI')
+_SUBTRACT_SQUARE = struct.Struct('<cBQ')
+# Length of a length-prefixed integer or name.
+_LENGTH = struct.Struct('<H')
+_OWNER_NAMES = {1: '1', 2: '2'}
+
+
+def encoded_size(state: GameState) -> int:
+    """Returns the length in bytes of the encoding of state.
+    >>> encoded_size(StonehengeGamestate(True, 5))
+    15
+    >>> encoded_size(SubtractSquareState(True, 20))
+    10
+    >>> encoded_size(SubtractSquareState(True, 2 ** 70))
+    13"""
+    if isinstance(state, StonehengeGamestate):
+        return _stonehenge_size(state.size)
+    elif type(state) is SubtractSquareState and \
+            0 <= state.current_total < 2 ** 64:
+        return _SUBTRACT_SQUARE.size
+    return len(encode_state(state))
+
+
+def _stonehenge_size(size: int) -> int:
+    """Returns the length of the encoding of a Stonehenge state of the given
+    board size."""
+    geometry = board_geometry(size)
+    return 3 + _packed_length(geometry.num_cells) + \
+        _packed_length(geometry.num_lines)
+
+
+def encode_state(state: GameState) -> bytes:
+    """Returns the binary encoding of state.
+    >>> x1 = StonehengeGamestate(True, 1).make_move('B')
+    >>> encode_state(x1)
+    b'H\\x01\\x00\\x04A\\x04'
+    >>> encode_state(SubtractSquareState(False, 258))
+    b'S\\x00\\x02\\x01\\x00\\x00\\x00\\x00\\x00\\x00'
+    >>> encode_state(SubtractSquareState(True, 2 ** 64))
+    b'L\\x01\\t\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x00\\x01'
+    >>> from subtraction_game import MoveSet, CUBES
+    >>> encode_state(SubtractionState(True, 9, CUBES))
+    b'M\\x01\\x05\\x00cubes\\x01\\x00\\t'
+    >>> encode_state(SubtractionState(True, 9, MoveSet('odd', [1, 3], 3)))
+    Traceback (most recent call last):
+    ...
+    TypeError: Cannot encode the move set odd
+    """
+    if isinstance(state, StonehengeGamestate):
+        if not 0 < state.size <= 255:
+            raise ValueError("Cannot encode a board of size {}: the most is "
+                             "255".format(state.size))
+        return (STONEHENGE_TAG + bytes([state.size, int(state.p1_turn)]) +
+                _pack(cell_owners(state)) + _pack(line_owners(state)))
+    elif isinstance(state, SubtractionState):
+        return (SUBTRACTION_TAG + bytes([int(state.p1_turn)]) +
+                _move_set_name(state.move_set) +
+                _pack_integer(state.current_total))
+    elif isinstance(state, SubtractSquareState):
+        if 0 <= state.current_total < 2 ** 64:
+            return _SUBTRACT_SQUARE.pack(SUBTRACT_SQUARE_TAG,
+                                         int(state.p1_turn),
+                                         state.current_total)
+        return (LARGE_SUBTRACT_SQUARE_TAG + bytes([int(state.p1_turn)]) +
+                _pack_integer(state.current_total))
+    raise TypeError("Cannot encode {}".format(type(state).__name__))
+
+
+def decode_state(data: Union[bytes, memoryview]) -> GameState:
+    """Returns the state encoded in data.
+    >>> x1 = StonehengeGamestate(False, 3).make_move('D').make_move('H')
+    >>> x2 = decode_state(encode_state(x1))
+    >>> x2 == x1 and x2.p1_turn == x1.p1_turn
+    True
+    >>> x2.letter_values == x1.letter_values
+    True
+    >>> decode_state(encode_state(SubtractSquareState(True, 99)))
+    P1's Turn: True - Total: 99
+    >>> decode_state(encode_state(SubtractSquareState(False, 2 ** 70)))
+    P1's Turn: False - Total: 1180591620717411303424
+    >>> from subtraction_game import PRIMES, finite_moves
+    >>> decode_state(encode_state(SubtractionState(True, 9, PRIMES))).move_set
+    MoveSet('primes')
+    >>> x3 = SubtractionState(False, 10, finite_moves([1, 3, 4]))
+    >>> decode_state(encode_state(x3)).get_possible_moves()
+    [1, 3, 4]
+    """
+    tag = bytes(data[:1])
+    if tag == STONEHENGE_TAG:
+        size, p1_turn = data[1], bool(data[2])
+        geometry = board_geometry(size)
+        cells_length = _packed_length(geometry.num_cells)
+        owners = _unpack(data[3:3 + cells_length], geometry.num_cells)
+        lines = _unpack(data[3 + cells_length:], geometry.num_lines)
+        names = [_OWNER_NAMES.get(owner, geometry.cells[i])
+                 for i, owner in enumerate(owners)]
+        letter_values = [[names[i] for i in row] for row in geometry.rows]
+        ley_lines = [[_OWNER_NAMES.get(lines[j], '@'),
+                      [names[i] for i in line]]
+                     for j, line in enumerate(geometry.lines)]
+        return StonehengeGamestate(p1_turn, size, letter_values, ley_lines)
+    elif tag == SUBTRACT_SQUARE_TAG:
+        _, p1_turn, total = _SUBTRACT_SQUARE.unpack(data)
+        return SubtractSquareState(bool(p1_turn), total)
+    elif tag == LARGE_SUBTRACT_SQUARE_TAG:
+        return SubtractSquareState(bool(data[1]), _unpack_integer(data, 2)[0])
+    elif tag == SUBTRACTION_TAG:
+        name_length = _LENGTH.unpack_from(data, 2)[0]
+        name_end = 2 + _LENGTH.size + name_length
+        move_set = move_set_named(
+            bytes(data[2 + _LENGTH.size:name_end]).decode())
+        return SubtractionState(bool(data[1]),
+                                _unpack_integer(data, name_end)[0], move_set)
+    raise ValueError("Unknown state tag: {!r}".format(tag))
+
+
+def encode_batch(states: List[GameState]) -> bytes:
+    """Returns one buffer holding the encodings of all of states, which
+    must be of the same game (and board size, for Stonehenge).
+    >>> x1 = StonehengeGamestate(True, 2)
+    >>> batch = encode_batch([x1, x1.make_move('E')])
+    >>> len(batch) == 7 + 2 * encoded_size(x1)
+    True
+    >>> encode_batch([x1, SubtractSquareState(True, 3)])
+    Traceback (most recent call last):
+    ...
+    ValueError: All states in a batch must have the same encoded size
+    >>> encode_batch([SubtractSquareState(True, 3),
+    ...               SubtractSquareState(True, 2 ** 64)])
+    Traceback (most recent call last):
+    ...
+    ValueError: All states in a batch must have the same encoded size
+    """
+    records = [encode_state(state) for state in states]
+    width = len(records[0]) if records else 0
+    if any(len(record) != width or record[:1] != records[0][:1]
+           for record in records):
+        raise ValueError("All states in a batch must have the same encoded "
+                         "size")
+    tag = records[0][:1] if records else b'\x00'
+    return _BATCH_HEADER.pack(tag, width, len(records)) + b''.join(records)
+
+
+def encode_batches(states: List[GameState]) -> List[Tuple[List[int], bytes]]:
+    """Returns the states split into batches of records of the same tag and
+    length, in the order each first occurs, each with the indices in states
+    of its records.
+    >>> from subtraction_game import CUBES
+    >>> states = [SubtractionState(True, 9, CUBES),
+    ...           SubtractionState(True, 300, CUBES),
+    ...           SubtractionState(True, 8, CUBES)]
+    >>> [(indices, batch_length(batch))
+    ...  for indices, batch in encode_batches(states)]
+    [([0, 2], 2), ([1], 1)]"""
+    groups: Dict[Tuple[bytes, int], List[int]] = {}
+    records = [encode_state(state) for state in states]
+    for i, record in enumerate(records):
+        groups.setdefault((record[:1], len(record)), []).append(i)
+    return [(indices, _BATCH_HEADER.pack(records[indices[0]][:1],
+                                         len(records[indices[0]]),
+                                         len(indices)) +
+             b''.join(records[i] for i in indices))
+            for indices in groups.values()]
+
+
+def batch_length(batch: Union[bytes, memoryview]) -> int:
+    """Returns the number of states in batch.
+    >>> batch_length(encode_batch([SubtractSquareState(True, 3)] * 4))
+    4"""
+    return _BATCH_HEADER.unpack_from(batch)[2]
+
+
+def batch_record(batch: Union[bytes, memoryview], index: int) -> memoryview:
+    """Returns the encoding of the state at index in batch, without copying
+    or reading the other records.
+    >>> batch = encode_batch([SubtractSquareState(True, n) for n in range(5)])
+    >>> decode_state(batch_record(batch, 3))
+    P1's Turn: True - Total: 3"""
+    _, width, count = _BATCH_HEADER.unpack_from(batch)
+    if not 0 <= index < count:
+        raise IndexError("Batch has no record {}".format(index))
+    start = _BATCH_HEADER.size + index * width
+    return memoryview(batch)[start:start + width]
+
+
+def iter_batch(batch: Union[bytes, memoryview]) -> Iterator[memoryview]:
+    """Yields the encoding of every state in batch, in order.
+    >>> batch = encode_batch([SubtractSquareState(False, 7)] * 2)
+    >>> [len(record) for record in iter_batch(batch)]
+    [10, 10]"""
+    _, width, count = _BATCH_HEADER.unpack_from(batch)
+    view = memoryview(batch)
+    for start in range(_BATCH_HEADER.size,
+                       _BATCH_HEADER.size + count * width, width):
+        yield view[start:start + width]
+
+
+def decode_batch(batch: Union[bytes, memoryview]) -> List[GameState]:
+    """Returns all the states in batch, in order.
+    >>> x1 = StonehengeGamestate(True, 3)
+    >>> states = [x1, x1.make_move('A'), x1.make_move('L')]
+    >>> decode_batch(encode_batch(states)) == states
+    True"""
+    return [decode_state(record) for record in iter_batch(batch)]
+
+
+def _move_set_name(move_set: MoveSet) -> bytes:
+    """Returns the length-prefixed name of move_set, which must be one of
+    NAMED_MOVE_SETS or finite for the name to be decoded back to it."""
+    if move_set.max_move is None:
+        decodable = NAMED_MOVE_SETS.get(move_set.name) is move_set
+    else:
+        decodable = move_set.name == "{{{}}}".format(", ".join(
+            str(move) for move in move_set.moves_up_to(move_set.max_move)))
+    if not decodable:
+        raise TypeError("Cannot encode the move set {}".format(move_set.name))
+    name = move_set.name.encode()
+    return _LENGTH.pack(len(name)) + name
+
+
+def _pack_integer(value: int) -> bytes:
+    """Returns the non-negative value as its length in bytes followed by
+    its bytes, least significant first.
+    >>> _pack_integer(258)
+    b'\\x02\\x00\\x02\\x01'"""
+    data = value.to_bytes((value.bit_length() + 7) // 8, 'little')
+    return _LENGTH.pack(len(data)) + data
+
+
+def _unpack_integer(data: Union[bytes, memoryview],
+                    offset: int) -> Tuple[int, int]:
+    """Returns the integer packed by _pack_integer at offset in data, and
+    the offset just after it.
+    >>> _unpack_integer(b'x' + _pack_integer(2 ** 80), 1)
+    (1208925819614629174706176, 14)"""
+    length = _LENGTH.unpack_from(data, offset)[0]
+    start = offset + _LENGTH.size
+    return (int.from_bytes(data[start:start + length], 'little'),
+            start + length)
+
+
+def _packed_length(count: int) -> int:
+    """Returns the number of bytes needed to store count 2-bit values.
+    >>> _packed_length(9)
+    3"""
+    return (count + 3) // 4
+
+
+def _pack(values: List[int]) -> bytes:
+    """Packs values, each from 0 to 3, into 2 bits each, four to a byte.
+    >>> _pack([1, 0, 2, 0, 1])
+    b'!\\x01'"""
+    packed = bytearray(_packed_length(len(values)))
+    for i, value in enumerate(values):
+        packed[i // 4] |= value << (2 * (i % 4))
+    return bytes(packed)
+
+
+def _unpack(data: Union[bytes, memoryview], count: int) -> List[int]:
+    """Returns the first count 2-bit values packed in data.
+    >>> _unpack(b'!\\x01', 5)
+    [1, 0, 2, 0, 1]"""
+    return [(data[i // 4] >> (2 * (i % 4))) & 3 for i in range(count)]
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,143 @@
+"""Size-dependent geometry of the Stonehenge board, shared by
+StonehengeGamestate and the fast engines that work on cell indices instead of
+cell names.
+
+Cells are numbered in board order, row by row, and named A to Z and then AA,
+AB, ... so that boards of any size can be played. The geometry of each size
+is built the first time a board of that size is used.
+"""
+
+from typing import Dict, List, Tuple
+
+_GEOMETRIES: Dict[int, 'BoardGeometry'] = {}
+
+
+def cell_name(index: int) -> str:
+    """Returns the move name of the cell with the given index.
+    >>> [cell_name(i) for i in [0, 25, 26, 27, 52, 701, 702]]
+    ['A', 'Z', 'AA', 'AB', 'BA', 'ZZ', 'AAA']"""
+    name = ''
+    index += 1
+    while index > 0:
+        index, letter = divmod(index - 1, 26)
+        name = chr(ord('A') + letter) + name
+    return name
+
+
+def cell_id(name: str) -> int:
+    """Returns the index of the cell with the given move name.
+    >>> [cell_id(name) for name in ['A', 'Z', 'AA', 'ZZ', 'AAA']]
+    [0, 25, 26, 701, 702]"""
+    index = 0
+    for letter in name:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+class BoardGeometry:
+    """The cells and ley-lines of a Stonehenge board of a given size.
+
+    cells - the cell names in board order, e.g. ['A', 'B', 'C']
+    cell_index - maps each cell name to its position in cells
+    rows - the indices of the cells in each row of the board
+    lines - for each ley-line (in StonehengeGamestate.ley_lines order), the
+            indices of the cells it contains
+    line_masks - for each ley-line, a bit mask with bit i set for each
+                 cell i on the line
+    """
+    size: int
+    cells: List[str]
+    cell_index: Dict[str, int]
+    rows: List[List[int]]
+    lines: List[Tuple[int, ...]]
+    line_masks: List[int]
+
+    def __init__(self, size: int) -> None:
+        """Builds the geometry of a board of the given size: rows of 2 to
+        size + 1 cells and a last row of size cells, the horizontal
+        ley-lines, the two border lines from the top cells, and then the two
+        diagonals from each row but the last.
+        >>> g1 = BoardGeometry(2)
+        >>> g1.cells
+        ['A', 'B', 'C', 'D', 'E', 'F', 'G']
+        >>> g1.rows
+        [[0, 1], [2, 3, 4], [5, 6]]
+        >>> g1.lines[5]
+        (0, 3, 6)
+        >>> bin(g1.line_masks[5])
+        '0b1001001'"""
+        self.size = size
+        lengths = list(range(2, size + 2)) + [size]
+        self.rows, start = [], 0
+        for length in lengths:
+            self.rows.append(list(range(start, start + length)))
+            start += length
+        self.cells = [cell_name(i) for i in range(start)]
+        self.cell_index = {cell: i for i, cell in enumerate(self.cells)}
+
+        upper_rows = self.rows[:-1]
+        self.lines = [tuple(row) for row in self.rows]
+        self.lines.append(tuple(row[0] for row in upper_rows))
+        self.lines.append(tuple(row[-1] for row in upper_rows))
+        for i, row in enumerate(upper_rows):
+            # Follow the diagonals from the first and last cells of row down
+            # to the last row, which is one cell shorter at each end.
+            right = [below[-len(row)] for below in self.rows[i:-1]]
+            left = [below[len(row) - 1] for below in self.rows[i:-1]]
+            right.append(self.rows[-1][1 - len(row)])
+            left.append(self.rows[-1][len(row) - 2])
+            self.lines.extend([tuple(right), tuple(left)])
+        self.line_masks = [sum(1 << i for i in line) for line in self.lines]
+
+    @property
+    def num_cells(self) -> int:
+        """Returns the number of cells on the board.
+        >>> BoardGeometry(3).num_cells
+        12"""
+        return len(self.cells)
+
+    @property
+    def num_lines(self) -> int:
+        """Returns the number of ley-lines on the board.
+        >>> BoardGeometry(3).num_lines
+        12"""
+        return len(self.lines)
+
+
+def board_geometry(size: int) -> BoardGeometry:
+    """Returns the geometry for a board of the given size, building it on
+    first use.
+    >>> board_geometry(4) is board_geometry(4)
+    True"""
+    if size not in _GEOMETRIES:
+        _GEOMETRIES[size] = BoardGeometry(size)
+    return _GEOMETRIES[size]
+
+
+def cell_owners(state: 'StonehengeGamestate') -> List[int]:
+    """Returns the owner of every cell of state in board order: 0 for an
+    unclaimed cell, 1 or 2 for a cell claimed by that player.
+    >>> from stonehenge_gamestate import StonehengeGamestate
+    >>> x1 = StonehengeGamestate(True, 1).make_move('B')
+    >>> cell_owners(x1)
+    [0, 1, 0]"""
+    return [int(cell) if cell in ('1', '2') else 0
+            for row in state.letter_values for cell in row]
+
+
+def line_owners(state: 'StonehengeGamestate') -> List[int]:
+    """Returns the owner of every ley-line of state: 0 for an unclaimed
+    line, 1 or 2 for a line captured by that player.
+    >>> from stonehenge_gamestate import StonehengeGamestate
+    >>> x1 = StonehengeGamestate(True, 1).make_move('B')
+    >>> line_owners(x1)
+    [1, 0, 0, 1, 0, 1]"""
+    return [int(ley_line[0]) if ley_line[0] in ('1', '2') else 0
+            for ley_line in state.ley_lines]
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,110 @@
+"""A cheap heuristic evaluator for Stonehenge positions.
+
+Unlike StonehengeGamestate.rough_outcome, which builds every child and
+grandchild state, the evaluator reads each ley-line of the position once and
+never makes a move. It scores the position in [-1, 1] for the player to move
+from three terms, each in [-1, 1]:
+
+    lines - captured ley-lines, relative to the half needed to win
+    threats - unclaimed ley-lines a player captures with one more cell
+    cells - cells claimed on the board
+"""
+
+from typing import Dict
+from stonehenge_gamestate import StonehengeGamestate
+
+
+class HeuristicEvaluator:
+    """Scores Stonehenge positions for the player to move.
+
+    line_weight - weight of the captured ley-line balance
+    threat_weight - weight of the threatened ley-line balance
+    cell_weight - weight of the claimed cell balance
+    """
+    line_weight: float
+    threat_weight: float
+    cell_weight: float
+
+    def __init__(self, line_weight: float = 1.0, threat_weight: float = 0.5,
+                 cell_weight: float = 0.25) -> None:
+        """Initializes an evaluator with the given weights, which must not
+        all be 0.
+        >>> HeuristicEvaluator(2, 1, 0).threat_weight
+        1"""
+        self.line_weight = line_weight
+        self.threat_weight = threat_weight
+        self.cell_weight = cell_weight
+
+    def evaluate(self, state: StonehengeGamestate) -> float:
+        """Returns an estimate in [LOSE, WIN] of the outcome for the player
+        to move at state: LOSE if the game is over, WIN if the player can
+        capture enough ley-lines with one move, and otherwise the weighted
+        average of the line, threat and cell balances.
+        >>> evaluator = HeuristicEvaluator()
+        >>> x1 = StonehengeGamestate(True, 3)
+        >>> evaluator.evaluate(x1)
+        0.0
+        >>> x2 = x1.make_move('A')
+        >>> -1 < evaluator.evaluate(x2) < 0
+        True
+        >>> evaluator.evaluate(StonehengeGamestate(True, 1))
+        1
+        >>> evaluator.evaluate(StonehengeGamestate(True, 1).make_move('A'))
+        -1"""
+        me, them = ('1', '2') if state.p1_turn else ('2', '1')
+        num_lines = len(state.ley_lines)
+        my_lines = their_lines = my_threats = their_threats = 0
+        # For each free cell, how many ley-lines the player captures by
+        # claiming it.
+        gains: Dict[str, int] = {}
+
+        for owner, cells in state.ley_lines:
+            if owner == me:
+                my_lines += 1
+            elif owner == them:
+                their_lines += 1
+            else:
+                length = len(cells)
+                if 2 * (cells.count(me) + 1) >= length:
+                    my_threats += 1
+                    for cell in cells:
+                        if cell != me and cell != them:
+                            gains[cell] = gains.get(cell, 0) + 1
+                if 2 * (cells.count(them) + 1) >= length:
+                    their_threats += 1
+
+        if 2 * max(my_lines, their_lines) >= num_lines:
+            return state.LOSE
+        if 2 * (my_lines + max(gains.values(), default=0)) >= num_lines:
+            return state.WIN
+
+        half = num_lines / 2
+        my_cells = their_cells = num_cells = 0
+        for row in state.letter_values:
+            num_cells += len(row)
+            my_cells += row.count(me)
+            their_cells += row.count(them)
+
+        total = (self.line_weight * (my_lines - their_lines) / half +
+                 self.threat_weight * (my_threats - their_threats) /
+                 num_lines +
+                 self.cell_weight * (my_cells - their_cells) / num_cells)
+        return total / (self.line_weight + self.threat_weight +
+                        self.cell_weight)
+
+
+DEFAULT_EVALUATOR = HeuristicEvaluator()
+
+
+def evaluate(state: StonehengeGamestate) -> float:
+    """Returns the score of state by the default HeuristicEvaluator.
+    >>> evaluate(StonehengeGamestate(False, 2))
+    0.0"""
+    return DEFAULT_EVALUATOR.evaluate(state)
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
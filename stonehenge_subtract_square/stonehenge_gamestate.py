@@ -1,14 +1,36 @@
-"""Document for the gamestate of the stonehenge game."""
-
-from typing import List
+"""Document for the gamestate of the stonehenge game.
+
+The board of each size is laid out on integer cell ids by stonehenge_board,
+but a state still keeps its cells by name: letter_values holds each cell's
+name, or the player who claimed it, and ley_lines the names of the cells on
+each ley-line. The game, the evaluator, the renderer and the state codec
+all read these lists, so they stay as they were, and the geometry only
+generates them for a new board. Code that wants ids converts a state with
+stonehenge_board.cell_owners and line_owners.
+"""
+
+from typing import List, Optional
 from game_state import GameState
-
-ALPHABET = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M',
-            'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z']
+from stonehenge_board import board_geometry
+from stonehenge_render import render_state
 
 
 class StonehengeGamestate(GameState):
-    """A class to keep track of the Stonehenge gamestate."""
+    """A class to keep track of the Stonehenge gamestate.
+
+    p1_turn - whether it is Player 1's turn
+    size - the board size
+    letter_values - the cells of each row, by name, or '1' or '2' once
+                    claimed
+    ley_lines - each ley-line as [owner, cells], where owner is '@' until a
+                player captures the line and cells are as in letter_values
+    num_ley_lines - the number of ley-lines, 3 * size + 3
+    """
+    p1_turn: bool
+    size: int
+    letter_values: List[List[str]]
+    ley_lines: List[list]
+    num_ley_lines: int
 
     def __init__(self, p1_turn: bool, size: int = None,
                  letter_values: List = None, ley_lines: List = None) -> None:
@@ -23,7 +45,7 @@ class StonehengeGamestate(GameState):
         3"""
         self.p1_turn = p1_turn
         if not size:
-            self.size = int(input("Enter a board size from 1 - 5: "))
+            self.size = int(input("Enter a board size: "))
         else:
             self.size = size
         if not letter_values:  # **if we are starting a new game**
@@ -42,26 +64,11 @@ class StonehengeGamestate(GameState):
         >>> x1 = StonehengeGamestate(True, 2)
         >>> x1.generate_game_spaces()
         [['A', 'B'], ['C', 'D', 'E'], ['F', 'G']]
+        >>> StonehengeGamestate(True, 6).generate_game_spaces()[-1]
+        ['AB', 'AC', 'AD', 'AE', 'AF', 'AG']
         """
-
-        index, counter, row_count, board_list = 0, 0, 2, []
-        while row_count <= self.size + 1:
-            row_temp_list = []
-            while counter < row_count:
-                counter += 1
-                row_temp_list.append(ALPHABET[index])
-                index += 1
-            board_list.append(row_temp_list)
-            row_count += 1
-            counter = 0
-        row_temp_list = []
-        while counter < row_count - 2:
-            counter += 1
-            row_temp_list.append(ALPHABET[index])
-            index += 1
-        board_list.append(row_temp_list)
-        # print(board_list)
-        return board_list
+        geometry = board_geometry(self.size)
+        return [[geometry.cells[i] for i in row] for row in geometry.rows]
 
     def generate_ley_lines(self) -> List[List]:
         """Generates ley_lines based on the game board size initialized.
@@ -74,21 +81,9 @@ class StonehengeGamestate(GameState):
         >>> ['@', ['E', 'H', 'K']] in y2
         True
         """
-        ley_lines_list = []
-        # Step 1: Generate the horizontal ley-lines
-        horizontal_lines = self.generate_horizontal_ley_lines()
-        for lst in horizontal_lines:
-            ley_lines_list.append(lst)
-        # Step 2: Special case of first row diagonal lists - 2 of them
-        special_lines = self.generate_special_ley_lines()
-        for lst in special_lines:
-            ley_lines_list.append(lst)
-        # Step 3: Generate the remaining diagonal ley lines.
-        standard_lines = self.generate_standard_diagonal()
-        for lst in standard_lines:
-            ley_lines_list.append(lst)
-
-        return ley_lines_list
+        # The horizontal ley-lines, then the two special ones along the
+        # borders, then the remaining diagonals.
+        return self._named_ley_lines(0, None)
 
     def generate_standard_diagonal(self) -> List[list]:
         """Generates the diagonal ley lines, other than the ones stemming from
@@ -104,27 +99,7 @@ class StonehengeGamestate(GameState):
         >>> ['@', ['E', 'G']] in y
         True
         """
-        # 1 variables: For the right standard diagonals.
-        # 2 variables: For the left standard diagonals.
-        ley_lines_list = []
-        i = 0
-        for sublist in self.letter_values[:-1]:
-            temp_list1, temp_list2 = [], []
-            temp_index1 = 0 - len(sublist)  # takes the first value.
-            temp_index2 = len(sublist) - 1  # takes the end index from sublist
-            for sublist2 in self.letter_values[i:]:  # starts from the
-                # current sublist and goes until the end.
-                if sublist2 == self.letter_values[-1]:
-                    temp_list1.append(sublist2[temp_index1 + 1])
-                    temp_list2.append(sublist2[temp_index2 - 1])
-                else:
-                    temp_list1.append(sublist2[temp_index1])
-                    temp_list2.append(sublist2[temp_index2])
-            ley_lines_list.append(["@", temp_list1])
-            ley_lines_list.append(["@", temp_list2])
-            i += 1
-
-        return ley_lines_list
+        return self._named_ley_lines(self.size + 3, None)
 
     def generate_horizontal_ley_lines(self) -> List[list]:
         """Helper function for the generate ley lines - this function
@@ -136,11 +111,7 @@ class StonehengeGamestate(GameState):
         >>> x2 = StonehengeGamestate(True, 2)
         >>> x2.generate_horizontal_ley_lines()
         [['@', ['A', 'B']], ['@', ['C', 'D', 'E']], ['@', ['F', 'G']]]"""
-        ley_lines_list = []
-        for sublist in self.letter_values:
-            new_ley_line = ['@', sublist]
-            ley_lines_list.append(new_ley_line)
-        return ley_lines_list
+        return self._named_ley_lines(0, self.size + 1)
 
     def generate_special_ley_lines(self) -> List[list]:
         """Generates the special ley-lines: i.e. the ones which stem from the
@@ -153,163 +124,30 @@ class StonehengeGamestate(GameState):
         >>> x2.generate_special_ley_lines()
         [['@', ['A', 'C']], ['@', ['B', 'E']]]
         """
-        temp_list, temp_list2, ley_lines_list = [], [], []
-        for sublist in self.letter_values:
-            temp_list.append(sublist[0])
-            # print(temp_list)
-            temp_list2.append(sublist[-1])
-            # print(temp_list2)
-        temp_list = temp_list[:-1]
-        temp_list2 = temp_list2[:-1]
-        new_ley_line = ["@", temp_list]
-        ley_lines_list.append(new_ley_line)
-        new_ley_line = ["@", temp_list2]
-        ley_lines_list.append(new_ley_line)
-        return ley_lines_list
+        return self._named_ley_lines(self.size + 1, self.size + 3)
+
+    def _named_ley_lines(self, start: int, stop: Optional[int]) -> List[list]:
+        """Returns new unclaimed ley-lines, with cell names, for the lines
+        from start up to stop of the board geometry."""
+        geometry = board_geometry(self.size)
+        return [['@', [geometry.cells[i] for i in line]]
+                for line in geometry.lines[start:stop]]
 
     def __str__(self) -> str:
         """Return the string representation of this game state.
         >>> x1 = StonehengeGamestate(True, 3)
         >>> y1 = x1.__str__()
         >>> isinstance(y1, str)
-        True"""
-        if self.size == 1:
-            return r"""\\
-                   {}   {}
-                  /   /
-             {} - {} - {}
-                  \ / \
-               {} - {}   {}
-                    \
-                     {}""".format(self.ley_lines[2][0], self.ley_lines[5][0],
-                                  self.ley_lines[0][0], self.ley_lines[0][1][0],
-                                  self.ley_lines[0][1][1], self.ley_lines[1][0],
-                                  self.ley_lines[1][1][0], self.ley_lines[3][0],
-                                  self.ley_lines[4][0])
-        elif self.size == 2:
-            return r"""\\
-                        {}   {}
-                       /   /
-                  {} - {} - {}   {}
-                     / \ / \ /
-                {} - {} - {} - {}
-                     \ / \ / \
-                  {} - {} - {}   {}
-                       \   \
-                        {}   {}""".format(self.ley_lines[3][0],
-                                          self.ley_lines[6][0],
-                                          self.ley_lines[0][0],
-                                          self.ley_lines[0][1][0],
-                                          self.ley_lines[0][1][1],
-                                          self.ley_lines[8][0],
-                                          self.ley_lines[1][0],
-                                          self.ley_lines[1][1][0],
-                                          self.ley_lines[1][1][1],
-                                          self.ley_lines[1][1][2],
-                                          self.ley_lines[2][0],
-                                          self.ley_lines[2][1][0],
-                                          self.ley_lines[2][1][1],
-                                          self.ley_lines[4][0],
-                                          self.ley_lines[7][0],
-                                          self.ley_lines[5][0])
-        elif self.size == 3:
-            return r"""\\
-                           {}  {}
-                          /  /
-                     {} - {} - {}   {}
-                        / \ / \ /
-                   {} - {} - {} - {}   {}
-                      / \ / \ / \ /
-                 {} - {} - {} - {} - {}
-                      \ / \ / \ / \
-                   {} - {} - {} - {}   {}
-                        \   \   \
-                         {}   {}   {}
-                """.format(self.ley_lines[4][0], self.ley_lines[7][0],
-                           self.ley_lines[0][0], self.ley_lines[0][1][0],
-                           self.ley_lines[0][1][1], self.ley_lines[9][0],
-                           self.ley_lines[1][0], self.ley_lines[1][1][0],
-                           self.ley_lines[1][1][1], self.ley_lines[1][1][2],
-                           self.ley_lines[11][0], self.ley_lines[2][0],
-                           self.ley_lines[2][1][0], self.ley_lines[2][1][1],
-                           self.ley_lines[2][1][2], self.ley_lines[2][1][3],
-                           self.ley_lines[3][0], self.ley_lines[3][1][0],
-                           self.ley_lines[3][1][1], self.ley_lines[3][1][2],
-                           self.ley_lines[5][0], self.ley_lines[10][0],
-                           self.ley_lines[8][0], self.ley_lines[6][0])
-        elif self.size == 4:
-
-            return r"""\\
-                       {}  {}
-                      /  /
-                 {} - {} - {}   {}
-                    / \ / \ /
-               {} - {} - {} - {}   {}
-                  / \ / \ / \ /
-             {} - {} - {} - {} - {}   {}
-                / \ / \ / \ / \ /
-           {} - {} - {} - {} - {} - {}
-                \ / \ / \ / \ / \
-             {} - {} - {} - {} - {}   {}
-                  \   \   \   \
-                   {}   {}   {}   {}
-        """.format(self.ley_lines[5][0], self.ley_lines[8][0],
-                   self.ley_lines[0][0], self.ley_lines[0][1][0],
-                   self.ley_lines[0][1][1], self.ley_lines[10][0],
-                   self.ley_lines[1][0], self.ley_lines[1][1][0],
-                   self.ley_lines[1][1][1], self.ley_lines[1][1][2],
-                   self.ley_lines[12][0], self.ley_lines[2][0],
-                   self.ley_lines[2][1][0], self.ley_lines[2][1][1],
-                   self.ley_lines[2][1][2], self.ley_lines[2][1][3],
-                   self.ley_lines[14][0], self.ley_lines[3][0],
-                   self.ley_lines[3][1][0], self.ley_lines[3][1][1],
-                   self.ley_lines[3][1][2], self.ley_lines[3][1][3],
-                   self.ley_lines[3][1][4], self.ley_lines[4][0],
-                   self.ley_lines[4][1][0],
-                   self.ley_lines[4][1][1], self.ley_lines[4][1][2],
-                   self.ley_lines[4][1][3], self.ley_lines[6][0],
-                   self.ley_lines[13][0], self.ley_lines[11][0],
-                   self.ley_lines[9][0], self.ley_lines[7][0])
-        elif self.size == 5:
-            return r"""\\
-                       {}  {}
-                      /  /
-                 {} - {} - {}   {}
-                    / \ / \ /
-               {} - {} - {} - {}   {}
-                  / \ / \ / \ /
-             {} - {} - {} - {} - {}   {}
-                / \ / \ / \ / \ /
-           {} - {} - {} - {} - {} - {}   {}
-              / \ / \ / \ / \ / \ /
-         {} - {} - {} - {} - {} - {} - {}
-              \ / \ / \ / \ / \ / \
-           {} - {} - {} - {} - {} - {}   {}
-                \   \   \   \   \
-                 {}   {}   {}   {}   {}
-         """.format(self.ley_lines[6][0], self.ley_lines[9][0],
-                    self.ley_lines[0][0], self.ley_lines[0][1][0],
-                    self.ley_lines[0][1][1], self.ley_lines[11][0],
-                    self.ley_lines[1][0], self.ley_lines[1][1][0],
-                    self.ley_lines[1][1][1], self.ley_lines[1][1][2],
-                    self.ley_lines[13][0], self.ley_lines[2][0],
-                    self.ley_lines[2][1][0], self.ley_lines[2][1][1],
-                    self.ley_lines[2][1][2], self.ley_lines[2][1][3],
-                    self.ley_lines[15][0], self.ley_lines[3][0],
-                    self.ley_lines[3][1][0], self.ley_lines[3][1][1],
-                    self.ley_lines[3][1][2], self.ley_lines[3][1][3],
-                    self.ley_lines[3][1][4], self.ley_lines[17][0],
-                    self.ley_lines[4][0], self.ley_lines[4][1][0],
-                    self.ley_lines[4][1][1], self.ley_lines[4][1][2],
-                    self.ley_lines[4][1][3], self.ley_lines[4][1][4],
-                    self.ley_lines[4][1][5], self.ley_lines[5][0],
-                    self.ley_lines[5][1][0], self.ley_lines[5][1][1],
-                    self.ley_lines[5][1][2], self.ley_lines[5][1][3],
-                    self.ley_lines[5][1][4], self.ley_lines[7][0],
-                    self.ley_lines[16][0], self.ley_lines[14][0],
-                    self.ley_lines[12][0], self.ley_lines[10][0],
-                    self.ley_lines[8][0])
-        return "BOARD SIZE NOT FROM 1-5: CANNOT OUTPUT STR REPRESENTATION."
+        True
+        >>> print(StonehengeGamestate(True, 1))
+              @   @
+             /   /
+        @ - A - B
+             \\ / \\
+          @ - C   @
+               \\
+                @"""
+        return render_state(self)
 
     def __repr__(self) -> str:
         """Returns a string representation of this game state. Shows each
@@ -357,7 +195,7 @@ class StonehengeGamestate(GameState):
         # If the game is not over already
         for ley_line in self.ley_lines:
             for item in ley_line[1]:
-                if item in ALPHABET and item not in possible_moves:
+                if is_cell_name(item) and item not in possible_moves:
                     possible_moves.append(item)
         return possible_moves
 
@@ -462,6 +300,14 @@ class StonehengeGamestate(GameState):
         return self.ley_lines == other.ley_lines and self.size == other.size
 
 
+def is_cell_name(item: object) -> bool:
+    """Returns whether item is the name of an unclaimed cell, such as 'A' or
+    'AB', rather than the number of the player who claimed it.
+    >>> is_cell_name('AB'), is_cell_name('1'), is_cell_name(1)
+    (True, False, False)"""
+    return isinstance(item, str) and item.isalpha()
+
+
 def all_states_over(states_list: List[GameState]) -> bool:
     """Given a list of states, checks if all the states can be over within one
      move."""
@@ -0,0 +1,172 @@
+"""Vectorized random playouts of Stonehenge, used as a rollout backend for
+simulation-based strategies and statistics.
+
+Boards are kept as an (N, cells) int8 array of cell owners and the ley-lines
+as a (cells, lines) membership matrix, so that one step of thousands of
+games is a handful of NumPy operations instead of thousands of make_move
+calls."""
+
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from stonehenge_board import board_geometry, cell_owners, line_owners
+from stonehenge_gamestate import StonehengeGamestate
+
+
+class PlayoutEngine:
+    """Plays random Stonehenge games on boards of one size.
+
+    size - the board size this engine plays on
+    membership - (cells, lines) int16 matrix, 1 where the cell is in the line
+    line_lengths - the number of cells in each ley-line
+    """
+    size: int
+    membership: Any
+    line_lengths: Any
+
+    def __init__(self, size: int) -> None:
+        """Precomputes the ley-line membership matrix for the board size.
+        >>> e1 = PlayoutEngine(1)
+        >>> e1.membership.tolist()
+        [[1, 0, 1, 0, 1, 0], [1, 0, 0, 1, 0, 1], [0, 1, 0, 0, 1, 1]]
+        >>> e1.line_lengths.tolist()
+        [2, 1, 1, 1, 2, 2]"""
+        geometry = board_geometry(size)
+        self.size = size
+        self.membership = np.zeros((geometry.num_cells, geometry.num_lines),
+                                   dtype=np.int16)
+        for line, cells in enumerate(geometry.lines):
+            self.membership[list(cells), line] = 1
+        self.line_lengths = self.membership.sum(axis=0)
+
+    def play(self, boards: Any, owners: Any, movers: Any,
+             rng: Any) -> Any:
+        """Plays every game to the end with uniformly random moves and
+        returns the winner (1 or 2) of each game. boards (N, cells) and
+        owners (N, lines) are int8 arrays of cell and ley-line owners, and
+        movers holds the player (1 or 2) to move in each game. The arrays
+        are modified in place.
+        >>> e1 = PlayoutEngine(1)
+        >>> boards = np.zeros((4, 3), dtype=np.int8)
+        >>> owners = np.zeros((4, 6), dtype=np.int8)
+        >>> movers = np.array([1, 1, 2, 2], dtype=np.int8)
+        >>> e1.play(boards, owners, movers, np.random.default_rng(0)).tolist()
+        [1, 1, 2, 2]"""
+        num_lines = self.membership.shape[1]
+        counts = np.stack([(boards == player).astype(np.int16)
+                           @ self.membership for player in (1, 2)])
+        winners = _winners(owners, num_lines)
+        active = np.flatnonzero(winners == 0)
+
+        while active.size:
+            empty = boards[active] == 0
+            stuck = ~empty.any(axis=1)
+            if stuck.any():  # A full board with no winner is a tie.
+                winners[active[stuck]] = -1
+                active, empty = active[~stuck], empty[~stuck]
+                continue
+            # Pick a random empty cell in every game at once.
+            keys = np.where(empty, rng.random(empty.shape), -1.0)
+            choices = keys.argmax(axis=1)
+            players = movers[active]
+            boards[active, choices] = players
+
+            counts[players - 1, active] += self.membership[choices]
+            player_counts = counts[players - 1, active]
+            claimed = ((owners[active] == 0) &
+                       (2 * player_counts >= self.line_lengths))
+            owners[active] = np.where(claimed, players[:, None],
+                                      owners[active])
+
+            finished = _winners(owners[active], num_lines) != 0
+            winners[active[finished]] = players[finished]
+            movers[active] = 3 - players
+            active = active[~finished]
+
+        return winners
+
+
+def _winners(owners: Any, num_lines: int) -> Any:
+    """Returns, for every row of ley-line owners, the player who has
+    captured at least half of the ley-lines, or 0 if the game is not over.
+    >>> _winners(np.array([[1, 1, 0, 2], [2, 0, 0, 1]]), 4).tolist()
+    [1, 0]"""
+    captured1 = 2 * (owners == 1).sum(axis=1) >= num_lines
+    captured2 = 2 * (owners == 2).sum(axis=1) >= num_lines
+    winners = np.zeros(owners.shape[0], dtype=np.int8)
+    winners[captured2] = 2
+    winners[captured1] = 1
+    return winners
+
+
+_ENGINES: Dict[int, PlayoutEngine] = {}
+
+
+def playout_engine(size: int) -> PlayoutEngine:
+    """Returns the playout engine for boards of the given size, building
+    it on first use.
+    >>> playout_engine(3) is playout_engine(3)
+    True"""
+    if size not in _ENGINES:
+        _ENGINES[size] = PlayoutEngine(size)
+    return _ENGINES[size]
+
+
+def random_playouts(states: List[StonehengeGamestate], num_games: int = 1000,
+                    seed: int = None) -> List[Tuple[int, int]]:
+    """Plays num_games random games from each of the starting states and
+    returns, for each state in order, the (wins, losses) of the player whose
+    turn it is in that state. States of the same size are played as one
+    batch.
+    >>> x1 = StonehengeGamestate(True, 1).make_move('B')
+    >>> x2 = StonehengeGamestate(False, 2)
+    >>> results = random_playouts([x1, x2], 500, seed=1)
+    >>> results[0]
+    (0, 500)
+    >>> sum(results[1])
+    500"""
+    rng = np.random.default_rng(seed)
+    results: List[Tuple[int, int]] = [(0, 0)] * len(states)
+    by_size: Dict[int, List[int]] = {}
+    for i, state in enumerate(states):
+        by_size.setdefault(state.size, []).append(i)
+
+    for size, positions in by_size.items():
+        boards = np.repeat(np.array([cell_owners(states[i])
+                                     for i in positions], dtype=np.int8),
+                           num_games, axis=0)
+        owners = np.repeat(np.array([line_owners(states[i])
+                                     for i in positions], dtype=np.int8),
+                           num_games, axis=0)
+        starters = np.array([1 if states[i].p1_turn else 2
+                             for i in positions], dtype=np.int8)
+        movers = np.repeat(starters, num_games)
+        winners = playout_engine(size).play(boards, owners, movers, rng)
+        winners = winners.reshape(len(positions), num_games)
+        for row, i in enumerate(positions):
+            wins = int((winners[row] == starters[row]).sum())
+            losses = int((winners[row] == 3 - starters[row]).sum())
+            results[i] = (wins, losses)
+    return results
+
+
+def playout_strategy(game: Any, num_games: int = 1000) -> str:
+    """Returns the move after which the opponent wins the fewest of
+    num_games random playouts.
+    >>> from stonehenge_game import StonehengeGame
+    >>> x1 = StonehengeGamestate(True, 2)
+    >>> x1 = x1.make_move('A').make_move('F').make_move('D')
+    >>> playout_strategy(StonehengeGame(False, x1), 200)
+    'E'"""
+    state = game.current_state
+    moves = state.get_possible_moves()
+    results = random_playouts([state.make_move(move) for move in moves],
+                              num_games)
+    opponent_wins = [wins for wins, _ in results]
+    return moves[opponent_wins.index(min(opponent_wins))]
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
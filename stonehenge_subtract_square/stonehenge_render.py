@@ -0,0 +1,221 @@
+"""Text pictures of Stonehenge boards of any size.
+
+The picture of a board is laid out once per size, from its BoardGeometry:
+where each cell and each ley-line marker goes, and the '-', '/' and '\\'
+connectors between them. The layout is compiled into a format string, so
+drawing a board only fills in the cells, written with their names or the
+player who claimed them, and the markers, written with '@' or the player who
+captured the ley-line. Cells with longer names (from size 6 on) widen every
+column.
+
+A DiffRenderer draws the board once and afterwards only the cells and
+ley-lines that changed, for long games written to a terminal or a log.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+from stonehenge_board import board_geometry
+
+_LAYOUTS: Dict[int, 'BoardLayout'] = {}
+
+
+class BoardLayout:
+    """Where everything goes in the picture of a board of a given size.
+
+    size - the board size
+    width - the columns taken by each cell or marker
+    cell_slots - the (line, column) of each cell, in board order
+    line_slots - the (line, column) of the marker of each ley-line
+    connectors - the text lines holding only the connectors
+    template - the picture as a format string taking the list of cell texts
+               and the list of markers
+    """
+    size: int
+    width: int
+    cell_slots: List[Tuple[int, int]]
+    line_slots: List[Tuple[int, int]]
+    connectors: List[str]
+    template: str
+
+    def __init__(self, size: int) -> None:
+        """Lays out the picture of a board of the given size.
+        >>> layout = BoardLayout(2)
+        >>> layout.cell_slots[:3]
+        [(2, 6), (2, 10), (4, 4)]
+        >>> layout.line_slots[3], layout.line_slots[6]
+        ((0, 8), (0, 12))"""
+        geometry = board_geometry(size)
+        self.size = size
+        self.width = max(len(cell) for cell in geometry.cells)
+        step = self.width + 3 + (self.width + 3) % 2
+        half = step // 2
+        first_diagonal = size + 3
+        self.cell_slots = [(0, 0)] * geometry.num_cells
+        self.line_slots = [(0, 0)] * geometry.num_lines
+        lines: List[List[str]] = [[] for _ in range(2 * size + 5)]
+
+        def put(line: int, column: int, text: str) -> None:
+            """Writes text into lines[line] at column."""
+            row = lines[line]
+            row.extend(' ' * (column + len(text) - len(row)))
+            row[column:column + len(text)] = text
+
+        for r, cells in enumerate(geometry.rows):
+            line = 2 * r + 2
+            offset = (size - 1 - r) * half if r < size else half
+            columns = [offset + step * (j + 1) for j in range(len(cells))]
+            self.line_slots[r] = (line, offset)
+            for cell, column in zip(cells, columns):
+                self.cell_slots[cell] = (line, column)
+                put(line, column - 2, '-')
+            if r < size - 1:
+                right = (line, offset + step * (len(cells) + 1))
+                self.line_slots[first_diagonal + 2 * r + 3] = right
+            elif r == size:
+                right = (line, offset + step * (size + 1))
+                self.line_slots[size + 2] = right
+            else:
+                right = None
+
+            # The connectors to the row (or markers) below.
+            if r < size - 1:
+                for column in columns:
+                    put(line + 1, column - 1, '/')
+                    put(line + 1, column + self.width, '\\')
+                put(line + 1, right[1] - 1, '/')
+            elif r == size - 1:
+                for j, column in enumerate(columns):
+                    if j > 0:
+                        put(line + 1, column - 1, '/')
+                    put(line + 1, column + self.width, '\\')
+            else:
+                for j, column in enumerate(columns):
+                    put(line + 1, column + self.width, '\\')
+                    self.line_slots[first_diagonal + 2 * (size - 1 - j)] = \
+                        (line + 2, column + half)
+            if r == 0:
+                for line_index, column in zip(
+                        [size + 1, first_diagonal + 1], columns):
+                    self.line_slots[line_index] = (0, column + half)
+                    put(1, column + half - 1, '/')
+        self.connectors = [''.join(row) for row in lines]
+        self.template = self._compile()
+
+    def _compile(self) -> str:
+        """Returns the picture as a format string with a field for each cell
+        and marker, padded to the column width unless it ends its line.
+        >>> BoardLayout(1).template.splitlines()[2]
+        '{1[0]} - {0[0]} - {0[1]}'"""
+        fields: List[List[Tuple[int, str]]] = [[] for _ in self.connectors]
+        for argument, slots in enumerate([self.cell_slots, self.line_slots]):
+            for i, (line, column) in enumerate(slots):
+                fields[line].append((column, "{}[{}]".format(argument, i)))
+        text_lines = []
+        for connectors, line_fields in zip(self.connectors, fields):
+            parts, end = [], 0
+            line_fields.sort()
+            if line_fields:
+                connectors = connectors.ljust(line_fields[-1][0] + self.width)
+            for n, (column, field) in enumerate(line_fields):
+                parts.append(connectors[end:column])
+                end = column + self.width
+                if self.width > 1 and (n < len(line_fields) - 1 or
+                                       end < len(connectors)):
+                    field += ":<{}".format(self.width)
+                parts.append("{" + field + "}")
+            parts.append(connectors[end:])
+            text_lines.append(''.join(parts).rstrip())
+        return '\n'.join(text_lines)
+
+    def render(self, cells: List[str], markers: List[str]) -> str:
+        """Returns the picture with the given cell texts, in board order, and
+        ley-line markers.
+        >>> print(BoardLayout(1).render(['A', '1', 'C'], list('1@@@@1')))
+              @   1
+             /   /
+        1 - A - 1
+             \\ / \\
+          @ - C   @
+               \\
+                @"""
+        return self.template.format(cells, markers)
+
+
+def board_layout(size: int) -> BoardLayout:
+    """Returns the layout of a board of the given size, building it on first
+    use.
+    >>> board_layout(3) is board_layout(3)
+    True"""
+    if size not in _LAYOUTS:
+        _LAYOUTS[size] = BoardLayout(size)
+    return _LAYOUTS[size]
+
+
+def render_state(state: 'StonehengeGamestate') -> str:
+    """Returns the picture of the board of state.
+    >>> from stonehenge_gamestate import StonehengeGamestate
+    >>> x1 = StonehengeGamestate(True, 2).make_move('D').make_move('B')
+    >>> print(render_state(x1))
+            @   @
+           /   /
+      2 - A - 2   @
+         / \\ / \\ /
+    @ - C - 1 - E
+         \\ / \\ / \\
+      @ - F - G   2
+           \\   \\
+            @   @"""
+    return board_layout(state.size).render(
+        [cell for row in state.letter_values for cell in row],
+        [ley_line[0] for ley_line in state.ley_lines])
+
+
+class DiffRenderer:
+    """Draws the successive states of a game: the whole board the first time
+    and whenever the board size changes, and afterwards only what changed
+    since the last state drawn. States of other games are drawn in full.
+    """
+    _last: Optional[Tuple[int, List[str], List[str]]]
+
+    def __init__(self) -> None:
+        """Initializes a renderer that has drawn nothing yet."""
+        self._last = None
+
+    def render(self, state: Any) -> str:
+        """Returns the picture of state, or the changes since the last state
+        drawn.
+        >>> from stonehenge_gamestate import StonehengeGamestate
+        >>> renderer = DiffRenderer()
+        >>> x1 = StonehengeGamestate(True, 1)
+        >>> len(renderer.render(x1).splitlines())
+        7
+        >>> print(renderer.render(x1.make_move('A')))
+        A: 1
+        ley-line A-B: 1
+        ley-line A: 1
+        ley-line A-C: 1
+        >>> renderer.render(x1.make_move('A'))
+        ''"""
+        if not hasattr(state, 'ley_lines'):
+            self._last = None
+            return str(state)
+        cells = [cell for row in state.letter_values for cell in row]
+        markers = [ley_line[0] for ley_line in state.ley_lines]
+        last, self._last = self._last, (state.size, cells, markers)
+        if last is None or last[0] != state.size:
+            return board_layout(state.size).render(cells, markers)
+
+        geometry = board_geometry(state.size)
+        changes = ["{}: {}".format(geometry.cells[i], cell)
+                   for i, cell in enumerate(cells) if cell != last[1][i]]
+        changes.extend(
+            "ley-line {}: {}".format(
+                '-'.join(geometry.cells[i] for i in geometry.lines[j]), marker)
+            for j, marker in enumerate(markers) if marker != last[2][j])
+        return '\n'.join(changes)
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
@@ -0,0 +1,462 @@
+"""Strategies as objects that carry their configuration and resource limits.
+
+A Strategy chooses a move for a state with choose_move(state, budget), where
+the Budget bounds how deep it searches, how many states it expands, how long
+it takes, how many positions it caches and how many processes it uses.
+Called with a game, like the strategy functions, a strategy chooses a move
+for the game's current state within its own budget, so strategy objects can
+be used wherever strategy functions are.
+
+Budgets can be written as text, e.g. 'depth=4,time=1.5' (see parse_budget),
+so a deployment can trade strength for speed without code edits.
+"""
+
+import copy
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Iterator, List, Optional, \
+    Tuple
+from game_state import GameState
+from memory_profile import mark_phase
+from registry import LazyRegistry
+from state_codec import encode_state
+from strategy_try import interactive_strategy, iterative_minimax, \
+    recursive_minimax
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+# The game played from each kind of state, by the name of the state's class.
+GAMES_BY_STATE = LazyRegistry({
+    'StonehengeGamestate': 'stonehenge_game:StonehengeGame',
+    'SubtractSquareState': 'subtract_square_game:SubtractSquareGame',
+    'SubtractionState': 'subtraction_game:SubtractionGame',
+    'MultiHeapState': 'multi_heap_game:MultiHeapGame'})
+
+# The names of the limits in budget text, and the Budget attribute of each.
+BUDGET_FIELDS = {'depth': 'max_depth', 'nodes': 'max_nodes',
+                 'time': 'max_time', 'cache': 'cache_size',
+                 'workers': 'workers'}
+
+
+class Budget:
+    """Limits on the resources used to choose one move. A limit of None
+    means no limit.
+
+    max_depth - the most moves searched ahead
+    max_nodes - the most states expanded
+    max_time - the most seconds taken
+    cache_size - the most positions kept between moves (0 for no cache)
+    workers - how many processes search at once
+    """
+    max_depth: Optional[int]
+    max_nodes: Optional[int]
+    max_time: Optional[float]
+    cache_size: int
+    workers: int
+
+    def __init__(self, max_depth: Optional[int] = None,
+                 max_nodes: Optional[int] = None,
+                 max_time: Optional[float] = None,
+                 cache_size: int = 100000, workers: int = 1) -> None:
+        """Initializes a budget with the given limits."""
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_time = max_time
+        self.cache_size = cache_size
+        self.workers = workers
+
+    def __repr__(self) -> str:
+        """Returns the budget as text for parse_budget.
+        >>> Budget(max_depth=4, max_time=1.5)
+        depth=4,nodes=none,time=1.5,cache=100000,workers=1"""
+        return ",".join("{}={}".format(name, "none" if value is None
+                                       else value)
+                        for name, value in ((name, getattr(self, attribute))
+                                            for name, attribute in
+                                            BUDGET_FIELDS.items()))
+
+
+def parse_budget(text: str) -> Budget:
+    """Returns the budget written in text as comma-separated name=value
+    limits, where the names are depth, nodes, time, cache and workers and a
+    value of none means no limit. Limits not given keep their defaults.
+    >>> parse_budget('depth=4, time=0.5').max_time
+    0.5
+    >>> parse_budget('')
+    depth=none,nodes=none,time=none,cache=100000,workers=1
+    >>> parse_budget('speed=3')
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown budget limit: speed"""
+    budget = Budget()
+    for item in text.split(','):
+        if item.strip() == '':
+            continue
+        name, _, value = item.partition('=')
+        name, value = name.strip(), value.strip()
+        if name not in BUDGET_FIELDS:
+            raise ValueError("Unknown budget limit: {}".format(name))
+        if value.lower() == 'none':
+            setattr(budget, BUDGET_FIELDS[name], None)
+        else:
+            setattr(budget, BUDGET_FIELDS[name],
+                    float(value) if name == 'time' else int(value))
+    return budget
+
+
+class Strategy:
+    """A strategy that chooses moves within a Budget. Subclasses implement
+    choose_move.
+
+    name - the name the strategy is shown by
+    budget - the limits used when the strategy is called with a game
+    stop - once set, a search under way gives up and chooses with what it
+           has found so far, or None if the strategy is not stopped from
+           another thread (strategies that cannot give up ignore it)
+    """
+    name: str
+    budget: Budget
+    stop: Optional[threading.Event]
+
+    def __init__(self, name: str, budget: Optional[Budget] = None) -> None:
+        """Initializes a strategy called name, with budget or no limits."""
+        self.name = name
+        self.budget = budget if budget is not None else Budget()
+        self.stop = None
+
+    @property
+    def __name__(self) -> str:
+        """Returns the name of this strategy, as for strategy functions."""
+        return self.name
+
+    def __repr__(self) -> str:
+        """Returns the name and budget of this strategy.
+        >>> MinimaxStrategy(Budget(max_depth=2, cache_size=0))
+        minimax(depth=2,nodes=none,time=none,cache=0,workers=1)"""
+        return "{}({!r})".format(self.name, self.budget)
+
+    def __call__(self, game: Any) -> Any:
+        """Returns the move chosen for game's current state within this
+        strategy's budget."""
+        return self.choose_move(game.current_state, self.budget)
+
+    def choose_move(self, state: GameState,
+                    budget: Optional[Budget] = None) -> Any:
+        """Returns a move for the player to move at state, chosen within
+        budget (this strategy's budget if None), or None if there is no
+        move."""
+        raise NotImplementedError
+
+    def with_budget(self, budget: Budget) -> 'Strategy':
+        """Returns a copy of this strategy that uses budget.
+        >>> strategy = MinimaxStrategy().with_budget(Budget(max_depth=3))
+        >>> strategy.budget.max_depth
+        3"""
+        strategy = copy.copy(self)
+        strategy.budget = budget
+        return strategy
+
+
+def with_budget(strategy: Callable[[Any], Any],
+                budget: Optional[Budget]) -> Callable[[Any], Any]:
+    """Returns strategy with budget if it is a Strategy and budget is given,
+    a new instance with budget if it is a Strategy class, and otherwise
+    strategy itself (strategy functions have no budget).
+    >>> with_budget(MinimaxStrategy, Budget(max_depth=2)).budget.max_depth
+    2"""
+    if budget is not None and isinstance(strategy, type) and \
+            issubclass(strategy, Strategy):
+        return strategy(budget)
+    if budget is not None and isinstance(strategy, Strategy):
+        return strategy.with_budget(budget)
+    return strategy
+
+
+class FunctionStrategy(Strategy):
+    """A strategy function, called with a game, as a Strategy. The function
+    has no limits of its own, so its budget is only kept. Called with a
+    game, it plays the function on that game; asked for a move for a state,
+    it plays the function on the game of that kind of state.
+
+    function - the strategy function
+    """
+    function: Callable[[Any], Any]
+
+    def __init__(self, function: Callable[[Any], Any],
+                 budget: Optional[Budget] = None) -> None:
+        """Initializes the strategy of function, named after it.
+        >>> from subtract_square_state import SubtractSquareState
+        >>> from strategy_try import iterative_minimax
+        >>> FunctionStrategy(iterative_minimax).choose_move(
+        ...     SubtractSquareState(True, 30))
+        25"""
+        super().__init__(function.__name__, budget)
+        self.function = function
+
+    def __call__(self, game: Any) -> Any:
+        """Returns the function's move for game."""
+        return self.function(game)
+
+    def choose_move(self, state: GameState,
+                    budget: Optional[Budget] = None) -> Any:
+        """Returns the function's move for a game at state."""
+        return self.function(game_for(state))
+
+
+def game_for(state: GameState) -> Any:
+    """Returns a game of the kind of state, at state.
+    >>> from subtract_square_state import SubtractSquareState
+    >>> type(game_for(SubtractSquareState(True, 4))).__name__
+    'SubtractSquareGame'"""
+    return GAMES_BY_STATE[type(state).__name__](state.p1_turn, state)
+
+
+def position_key(state: GameState) -> Any:
+    """Returns a key that tells the positions of a game apart: the binary
+    encoding of state if it has one, and otherwise its representation.
+    >>> from subtract_square_state import SubtractSquareState
+    >>> position_key(SubtractSquareState(True, 3))
+    b'S\\x01\\x03\\x00\\x00\\x00\\x00\\x00\\x00\\x00'"""
+    try:
+        return encode_state(state)
+    except (TypeError, struct.error):
+        return repr(state)
+
+
+class _Frame:
+    """One level of the explicit stack of MinimaxStrategy.
+
+    state - the state being searched at this level
+    moves - the moves from state that are not tried yet
+    best_score - the best score found so far for the player to move
+    best_move - the move leading to best_score
+    move - the move whose subtree is being searched
+    exact - whether every score so far is exact, not an estimate
+    proved - whether best_score is an exact win
+    """
+    __slots__ = ('state', 'moves', 'best_score', 'best_move', 'move',
+                 'exact', 'proved')
+
+    def __init__(self, state: GameState, moves: List) -> None:
+        """Initializes a frame for state, about to try each of moves."""
+        self.state = state
+        self.moves: Iterator = iter(moves)
+        self.best_score = None
+        self.best_move = None
+        self.move = None
+        self.exact = True
+        self.proved = False
+
+
+class MinimaxStrategy(Strategy):
+    """Depth-first minimax on an explicit stack, like stack_minimax, within
+    a Budget. States beyond max_depth, and every state left once max_nodes
+    states are expanded or max_time is up, are scored by evaluate (by
+    rough_outcome if evaluate is None) instead of being searched. Exact
+    scores, of states searched to the end, are kept in a cache of
+    cache_size positions between moves. With several workers the moves from
+    the root are searched in that many processes, sharing the nodes and the
+    time equally. A state with no move left is lost for the player to move.
+
+    evaluate - scores the states that are not searched, or None
+    nodes_expanded - how many states the last search expanded in this
+                     process
+    """
+    evaluate: Optional[Callable[[GameState], float]]
+    nodes_expanded: int
+    _cache: OrderedDict
+    _executor: Optional['Executor']
+
+    def __init__(self, budget: Optional[Budget] = None,
+                 evaluate: Optional[Callable[[GameState], float]] = None,
+                 name: str = 'minimax') -> None:
+        """Initializes a minimax strategy with budget.
+        >>> from stonehenge_gamestate import StonehengeGamestate
+        >>> x1 = StonehengeGamestate(True, 2)
+        >>> x1 = x1.make_move('A').make_move('F').make_move('D')
+        >>> MinimaxStrategy().choose_move(x1)
+        'E'
+        >>> strategy = MinimaxStrategy(Budget(max_depth=1))
+        >>> strategy.choose_move(x1), strategy.nodes_expanded
+        ('E', 1)
+        >>> strategy = MinimaxStrategy()
+        >>> strategy.stop = threading.Event()
+        >>> strategy.stop.set()
+        >>> strategy.choose_move(x1), strategy.nodes_expanded
+        ('E', 1)"""
+        super().__init__(name, budget)
+        self.evaluate = evaluate
+        self.nodes_expanded = 0
+        self._cache = OrderedDict()
+        self._executor = None
+
+    def __getstate__(self) -> dict:
+        """Returns the attributes to pickle, leaving out the cache, the
+        worker processes and the stop event."""
+        attributes = self.__dict__.copy()
+        attributes['_cache'] = OrderedDict()
+        attributes['_executor'] = None
+        attributes['stop'] = None
+        return attributes
+
+    def with_budget(self, budget: Budget) -> 'MinimaxStrategy':
+        """Returns a copy of this strategy that uses budget, with its own
+        cache, workers and no stop event."""
+        strategy = super().with_budget(budget)
+        strategy.__dict__.update(self.__getstate__())
+        strategy.budget = budget
+        return strategy
+
+    def choose_move(self, state: GameState,
+                    budget: Optional[Budget] = None) -> Any:
+        """Returns the best move for the player to move at state found
+        within budget."""
+        return self.search(state, budget)[1]
+
+    def search(self, state: GameState,
+               budget: Optional[Budget] = None) -> Tuple[float, Any]:
+        """Returns the score of state for the player to move there and the
+        first move that achieves it (None if there is no move), searching
+        within budget.
+        >>> from subtract_square_state import SubtractSquareState
+        >>> MinimaxStrategy().search(SubtractSquareState(True, 5))
+        (-1, 1)
+        >>> strategy = MinimaxStrategy(Budget(workers=2))
+        >>> strategy.search(SubtractSquareState(True, 30))
+        (1, 25)
+        >>> strategy.nodes_expanded > 1
+        True"""
+        budget = budget if budget is not None else self.budget
+        deadline = None if budget.max_time is None else \
+            time.perf_counter() + budget.max_time
+        moves = state.get_possible_moves()
+        if budget.workers > 1 and len(moves) > 1:
+            return self._search_in_workers(state, moves, budget)
+        return self._search(state, moves, budget, deadline)
+
+    def _search(self, state: GameState, moves: List, budget: Budget,
+                deadline: Optional[float]) -> Tuple[float, Any]:
+        """Returns the score and best move of state, whose moves are moves,
+        searching within budget until deadline."""
+        self.nodes_expanded = 0
+        if moves == []:
+            return GameState.LOSE, None
+        use_cache = budget.cache_size > 0
+        frames = [_Frame(state, moves)]
+        self.nodes_expanded = 1
+        child_score, child_exact = None, True
+
+        while True:
+            frame = frames[-1]
+            if child_score is not None:  # The subtree of frame.move is done.
+                if frame.best_score is None or -child_score > frame.best_score:
+                    frame.best_score, frame.best_move = -child_score, \
+                        frame.move
+                    frame.proved = child_exact and \
+                        frame.best_score == GameState.WIN
+                frame.exact = frame.exact and child_exact
+                child_score = None
+            frame.move = next(frame.moves, None)
+            if frame.move is None or frame.best_score == GameState.WIN:
+                frames.pop()
+                child_score = frame.best_score
+                child_exact = frame.proved or (frame.exact and
+                                               frame.move is None)
+                if child_exact and use_cache:
+                    self._store(position_key(frame.state), child_score,
+                                budget.cache_size)
+                if frames == []:
+                    mark_phase('searched')
+                    return child_score, frame.best_move
+                continue
+
+            child = frame.state.make_move(frame.move)
+            if use_cache:
+                child_score = self._lookup(child)
+                if child_score is not None:
+                    child_exact = True
+                    continue
+            child_moves = child.get_possible_moves()
+            if child_moves == []:
+                child_score, child_exact = GameState.LOSE, True
+            elif (budget.max_depth is not None and
+                  len(frames) >= budget.max_depth) or \
+                    (budget.max_nodes is not None and
+                     self.nodes_expanded >= budget.max_nodes) or \
+                    (deadline is not None and
+                     time.perf_counter() >= deadline) or \
+                    (self.stop is not None and self.stop.is_set()):
+                child_score = self.evaluate(child) if self.evaluate \
+                    is not None else child.rough_outcome()
+                child_exact = False
+            else:
+                frames.append(_Frame(child, child_moves))
+                self.nodes_expanded += 1
+
+    def _lookup(self, state: GameState) -> Optional[float]:
+        """Returns the exact score of state from the cache, or None if it is
+        not there."""
+        return self._cache.get(position_key(state))
+
+    def _store(self, key: Any, score: float, cache_size: int) -> None:
+        """Stores the exact score of the position with key, forgetting the
+        oldest position once the cache holds cache_size."""
+        self._cache[key] = score
+        if len(self._cache) > cache_size:
+            self._cache.popitem(last=False)
+
+    def _search_in_workers(self, state: GameState, moves: List,
+                           budget: Budget) -> Tuple[float, Any]:
+        """Returns the score and best move of state, searching the state
+        after each of moves in budget.workers processes. nodes_expanded
+        counts state and the states expanded by every worker."""
+        if self._executor is None:
+            # Imported here: multiprocessing is slow to import and only
+            # searches with workers need it.
+            from concurrent.futures import ProcessPoolExecutor
+            self._executor = ProcessPoolExecutor(max_workers=budget.workers)
+        child_budget = copy.copy(budget)
+        child_budget.workers = 1
+        if budget.max_depth is not None:
+            child_budget.max_depth = max(budget.max_depth - 1, 0)
+        if budget.max_nodes is not None:
+            child_budget.max_nodes = max(budget.max_nodes // len(moves), 1)
+        if budget.max_time is not None:
+            child_budget.max_time = budget.max_time * budget.workers / \
+                len(moves)
+        serial = copy.copy(self)
+        serial.__dict__.update(self.__getstate__())
+        children = [state.make_move(move) for move in moves]
+        results = list(self._executor.map(
+            _child_score, [serial] * len(moves), children,
+            [child_budget] * len(moves)))
+        scores = [score for score, _ in results]
+        self.nodes_expanded = 1 + sum(nodes for _, nodes in results)
+        best = max(range(len(moves)), key=lambda i: -scores[i])
+        return -scores[best], moves[best]
+
+
+def _child_score(strategy: MinimaxStrategy, state: GameState,
+                 budget: Budget) -> Tuple[float, int]:
+    """Returns the score of state found by strategy within budget, and the
+    number of states expanded to find it. Run in a worker process."""
+    if budget.max_depth == 0 and state.get_possible_moves() != []:
+        return (state.rough_outcome() if strategy.evaluate is None
+                else strategy.evaluate(state)), 0
+    return strategy.search(state, budget)[0], strategy.nodes_expanded
+
+
+# The strategy functions of strategy_try as Strategy objects.
+recursive_minimax_strategy = FunctionStrategy(recursive_minimax)
+iterative_minimax_strategy = FunctionStrategy(iterative_minimax)
+interactive_player = FunctionStrategy(interactive_strategy)
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
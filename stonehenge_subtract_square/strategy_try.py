@@ -5,15 +5,12 @@ NOTE: Make sure this file adheres to python-ta.
 Adjust the type annotations as needed, and implement both a recursive
 and an iterative version of minimax.
 """
+import random
 from typing import Any, Union, List
 from game import Game
 from game_state import GameState
-from tree import Tree
-from stacks_and_sacks import Stack
-
-
-ALPHABET = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M',
-            'N', 'O', 'P', 'Q', 'R', 'S', 'T', 'U', 'V', 'W', 'X', 'Y', 'Z']
+from tree import SearchTree
+from memory_profile import mark_phase
 
 
 def recursive_minimax(game: Game) -> Union[List, int]:
@@ -103,97 +100,208 @@ def recursive_minimax_helper(state: GameState, original_player: str)\
 def iterative_minimax(game: Any) -> Any:
     """ Finds the best possible moves without using recursion, instead using
     loops, tree structures, and stacks to determine the best possible moves
-    from all of the possible moves to be made.
+    from all of the possible moves to be made. The game tree is kept in a
+    SearchTree, which stores each node in a few array slots.
     >>> from stonehenge_game import StonehengeGame
     >>> from stonehenge_gamestate import StonehengeGamestate
     >>> x1 = StonehengeGamestate(True, 2)
     >>> g1 = StonehengeGame(True, x1)
     >>> iterative_minimax(g1)
-    'A'"""
-    shadow_game = game
-    original_moves = game.current_state.get_possible_moves()
-    current_state = game.current_state
-    stored_states = []
+    'A'
+    >>> g1.current_state is x1
+    True"""
+    search_tree = SearchTree(game.current_state)
+    score_tree(game, search_tree)
+    mark_phase('tree scored')
+    return best_move(search_tree, 0)
+
+
+def score_tree(game: Any, search_tree: SearchTree) -> None:
+    """Scores every node of search_tree by minimax, expanding the nodes
+    that are not expanded yet. Nodes that are already scored, with their
+    subtrees, are left as they are.
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from subtract_square_state import SubtractSquareState
+    >>> t = SearchTree(SubtractSquareState(True, 5))
+    >>> score_tree(SubtractSquareGame(True, t.states[0]), t)
+    >>> t.score[0], len(t)
+    (-1, 9)"""
+    from stacks_and_sacks import Stack
     stack1 = Stack()
-    stack1.add(Tree(current_state))
-    i = 0
+    stack1.add(0)
 
     while not stack1.is_empty():
-        temp_tree = stack1.remove()
-        if temp_tree.children == []:  # If no children currently
-            for move in temp_tree.value.get_possible_moves():
-                new_state = temp_tree.value.make_move(move)
-                temp_tree.children.append(Tree(new_state))  # Type of children
-                # is a tree, so it has a score also
-
-        else:  # If there are children, get the max of their scores * - 1.
-            to_max = []
-            for subtree in temp_tree.children:
-                to_max.append(subtree.score * -1)
-            temp_tree.score = max(to_max)
-            stored_states.append([temp_tree.value, temp_tree.score,
-                                  temp_tree.part_of])
-
-        if temp_tree.children == []:  # If still no children, i.e. no moves
-            # to make...
-            shadow_game.current_state = temp_tree.value
-            if shadow_game.is_winner(temp_tree.value.get_current_player_name()):
-                temp_tree.score = 1
-            elif shadow_game.is_winner('p1'):
-                temp_tree.score = -1
-            elif shadow_game.is_winner('p2'):
-                temp_tree.score = -1
-            else:
-                temp_tree.score = 0
-            stored_states.append([temp_tree.value,
-                                  temp_tree.score, temp_tree.part_of])
-        elif temp_tree.score == 5:  # IF temp tree has children (so the state is
-            # not at its end, and also the score has yet to be determined.
-            stack1.add(temp_tree)
-            for child in temp_tree.children:
-                # print("child:")
-                # print(child)
-                child.part_of = True if i == 0 else False
+        node = stack1.remove()
+        if search_tree.score[node] != SearchTree.UNSCORED:
+            continue
+        if not search_tree.is_expanded(node):
+            state = search_tree.states[node]
+            moves = state.get_possible_moves()
+            if moves == []:  # No moves to make, so the game is over here.
+                search_tree.score[node] = terminal_score(game, state)
+            else:  # Score this node again once its children are scored.
+                stack1.add(node)
+            children = search_tree.expand(
+                node, moves, [state.make_move(move) for move in moves])
+            for child in children:
                 stack1.add(child)
+        else:  # The children are scored: take the max of their scores * -1.
+            search_tree.score[node] = max(
+                -search_tree.score[child]
+                for child in search_tree.children(node))
 
-        i += 1
 
-    desired_state = find_desired_state(stored_states)
-    move = find_which_move(original_moves, current_state, desired_state)
-    return move
+class TreeReuseMinimax:
+    """A stateful iterative_minimax that keeps its SearchTree between the
+    moves of a game. When it is asked for a move it walks down its tree by
+    the move it chose last and then by the reply that leads to the current
+    state, and if found makes that node the root, dropping the other
+    branches, so the moves of the rest of the game are already scored.
+    Otherwise (a new game) it starts a new tree.
+
+    tree - the search tree of the last position searched, or None
+    root_state - the state at the root of tree
+    last_move - the move chosen at the root of tree, or None
+    reused - how many moves were found in the kept tree
+    """
+    tree: Union[SearchTree, None]
+    root_state: Union[GameState, None]
+    last_move: Any
+    reused: int
+
+    def __init__(self) -> None:
+        """Initializes a strategy with no tree yet."""
+        self.tree = None
+        self.root_state = None
+        self.last_move = None
+        self.reused = 0
 
+    def __call__(self, game: Any) -> Any:
+        """Returns the best move for the current player of game.
+        >>> from stonehenge_game import StonehengeGame
+        >>> from stonehenge_gamestate import StonehengeGamestate
+        >>> strategy = TreeReuseMinimax()
+        >>> g1 = StonehengeGame(True, StonehengeGamestate(True, 2))
+        >>> strategy(g1)
+        'A'
+        >>> nodes = len(strategy.tree)
+        >>> g1.current_state = g1.current_state.make_move('A').make_move('F')
+        >>> strategy(g1), strategy.reused, len(strategy.tree) < nodes
+        ('B', 1, True)"""
+        state = game.current_state
+        node = self.find(state)
+        if node is None:
+            self.tree = SearchTree(state)
+        else:
+            self.tree = self.tree.subtree(node)
+            self.reused += 1
+            mark_phase('tree re-rooted')
+        self.root_state = state
+        score_tree(game, self.tree)
+        mark_phase('tree scored')
+        self.last_move = best_move(self.tree, 0)
+        return self.last_move
 
-def find_which_move(original_moves: List, current_state: GameState,
-                    desired_state: GameState) -> object:
-    """Finds the move that outputs the desired game state.
+    def find(self, state: GameState) -> Union[int, None]:
+        """Returns the node of tree whose state is state, looking at the
+        root, the node of last_move and that node's children, or None if
+        it is none of them. Only the states along that path are made.
+        >>> from subtract_square_game import SubtractSquareGame
+        >>> from subtract_square_state import SubtractSquareState
+        >>> strategy = TreeReuseMinimax()
+        >>> strategy(SubtractSquareGame(True, SubtractSquareState(True, 10)))
+        1
+        >>> t = strategy.tree
+        >>> node = strategy.find(SubtractSquareState(True, 5))
+        >>> t.moves[t.parent[node]], t.moves[node]
+        (1, 4)
+        >>> strategy.find(SubtractSquareState(True, 6)) is None
+        True"""
+        if self.tree is None:
+            return None
+        key = repr(state)
+        if repr(self.root_state) == key:
+            return 0
+        played = [child for child in self.tree.children(0)
+                  if self.tree.moves[child] == self.last_move]
+        if played == []:
+            return None
+        node, node_state = played[0], self.root_state.make_move(
+            self.last_move)
+        if repr(node_state) == key:
+            return node
+        for child in self.tree.children(node):
+            if repr(node_state.make_move(self.tree.moves[child])) == key:
+                return child
+        return None
+
+
+def stack_minimax(game: Any) -> Any:
+    """Returns the best move for the current player, found by a
+    MinimaxStrategy with no limits and no cache: a depth-first minimax that
+    keeps only one frame per level of the game on an explicit stack, so
+    memory grows with the depth of the game rather than the number of states
+    visited, and the depth is not bounded by Python's recursion limit.
+    >>> from stonehenge_game import StonehengeGame
     >>> from stonehenge_gamestate import StonehengeGamestate
     >>> x1 = StonehengeGamestate(True, 2)
-    >>> x2 = x1.make_move('A')
-    >>> find_which_move(x1.get_possible_moves(), x1, x2)
-    'A'"""
-    move = None
-    for move in original_moves:  # for move in original_moves
-        if str(current_state.make_move(move)) == str(desired_state):
-            return move
-    return move
-
-
-def find_desired_state(stored_states: List) -> GameState:
-    """Finds the desired state from all of the intermediate states of the game,
-    which are stored in the list parameter. No doctest given since this relies
-    on other methods."""
-    current_state_children = []
-    desired_state: GameState
-    for item in stored_states:
-        if len(item) == 3 and item[2]:
-            current_state_children.append(item)
-    first_state = stored_states[-1]
-    for item in current_state_children:  # looks for the state that we want
-        # to achieve.
-
-        if item[1] == -1 * first_state[1]:
-            desired_state = item[0]  # Desired state now has type gamestate
-    return desired_state
+    >>> stack_minimax(StonehengeGame(True, x1))
+    'A'
+    >>> x1 = x1.make_move('A').make_move('F').make_move('D')
+    >>> stack_minimax(StonehengeGame(True, x1))
+    'E'
+    >>> import inspect, sys
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from subtract_square_state import SubtractSquareState
+    >>> g1 = SubtractSquareGame(True, SubtractSquareState(True, 30))
+    >>> limit = sys.getrecursionlimit()
+    >>> sys.setrecursionlimit(len(inspect.stack()) + 20)
+    >>> move = stack_minimax(g1)
+    >>> sys.setrecursionlimit(limit)
+    >>> move
+    25
+    """
+    from strategies import Budget, MinimaxStrategy
+    return MinimaxStrategy(Budget(cache_size=0)).choose_move(
+        game.current_state)
+
+
+def best_move(search_tree: SearchTree, node: int) -> Any:
+    """Returns the move leading to the first child of node whose score gives
+    node its score.
+    >>> t = SearchTree('root')
+    >>> _ = t.expand(0, ['a', 'b', 'c'], ['A', 'B', 'C'])
+    >>> t.score[0], t.score[1], t.score[2], t.score[3] = 1, 1, -1, -1
+    >>> best_move(t, 0)
+    'b'"""
+    for child in search_tree.children(node):
+        if -search_tree.score[child] == search_tree.score[node]:
+            return search_tree.moves[child]
+    return None
+
+
+def terminal_score(game: Any, state: GameState) -> int:
+    """Returns the score of the finished state for the player whose turn it
+    is there, judged by the rules of game. game's current state is left as
+    it was.
+    >>> from stonehenge_game import StonehengeGame
+    >>> from stonehenge_gamestate import StonehengeGamestate
+    >>> x1 = StonehengeGamestate(True, 1)
+    >>> g1 = StonehengeGame(True, x1)
+    >>> terminal_score(g1, x1.make_move('A'))
+    -1
+    >>> g1.current_state is x1
+    True"""
+    original_state = game.current_state
+    game.current_state = state
+    if game.is_winner(state.get_current_player_name()):
+        score = 1
+    elif game.is_winner('p1') or game.is_winner('p2'):
+        score = -1
+    else:
+        score = 0
+    game.current_state = original_state
+    return score
 
 
 def interactive_strategy(game: Any) -> Any:
@@ -204,6 +312,30 @@ def interactive_strategy(game: Any) -> Any:
     return game.str_to_move(move)
 
 
+def is_interactive(strategy: Any) -> bool:
+    """Returns whether strategy asks a human for its moves: whether it is
+    interactive_strategy, or a Strategy adapting it.
+    >>> from strategies import FunctionStrategy
+    >>> is_interactive(FunctionStrategy(interactive_strategy))
+    True
+    >>> is_interactive(iterative_minimax)
+    False"""
+    return getattr(strategy, 'function', strategy) is interactive_strategy
+
+
+def random_strategy(game: Any, rng: Any = random) -> Any:
+    """Returns a random possible move for the current player of game, drawn
+    from rng: the random module, or a random.Random for repeatable games.
+    >>> from subtract_square_game import SubtractSquareGame
+    >>> from subtract_square_state import SubtractSquareState
+    >>> g1 = SubtractSquareGame(True, SubtractSquareState(True, 9))
+    >>> random_strategy(g1) in [1, 4, 9]
+    True
+    >>> [random_strategy(g1, random.Random(5)) for _ in range(2)]
+    [9, 9]"""
+    return rng.choice(game.current_state.get_possible_moves())
+
+
 def find_max_state(lst: Union[List, int]) -> int:
     """Finds max state
     >>> lst = [1, 2, [3, 4, [5, 6], 7], 8]
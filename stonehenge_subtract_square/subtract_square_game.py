@@ -12,16 +12,25 @@ class SubtractSquareGame(Game):
     Abstract class for a game to be played with two players.
     """
 
-    def __init__(self, p1_starts):
+    def __init__(self, p1_starts, current_state=None):
         """
         Initialize this Game, using p1_starts to find who the first player is.
+        If current_state is not given, ask for the number to subtract from.
 
         :param p1_starts: A boolean representing whether Player 1 is the first
                           to make a move.
         :type p1_starts: bool
+        :param current_state: The state to start the game from.
+        :type current_state: SubtractSquareState
+
+        >>> g1 = SubtractSquareGame(True, SubtractSquareState(True, 7))
+        >>> g1.current_state.current_total
+        7
         """
-        count = int(input("Enter the number to subtract from: "))
-        self.current_state = SubtractSquareState(p1_starts, count)
+        if current_state is None:
+            count = int(input("Enter the number to subtract from: "))
+            current_state = SubtractSquareState(p1_starts, count)
+        self.current_state = current_state
 
     def get_instructions(self):
         """
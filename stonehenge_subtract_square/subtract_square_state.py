@@ -3,9 +3,15 @@ An implementation of a state for SubtractSquare.
 
 NOTE: You do not have to run python-ta on this file.
 """
-from typing import Any
+from functools import lru_cache
+from math import isqrt
+from typing import Any, List, Tuple
 from game_state import GameState
 
+# The squares 1, 4, 9, ..., shared by every state and extended as larger
+# totals are seen.
+_SQUARES: List[int] = [1]
+
 
 class SubtractSquareState(GameState):
     """
@@ -30,12 +36,19 @@ class SubtractSquareState(GameState):
         """
         Return all possible moves that can be applied to this state.
         """
-        moves = []
-        for i in range(1, self.current_total + 1):
-            if i ** 2 <= self.current_total:
-                moves.append(i ** 2)
+        return list(square_moves(self.current_total))
+
+    def is_valid_move(self, move: Any) -> bool:
+        """
+        Return whether move is a valid move for this GameState.
 
-        return moves
+        >>> SubtractSquareState(True, 10).is_valid_move(9)
+        True
+        >>> SubtractSquareState(True, 10).is_valid_move(16)
+        False
+        """
+        return (isinstance(move, int) and move <= self.current_total and
+                is_pos_square(move))
 
     def make_move(self, move: Any) -> "SubtractSquareState":
         """
@@ -63,9 +76,8 @@ class SubtractSquareState(GameState):
         """
         if is_pos_square(self.current_total):
             return self.WIN
-        elif all([is_pos_square(self.current_total - n ** 2)
-                  for n in range(1, self.current_total + 1)
-                  if n ** 2 < self.current_total]):
+        elif all(is_pos_square(self.current_total - square)
+                 for square in square_moves(self.current_total)):
             return self.LOSE
 
         return self.DRAW
@@ -79,8 +91,38 @@ def is_pos_square(n: int) -> bool:
     False
     >>> is_pos_square(9)
     True
+    >>> is_pos_square((10 ** 20 + 1) ** 2)
+    True
+    """
+    return 0 < n and isqrt(n) ** 2 == n
+
+
+def squares_up_to(n: int) -> List[int]:
+    """
+    Return the positive squares no greater than n, in increasing order,
+    extending the shared table of squares if needed.
+
+    >>> squares_up_to(20)
+    [1, 4, 9, 16]
+    >>> squares_up_to(0)
+    []
+    """
+    root = isqrt(n) if n > 0 else 0
+    while len(_SQUARES) < root:
+        _SQUARES.append((len(_SQUARES) + 1) ** 2)
+    return _SQUARES[:root]
+
+
+@lru_cache(maxsize=4096)
+def square_moves(total: int) -> Tuple[int, ...]:
+    """
+    Return the moves possible from a state with the given total: the
+    positive squares no greater than total.
+
+    >>> square_moves(10)
+    (1, 4, 9)
     """
-    return 0 < n and (round(n ** 0.5) ** 2 == n)
+    return tuple(squares_up_to(total))
 
 
 if __name__ == "__main__":
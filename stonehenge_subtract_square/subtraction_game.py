@@ -0,0 +1,345 @@
+"""Subtraction games: SubtractSquare with any set of allowed subtractions.
+
+A move subtracts one of the numbers of a MoveSet (squares, cubes, primes,
+Fibonacci numbers or any given collection) from the current total, and the
+player left without a move loses. Positions are solved with Sprague-Grundy
+values, computed bottom-up into a table that is shared by every state of the
+same move set. The Grundy values of a finite move set are eventually
+periodic, and once the period is found the value of any total, however
+large, is read from it.
+"""
+
+from bisect import bisect_right
+from itertools import count
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from game_state import GameState
+from subtract_square_game import SubtractSquareGame
+from subtract_square_state import SubtractSquareState
+
+_GRUNDY_TABLES: Dict['MoveSet', 'GrundyTable'] = {}
+
+
+class MoveSet:
+    """The numbers that may be subtracted in a subtraction game, produced in
+    increasing order by a generator and remembered as they are needed.
+
+    name - a short description of the numbers, e.g. 'squares'
+    max_move - the largest number in the set, or None if there is none
+    """
+    name: str
+    max_move: Optional[int]
+    _values: List[int]
+    _source: Iterator[int]
+
+    def __init__(self, name: str, values: Iterable[int],
+                 max_move: Optional[int] = None) -> None:
+        """Initializes a move set with the increasing positive integers
+        values, which may be an endless generator. max_move must be the last
+        of values when there are finitely many.
+        >>> MoveSet('odd', count(1, 2)).moves_up_to(8)
+        (1, 3, 5, 7)"""
+        self.name = name
+        self.max_move = max_move
+        self._values = []
+        self._source = iter(values)
+
+    def __repr__(self) -> str:
+        """Returns a representation of this move set.
+        >>> CUBES
+        MoveSet('cubes')"""
+        return "MoveSet({!r})".format(self.name)
+
+    def moves_up_to(self, total: int) -> Tuple[int, ...]:
+        """Returns the numbers of this set no greater than total, in
+        increasing order.
+        >>> PRIMES.moves_up_to(12)
+        (2, 3, 5, 7, 11)
+        >>> FIBONACCI.moves_up_to(12)
+        (1, 2, 3, 5, 8)"""
+        while self._values == [] or self._values[-1] < total:
+            value = next(self._source, None)
+            if value is None:
+                break
+            self._values.append(value)
+        return tuple(self._values[:bisect_right(self._values, total)])
+
+    def __contains__(self, move: Any) -> bool:
+        """Returns whether move is one of the numbers of this set.
+        >>> 27 in CUBES, 26 in CUBES
+        (True, False)"""
+        return (isinstance(move, int) and move > 0 and
+                move in self.moves_up_to(move)[-1:])
+
+
+def finite_moves(values: Iterable[int]) -> MoveSet:
+    """Returns the move set of the given positive integers.
+    >>> finite_moves([4, 1, 3, 1])
+    MoveSet('{1, 3, 4}')"""
+    values = sorted(set(values))
+    if values == [] or values[0] <= 0:
+        raise ValueError("A move set needs positive numbers to subtract")
+    return MoveSet("{" + ", ".join(str(x) for x in values) + "}", values,
+                   values[-1])
+
+
+def _powers(exponent: int) -> Iterator[int]:
+    """Yields 1, 2 ** exponent, 3 ** exponent, ..."""
+    for n in count(1):
+        yield n ** exponent
+
+
+def _primes() -> Iterator[int]:
+    """Yields the prime numbers in increasing order."""
+    primes: List[int] = []
+    for n in count(2):
+        if all(n % p != 0 for p in primes if p * p <= n):
+            primes.append(n)
+            yield n
+
+
+def _fibonacci() -> Iterator[int]:
+    """Yields the distinct Fibonacci numbers 1, 2, 3, 5, 8, ..."""
+    a, b = 1, 2
+    while True:
+        yield a
+        a, b = b, a + b
+
+
+SQUARES = MoveSet('squares', _powers(2))
+CUBES = MoveSet('cubes', _powers(3))
+PRIMES = MoveSet('primes', _primes())
+FIBONACCI = MoveSet('Fibonacci numbers', _fibonacci())
+
+# The endless move sets, by name. A finite move set is known by its numbers.
+NAMED_MOVE_SETS = {move_set.name: move_set
+                   for move_set in (SQUARES, CUBES, PRIMES, FIBONACCI)}
+_FINITE_MOVE_SETS: Dict[str, MoveSet] = {}
+
+
+def move_set_named(name: str) -> MoveSet:
+    """Returns the move set of NAMED_MOVE_SETS called name, or the finite
+    move set whose name, as given by finite_moves, is name.
+    >>> move_set_named('cubes') is CUBES
+    True
+    >>> move_set_named('{1, 3, 4}') is move_set_named('{1, 3, 4}')
+    True
+    >>> move_set_named('odd')
+    Traceback (most recent call last):
+    ...
+    ValueError: Unknown move set: odd"""
+    if name in NAMED_MOVE_SETS:
+        return NAMED_MOVE_SETS[name]
+    if name not in _FINITE_MOVE_SETS:
+        if not (name.startswith('{') and name.endswith('}')):
+            raise ValueError("Unknown move set: {}".format(name))
+        _FINITE_MOVE_SETS[name] = finite_moves(
+            int(value) for value in name[1:-1].split(','))
+    return _FINITE_MOVE_SETS[name]
+
+
+class GrundyTable:
+    """The Sprague-Grundy values of the totals of a subtraction game, filled
+    in bottom-up as larger totals are asked for.
+
+    move_set - the numbers that may be subtracted
+    values - the Grundy value of each total computed so far
+    period - once found, (start, length) such that the value of every
+             total n >= start equals the value of n - length
+    """
+    move_set: MoveSet
+    values: List[int]
+    period: Optional[Tuple[int, int]]
+    _windows: Dict[Tuple[int, ...], int]
+
+    def __init__(self, move_set: MoveSet) -> None:
+        """Initializes the table of move_set with the value of total 0.
+        >>> GrundyTable(SQUARES).values
+        [0]"""
+        self.move_set = move_set
+        self.values = [0]
+        self.period = None
+        self._windows = {}
+
+    def grundy(self, total: int) -> int:
+        """Returns the Grundy value of total, which is 0 exactly when the
+        player to move there loses.
+        >>> table = GrundyTable(SQUARES)
+        >>> [n for n in range(21) if table.grundy(n) == 0]
+        [0, 2, 5, 7, 10, 12, 15, 17, 20]
+        >>> table = GrundyTable(finite_moves([1, 3, 4]))
+        >>> table.grundy(10 ** 30), table.period
+        (1, (0, 7))"""
+        if self.period is not None and total >= self.period[0]:
+            start, length = self.period
+            return self.values[start + (total - start) % length]
+        while len(self.values) <= total and self.period is None:
+            self._extend()
+        return self.grundy(total) if total >= len(self.values) \
+            else self.values[total]
+
+    def _extend(self) -> None:
+        """Computes the value of the next total, and looks for the period of
+        a finite move set."""
+        total = len(self.values)
+        reachable = {self.values[total - move]
+                     for move in self.move_set.moves_up_to(total)}
+        value = 0
+        while value in reachable:
+            value += 1
+        self.values.append(value)
+
+        # With the largest move m, each value depends only on the m values
+        # before it, so the values repeat once m of them in a row do.
+        width = self.move_set.max_move
+        if width is not None and total >= width - 1:
+            window = tuple(self.values[total - width + 1:])
+            if window in self._windows:
+                previous = self._windows[window]
+                self.period = (previous - width + 1, total - previous)
+            else:
+                self._windows[window] = total
+
+
+def grundy_table(move_set: MoveSet) -> GrundyTable:
+    """Returns the shared Grundy table of move_set, creating it on first use.
+    >>> grundy_table(CUBES) is grundy_table(CUBES)
+    True"""
+    if move_set not in _GRUNDY_TABLES:
+        _GRUNDY_TABLES[move_set] = GrundyTable(move_set)
+    return _GRUNDY_TABLES[move_set]
+
+
+class SubtractionState(GameState):
+    """A state of a subtraction game: the current total and the numbers that
+    may be subtracted from it. It is not a SubtractSquareState, even with
+    the squares as its move set, so that code written for SubtractSquare
+    does not apply the square rule to other move sets.
+
+    current_total - the number left to subtract from
+    move_set - the numbers that may be subtracted
+    """
+    current_total: int
+    move_set: MoveSet
+
+    def __init__(self, is_p1_turn: bool, current_total: int,
+                 move_set: MoveSet = SQUARES) -> None:
+        """Initializes the state with current_total to subtract from.
+        >>> SubtractionState(True, 9, CUBES).get_possible_moves()
+        [1, 8]
+        >>> isinstance(SubtractionState(True, 9), SubtractSquareState)
+        False"""
+        super().__init__(is_p1_turn)
+        self.current_total = current_total
+        self.move_set = move_set
+
+    def __str__(self) -> str:
+        """Returns the total left to subtract from.
+        >>> print(SubtractionState(True, 9, CUBES))
+        Current total: 9"""
+        return "Current total: {}".format(self.current_total)
+
+    def __repr__(self) -> str:
+        """Returns a representation of this state, which tells states apart.
+        >>> SubtractionState(False, 9, CUBES)
+        P1's Turn: False - Total: 9"""
+        return "P1's Turn: {} - Total: {}".format(self.p1_turn,
+                                                  self.current_total)
+
+    def get_possible_moves(self) -> list:
+        """Returns the numbers of the move set no greater than the total."""
+        return list(self.move_set.moves_up_to(self.current_total))
+
+    def is_valid_move(self, move: Any) -> bool:
+        """Returns whether move can be subtracted from the total.
+        >>> SubtractionState(True, 9, PRIMES).is_valid_move(7)
+        True
+        >>> SubtractionState(True, 9, PRIMES).is_valid_move(11)
+        False"""
+        return (isinstance(move, int) and move <= self.current_total and
+                move in self.move_set)
+
+    def make_move(self, move: Any) -> 'SubtractionState':
+        """Returns the state after subtracting move from the total.
+        >>> SubtractionState(True, 9, CUBES).make_move('8')
+        P1's Turn: False - Total: 1"""
+        return SubtractionState(not self.p1_turn,
+                                self.current_total - int(move),
+                                self.move_set)
+
+    def rough_outcome(self) -> float:
+        """Returns WIN if the total can be subtracted at once, LOSE if every
+        move leaves a total that can, and DRAW otherwise.
+        >>> SubtractionState(True, 4, PRIMES).rough_outcome()
+        0
+        >>> SubtractionState(True, 1, PRIMES).rough_outcome()
+        -1"""
+        moves = self.move_set.moves_up_to(self.current_total)
+        if self.current_total in moves:
+            return self.WIN
+        elif all(self.current_total - move in self.move_set
+                 for move in moves):
+            return self.LOSE
+        return self.DRAW
+
+    def grundy(self) -> int:
+        """Returns the Grundy value of this state.
+        >>> SubtractionState(True, 2).grundy()
+        0"""
+        return grundy_table(self.move_set).grundy(self.current_total)
+
+
+class SubtractionGame(SubtractSquareGame):
+    """A subtraction game, won by the player who makes the last move."""
+
+    def __init__(self, p1_starts: bool,
+                 current_state: Optional[SubtractionState] = None,
+                 move_set: MoveSet = SQUARES) -> None:
+        """Initializes the game at current_state, or asks for the number to
+        subtract from if it is not given.
+        >>> g1 = SubtractionGame(True, SubtractionState(True, 7, PRIMES))
+        >>> g1.current_state.move_set
+        MoveSet('primes')"""
+        if current_state is None:
+            count_from = int(input("Enter the number to subtract from: "))
+            current_state = SubtractionState(p1_starts, count_from, move_set)
+        super().__init__(p1_starts, current_state)
+
+    def get_instructions(self) -> str:
+        """Returns the instructions for this game."""
+        return ("Players take turns subtracting {} from the starting number. "
+                "The winner is the last player able to move."
+                .format(self.current_state.move_set.name))
+
+    def is_over(self, state: SubtractionState) -> bool:
+        """Returns whether the player to move at state has no move left.
+        >>> g1 = SubtractionGame(True, SubtractionState(True, 1, PRIMES))
+        >>> g1.is_over(g1.current_state)
+        True"""
+        return state.get_possible_moves() == []
+
+
+def grundy_move(state: SubtractionState) -> Any:
+    """Returns a move from state that leaves a total of Grundy value 0, or
+    the first possible move if there is none.
+    >>> grundy_move(SubtractionState(True, 10, finite_moves([1, 3, 4])))
+    1"""
+    moves = state.get_possible_moves()
+    table = grundy_table(state.move_set)
+    for move in moves:
+        if table.grundy(state.current_total - move) == 0:
+            return move
+    return moves[0] if moves != [] else None
+
+
+def grundy_strategy(game: Any) -> Any:
+    """Returns the Grundy-optimal move for the current player of game.
+    >>> grundy_strategy(SubtractionGame(True, SubtractionState(True, 30)))
+    25"""
+    return grundy_move(game.current_state)
+
+
+if __name__ == '__main__':
+    from doctest import testmod
+    testmod()
+    from python_ta import check_all
+    check_all(config="a2_pyta.txt")
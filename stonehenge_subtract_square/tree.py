@@ -1,7 +1,8 @@
 """ Tree class and functions.
 """
-from typing import Any, Callable, List
-from csc148_queue import Queue
+from array import array
+from itertools import chain
+from typing import Any, Callable, Iterator, List
 
 # NOTE: THIS FILE IS TAKEN FROM THE LAB HANDOUT, FROM CLASS. As was posted by
 # an instructor on Piazza, we are permitted to use these files when citing them.
@@ -11,6 +12,7 @@ class Tree:
     """
     A bare-bones Tree ADT that identifies the root with the entire tree.
     """
+    __slots__ = ('value', 'children', 'score', 'part_of')
 
     def __init__(self, value=None, children=None) -> None:
         """
@@ -84,6 +86,59 @@ class Tree:
                          [c.__str__(indent + 3) for c in self.children])
 
 
+def iter_nodes(t: Tree) -> Iterator[Tree]:
+    """
+    Yield every node of t in preorder, without recursion. Only one
+    iterator over a list of children is kept per level of t.
+
+    >>> t = descendants_from_list(Tree(0), [1, 2, 3, 4, 5], 2)
+    >>> [node.value for node in iter_nodes(t)]
+    [0, 1, 3, 4, 2, 5]
+    """
+    stack = [iter([t])]
+    while stack != []:
+        node = next(stack[-1], None)
+        if node is None:
+            stack.pop()
+        else:
+            yield node
+            if node.children != []:
+                stack.append(iter(node.children))
+
+
+def iter_internal(t: Tree) -> Iterator[Any]:
+    """
+    Yield the values in internal nodes of t, in preorder.
+
+    >>> t = descendants_from_list(Tree(0), [1, 2, 3, 4, 5], 2)
+    >>> list(iter_internal(t))
+    [0, 1, 2]
+    """
+    return (node.value for node in iter_nodes(t) if node.children != [])
+
+
+def iter_leaves(t: Tree) -> Iterator[Any]:
+    """
+    Yield the values in the leaves of t, in preorder.
+
+    >>> t = descendants_from_list(Tree(0), [1, 2, 3, 4, 5], 2)
+    >>> list(iter_leaves(t))
+    [3, 4, 5]
+    """
+    return (node.value for node in iter_nodes(t) if node.children == [])
+
+
+def iter_if(t: Tree, p: Callable[[Any], bool]) -> Iterator[Any]:
+    """
+    Yield the values in t that satisfy predicate p(value), in preorder.
+
+    >>> t = descendants_from_list(Tree(0), [1, 2, 3, 4, 5], 2)
+    >>> list(iter_if(t, lambda v: v % 2 == 1))
+    [1, 3, 5]
+    """
+    return (node.value for node in iter_nodes(t) if p(node.value))
+
+
 def list_internal(t: Tree) -> list:
     """
     Return list of values in internal nodes of t.
@@ -97,10 +152,7 @@ def list_internal(t: Tree) -> list:
     >>> L
     [0, 1, 2]
     """
-    if t.children == []:
-        return []
-
-    return [t.value] + sum([list_internal(x) for x in t.children], [])
+    return list(iter_internal(t))
 
 
 def count_internal(t: Tree) -> int:
@@ -114,9 +166,7 @@ def count_internal(t: Tree) -> int:
     >>> count_internal(t)
     3
     """
-    if t.children == []:
-        return 0
-    return 1 + sum([count_internal(c) for c in t.children], 0)
+    return sum(1 for _ in iter_internal(t))
 
 
 def count_leaves(t: Tree) -> int:
@@ -130,9 +180,7 @@ def count_leaves(t: Tree) -> int:
     >>> count_leaves(t)
     6
     """
-    if t.children == []:
-        return 1
-    return sum([count_leaves(c) for c in t.children], 0)
+    return sum(1 for _ in iter_leaves(t))
 
 
 def sum_internal(t: Tree) -> int:
@@ -148,9 +196,7 @@ def sum_internal(t: Tree) -> int:
     >>> sum_internal(t)
     6
     """
-    if t.children == []:
-        return 0
-    return t.value + sum([sum_internal(c) for c in t.children], 0)
+    return sum(iter_internal(t))
 
 
 def sum_leaves(t: Tree) -> int:
@@ -163,9 +209,7 @@ def sum_leaves(t: Tree) -> int:
     >>> sum_leaves(t)
     39
     """
-    if t.children == []:
-        return t.value
-    return sum([sum_leaves(c) for c in t.children], 0)
+    return sum(iter_leaves(t))
 
 
 def arity(t: Tree) -> int:
@@ -181,14 +225,13 @@ def arity(t: Tree) -> int:
     >>> arity(tn1)
     4
     """
-    if t.children == []:
-        return 0
-    return max([arity(c) for c in t.children] + [len(t.children)])
+    return max(len(node.children) for node in iter_nodes(t))
 
 
 def contains_test_passer(t: Tree, test: Callable[[Any], bool]) -> bool:
     """
     Return whether t contains a value that test(value) returns True for.
+    Stop looking at the first such value.
 
     >>> t = descendants_from_list(Tree(0), [1, 2, 3, 4.5, 5, 6, 7.5, 8.5], 4)
     >>> def greater_than_nine(n): return n > 9
@@ -198,11 +241,7 @@ def contains_test_passer(t: Tree, test: Callable[[Any], bool]) -> bool:
     >>> contains_test_passer(t, even)
     True
     """
-    if t.children == []:
-        return test(t.value)
-        # print(([contains_test_passer(c, test) for c in t.children]))
-    return any([test(t.value)] +
-               [contains_test_passer(c, test) for c in t.children])
+    return next(iter_if(t, test), _NO_VALUE) is not _NO_VALUE
 
 
 def list_if(t: Tree, p: Callable[[Any], bool]) -> list:
@@ -221,10 +260,128 @@ def list_if(t: Tree, p: Callable[[Any], bool]) -> list:
     >>> set(list_) == {0, 2, 4, 6, 8}
     True
     """
-    if t.children == []:
-        return [t.value] if p(t.value) else []
-    return ([t.value] if p(t.value) else [])\
-        + sum([list_if(c, p) for c in t.children], [])
+    return list(iter_if(t, p))
+
+
+class SearchTree:
+    """
+    A game tree for search, stored as parallel arrays with one entry per
+    node instead of one object per node. Node 0 is the root, and the
+    children of a node are always stored next to each other.
+
+    UNSCORED - the score of a node that has not been scored yet
+    states - the state at each node, or None once the node is expanded
+    moves - the move that leads to each node from its parent
+    parent - the index of each node's parent (-1 for the root)
+    first_child - the index of each node's first child (-1 if unexpanded)
+    child_count - the number of children of each node
+    score - the score of each node for the player to move there
+    """
+    UNSCORED: int = -128
+    __slots__ = ('states', 'moves', 'parent', 'first_child', 'child_count',
+                 'score')
+
+    def __init__(self, root_state: Any) -> None:
+        """
+        Create a SearchTree holding only a root with state root_state.
+
+        >>> t = SearchTree('root')
+        >>> len(t)
+        1
+        >>> t.score[0] == SearchTree.UNSCORED
+        True
+        """
+        self.states = [root_state]
+        self.moves = [None]
+        self.parent = array('i', [-1])
+        self.first_child = array('i', [-1])
+        self.child_count = array('i', [0])
+        self.score = array('b', [self.UNSCORED])
+
+    def __len__(self) -> int:
+        """
+        Return the number of nodes in this SearchTree.
+        """
+        return len(self.states)
+
+    def expand(self, node: int, moves: list, states: list) -> range:
+        """
+        Add one child to node for each move in moves, with the matching
+        state from states, release node's own state and return the indices
+        of the new children.
+
+        >>> t = SearchTree('root')
+        >>> t.expand(0, ['a', 'b'], ['A', 'B'])
+        range(1, 3)
+        >>> t.states
+        [None, 'A', 'B']
+        >>> list(t.parent)
+        [-1, 0, 0]
+        """
+        first = len(self.states)
+        self.states.extend(states)
+        self.moves.extend(moves)
+        self.parent.extend([node] * len(moves))
+        self.first_child.extend([-1] * len(moves))
+        self.child_count.extend([0] * len(moves))
+        self.score.extend([self.UNSCORED] * len(moves))
+        self.first_child[node] = first
+        self.child_count[node] = len(moves)
+        self.states[node] = None
+        return range(first, first + len(moves))
+
+    def children(self, node: int) -> range:
+        """
+        Return the indices of the children of node.
+
+        >>> t = SearchTree('root')
+        >>> t.children(0)
+        range(0, 0)
+        >>> _ = t.expand(0, ['a'], ['A'])
+        >>> t.children(0)
+        range(1, 2)
+        """
+        first = max(self.first_child[node], 0)
+        return range(first, first + self.child_count[node])
+
+    def is_expanded(self, node: int) -> bool:
+        """
+        Return whether children have been added to node.
+        """
+        return self.first_child[node] >= 0
+
+    def subtree(self, node: int) -> 'SearchTree':
+        """
+        Return a new SearchTree holding node and its descendants, with their
+        moves, states and scores, where node becomes the root. The rest of
+        this tree is not copied, so it can be freed.
+
+        >>> t = SearchTree('root')
+        >>> _ = t.expand(0, ['a', 'b'], ['A', 'B'])
+        >>> _ = t.expand(2, ['c', 'd'], ['C', 'D'])
+        >>> t.score[4] = 1
+        >>> s = t.subtree(2)
+        >>> s.moves, s.states, list(s.parent), list(s.score)
+        ([None, 'c', 'd'], [None, 'C', 'D'], [-1, 0, 0], [-128, -128, 1])
+        """
+        tree = SearchTree(self.states[node])
+        tree.score[0] = self.score[node]
+        originals = [node]  # The node of this tree copied to each new node.
+        for new_node, original in enumerate(originals):  # Level order.
+            first, count = self.first_child[original], \
+                self.child_count[original]
+            if first >= 0:  # Copy the children, which are side by side.
+                end = first + count
+                tree.first_child[new_node] = len(tree.states)
+                tree.child_count[new_node] = count
+                tree.states.extend(self.states[first:end])
+                tree.moves.extend(self.moves[first:end])
+                tree.score.extend(self.score[first:end])
+                tree.parent.extend(array('i', [new_node]) * count)
+                tree.first_child.extend(array('i', [-1]) * count)
+                tree.child_count.extend(array('i', [0]) * count)
+                originals.extend(range(first, end))
+        return tree
 
 
 # helper function that may be useful in the functions
@@ -238,12 +395,12 @@ def gather_lists(list_: List[list]) -> list:
     >>> gather_lists([[6, 7], [8], [9, 10, 11]])
     [6, 7, 8, 9, 10, 11]
     """
-    new_list = []
-    for l in list_:
-        new_list += l
-    return new_list
-    # equivalent to...
-    # return sum([list_ for list_ in list_], [])
+    return list(chain.from_iterable(list_))
+
+
+# marks the end of an iterator of tree values, where None may be a legitimate
+# value
+_NO_VALUE = object()
 
 
 # helpful helper function
@@ -256,22 +413,82 @@ def descendants_from_list(t: Tree, list_: list, branching: int) -> Tree:
     >>> descendants_from_list(Tree(0), [1, 2, 3, 4], 2)
     Tree(0, [Tree(1, [Tree(3), Tree(4)]), Tree(2)])
     """
+    values = iter(list_)
+    from csc148_queue import Queue
     q = Queue()
     q.add(t)
-    list_ = list_.copy()
-    while not q.is_empty():  # unlikely to happen
-        new_t = q.remove()
+    for new_t in q.drain():
         new_t: Tree
         for _ in range(0, branching):
-            if list_ == []:
+            value = next(values, _NO_VALUE)
+            if value is _NO_VALUE:
                 return t  # our work here is done
-            else:
-                new_t_child = Tree(list_.pop(0))
-                new_t.children.append(new_t_child)
-                q.add(new_t_child)
+            new_t_child = Tree(value)
+            new_t.children.append(new_t_child)
+            q.add(new_t_child)
+    return t
+
+
+def build_breadth_first(value: Any, expand: Callable[[Any], list],
+                        max_nodes: int = None) -> Tree:
+    """
+    Return a Tree rooted at value, where the children of each node hold
+    expand(node value), built in level order. Stop adding nodes once the
+    tree has max_nodes nodes, if max_nodes is given.
+
+    >>> build_breadth_first(2, lambda n: list(range(n)))
+    Tree(2, [Tree(0), Tree(1, [Tree(0)])])
+    >>> t = build_breadth_first(0, lambda n: [2 * n + 1, 2 * n + 2], 6)
+    >>> list(level_order(t))
+    [0, 1, 2, 3, 4, 5]
+    """
+    t = Tree(value)
+    size = 1
+    from csc148_queue import Queue
+    q = Queue()
+    q.add(t)
+    for node in q.drain():
+        node: Tree
+        for child_value in expand(node.value):
+            if max_nodes is not None and size >= max_nodes:
+                return t
+            child = Tree(child_value)
+            node.children.append(child)
+            q.add(child)
+            size += 1
     return t
 
 
+def level_order(t: Tree) -> Iterator[Any]:
+    """
+    Yield the values of Tree t in level order, without recursion.
+
+    >>> t = descendants_from_list(Tree(0), [1, 2, 3, 4, 5, 6, 7, 8], 3)
+    >>> list(level_order(t))
+    [0, 1, 2, 3, 4, 5, 6, 7, 8]
+    """
+    from csc148_queue import Queue
+    q = Queue()
+    q.add(t)
+    for node in q.drain():
+        yield node.value
+        q.extend(node.children)
+
+
+def levels(t: Tree) -> Iterator[list]:
+    """
+    Yield the list of values at each depth of Tree t, starting with [root].
+
+    >>> t = descendants_from_list(Tree(0), [1, 2, 3, 4, 5, 6, 7, 8], 3)
+    >>> list(levels(t))
+    [[0], [1, 2, 3], [4, 5, 6, 7, 8]]
+    """
+    level = [t]
+    while level != []:
+        yield [node.value for node in level]
+        level = [child for node in level for child in node.children]
+
+
 if __name__ == '__main__':
     from python_ta import check_all
     check_all(config="a2_pyta.txt")